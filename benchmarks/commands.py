@@ -0,0 +1,94 @@
+"""Время ответа на команды /status и /history без запросов к API.
+
+Запуск:
+    python -m benchmarks.commands --tenants 100000 --queries 2000
+"""
+import argparse
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from checkpoints import CheckpointStore
+from commands import CommandHandler, TenantDirectory
+from engine import PollingEngine, Tenant
+from history import TransitionLog
+from homework import HOMEWORK_STATUSES
+from records import Homework
+
+STATUSES = tuple(HOMEWORK_STATUSES)
+
+
+def _latencies(handler, command, chats, queries, rng):
+    latencies = []
+    for _ in range(queries):
+        chat_id = rng.randrange(chats)
+        started = time.perf_counter()
+        handler.handle(chat_id, command)
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return latencies
+
+
+def run_benchmark(tenants=20000, homeworks=10, queries=2000, seed=0):
+    """Отвечает на команды случайных чатов из tenants подписок.
+    Половина подписок живёт в памяти движка, половина — только в
+    хранилище, как подписки чужих шардов. Возвращает задержки ответов в
+    миллисекундах.
+    """
+    rng = random.Random(seed)
+    directory = tempfile.mkdtemp(prefix='commands-')
+    try:
+        store = CheckpointStore(f'{directory}/checkpoints.sqlite3')
+        history = TransitionLog(directory)
+        everyone = []
+        live = []
+        for number in range(tenants):
+            tenant = Tenant(f'token{number}', number)
+            for key in range(homeworks):
+                status = rng.choice(STATUSES)
+                tenant.homeworks.set(Homework.from_api({
+                    'id': number * homeworks + key,
+                    'homework_name': f'hw{key}.zip', 'status': status}))
+                history.append(tenant.tenant_id, key, f'hw{key}.zip',
+                               None, status)
+            everyone.append(Tenant(tenant.token, number))
+            if number % 2:
+                live.append(tenant)
+            else:
+                store.save(tenant.tenant_id, tenant.checkpoint())
+        store.flush()
+        engine = PollingEngine(live, None, None, None, None)
+        engine._spread(live, 0)
+        handler = CommandHandler(
+            TenantDirectory(everyone, engine, store), history,
+            HOMEWORK_STATUSES)
+        result = {}
+        for command in ('/status', '/history'):
+            latencies = _latencies(handler, command, tenants, queries, rng)
+            name = command.strip('/')
+            result[f'{name}_p50_ms'] = statistics.median(latencies) * 1000
+            result[f'{name}_p99_ms'] = (
+                latencies[int(len(latencies) * 0.99)] * 1000)
+        history.close()
+        store.close()
+        return result
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=20000)
+    parser.add_argument('--homeworks', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
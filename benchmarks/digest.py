@@ -0,0 +1,78 @@
+"""Сообщения в Telegram при пачке проверок: по одному и сводками.
+
+Запуск:
+    python -m benchmarks.digest --chats 100 --burst 10 --window 1
+"""
+import argparse
+import threading
+import time
+
+from digest import Digest
+from dispatcher import Dispatcher
+from homework import HOMEWORK_STATUSES, is_urgent
+
+
+def _run(chats, burst, window, urgent_delay, global_rate, chat_rate):
+    sent = []
+    lock = threading.Lock()
+
+    def send(chat_id, message):
+        with lock:
+            sent.append((time.monotonic(), message.count('\n\n') + 1))
+
+    dispatcher = Dispatcher(send, global_rate=global_rate,
+                            chat_rate=chat_rate)
+    dispatcher.start()
+    digest = Digest(dispatcher.submit, window=window,
+                    urgent_delay=urgent_delay, urgent=is_urgent)
+    digest.start()
+    started = time.monotonic()
+    for index in range(burst):
+        status = 'reviewing' if index % 2 else 'approved'
+        for chat_id in range(chats):
+            digest.submit(chat_id, f'Работа "hw{index}.zip". '
+                                   f'{HOMEWORK_STATUSES[status]}')
+    while len(digest) or len(dispatcher):
+        time.sleep(0.01)
+    digest.close()
+    dispatcher.close(timeout=600)
+    finished = max(moment for moment, _ in sent)
+    return {
+        'messages': len(sent),
+        'notifications': sum(count for _, count in sent),
+        'drain_seconds': finished - started,
+    }
+
+
+def run_benchmark(chats=100, burst=10, window=1.0, urgent_delay=0.5,
+                  global_rate=300, chat_rate=10):
+    """Отправляет по burst уведомлений в chats чатов сразу и сводками.
+    Возвращает число сообщений и время, за которое очередь опустела при
+    лимитах Telegram global_rate и chat_rate сообщений в секунду.
+    """
+    result = {}
+    for label, digest_window in (('single', 0), ('digest', window)):
+        run = _run(chats, burst, digest_window, urgent_delay, global_rate,
+                   chat_rate)
+        for name, value in run.items():
+            result[f'{label}_{name}'] = value
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=100)
+    parser.add_argument('--burst', type=int, default=10)
+    parser.add_argument('--window', type=float, default=1.0)
+    parser.add_argument('--urgent-delay', type=float, default=0.5)
+    parser.add_argument('--global-rate', type=float, default=300)
+    parser.add_argument('--chat-rate', type=float, default=10)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
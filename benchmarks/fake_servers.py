@@ -0,0 +1,404 @@
+import fnmatch
+import json
+import random
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def reply(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        try:
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeServer:
+    """Локальный HTTP-сервер с настраиваемой задержкой и долей ошибок."""
+
+    handler = _Handler
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.errors = 0
+        self._server = None
+
+    def should_fail(self):
+        """Решает, ответить ли на очередной запрос ошибкой."""
+        with self.lock:
+            self.requests += 1
+            failed = self.random.random() < self.error_rate
+            self.errors += failed
+        return failed
+
+    def start(self):
+        """Запускает сервер на свободном порту и возвращает его адрес."""
+        handler = type('Handler', (self.handler,), {'fake': self})
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+        self._server.daemon_threads = True
+        threading.Thread(
+            target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        """Возвращает адрес запущенного сервера."""
+        return f'http://127.0.0.1:{self._server.server_port}'
+
+    def stop(self):
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class _PracticumHandler(_Handler):
+
+    def do_GET(self):
+        fake = self.fake
+        time.sleep(fake.latency)
+        if fake.should_fail():
+            self.reply(500, {'code': 'server_error'})
+            return
+        token = self.headers.get('Authorization', '')
+        query = parse_qs(urlparse(self.path).query)
+        if 'from_date' not in query:
+            self.reply(400, {'code': 'UnknownError'})
+            return
+        self.reply(200, {
+            'homeworks': fake.homeworks_for(token),
+            'current_date': int(time.time()),
+        })
+
+
+class FakePracticum(FakeServer):
+    """Заменитель API статусов домашних работ.
+
+    Для каждого токена хранится homeworks работ, в каждом ответе
+    отдаются все они, и при каждом запросе статус любой работы меняется
+    с вероятностью change_rate.
+    """
+
+    handler = _PracticumHandler
+    path = '/api/user_api/homework_statuses/'
+
+    def __init__(self, latency=0.0, error_rate=0.0, homeworks=1,
+                 change_rate=0.1, seed=0):
+        super().__init__(latency, error_rate, seed)
+        self.homeworks = homeworks
+        self.change_rate = change_rate
+        self._state = {}
+
+    @property
+    def endpoint(self):
+        """Возвращает адрес, который подставляется вместо ENDPOINT."""
+        return self.url + self.path
+
+    def homeworks_for(self, token):
+        """Возвращает работы владельца токена, случайно меняя статусы."""
+        with self.lock:
+            works = self._state.get(token)
+            if works is None:
+                works = [
+                    {'id': index, 'homework_name': f'hw{index}.zip',
+                     'status': 'reviewing', 'reviewer_comment': '',
+                     'lesson_name': f'Урок {index}',
+                     'date_updated': '2022-01-01T00:00:00Z'}
+                    for index in range(self.homeworks)
+                ]
+                self._state[token] = works
+            for work in works:
+                if self.random.random() < self.change_rate:
+                    work['status'] = self.random.choice(STATUSES)
+            return [dict(work) for work in works]
+
+
+class _TelegramHandler(_Handler):
+
+    def do_POST(self):
+        fake = self.fake
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'{}')
+        time.sleep(fake.latency)
+        if fake.should_fail():
+            self.reply(429, {
+                'ok': False, 'error_code': 429,
+                'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            })
+            return
+        with fake.lock:
+            fake.messages += 1
+            message_id = fake.messages
+        self.reply(200, {'ok': True, 'result': {
+            'message_id': message_id,
+            'date': int(time.time()),
+            'chat': {'id': int(payload.get('chat_id', 0)), 'type': 'private'},
+            'text': payload.get('text', ''),
+        }})
+
+
+class FakeTelegram(FakeServer):
+    """Заменитель Telegram Bot API, принимающий sendMessage.
+    Доля error_rate запросов получает ответ 429 с retry_after.
+    """
+
+    handler = _TelegramHandler
+
+    def __init__(self, latency=0.0, error_rate=0.0, seed=0):
+        super().__init__(latency, error_rate, seed)
+        self.messages = 0
+
+    @property
+    def base_url(self):
+        """Возвращает base_url для telegram.Bot."""
+        return self.url + '/bot'
+
+
+class _Status(str):
+    """Простая строка RESP: +OK, +QUEUED или ошибка -ERR."""
+
+
+_OK = _Status('+OK')
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    """Разбирает команды RESP2 одного клиента."""
+
+    def setup(self):
+        super().setup()
+        self.watched = {}
+        self.queued = None
+
+    def handle(self):
+        while True:
+            try:
+                args = self.read_command()
+            except (ConnectionError, ValueError):
+                return
+            if args is None:
+                return
+            self.wfile.write(self.server.fake.encode(self.dispatch(args)))
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode('utf-8'))
+        return args
+
+    def dispatch(self, args):
+        fake = self.server.fake
+        name = args[0].upper()
+        if self.queued is not None and name not in ('EXEC', 'DISCARD'):
+            self.queued.append(args)
+            return _Status('+QUEUED')
+        if name == 'MULTI':
+            self.queued = []
+            return _OK
+        if name == 'DISCARD':
+            self.queued, self.watched = None, {}
+            return _OK
+        if name == 'WATCH':
+            for key in args[1:]:
+                self.watched[key] = fake.version(key)
+            return _OK
+        if name == 'UNWATCH':
+            self.watched = {}
+            return _OK
+        if name == 'EXEC':
+            queued, watched = self.queued, self.watched
+            self.queued, self.watched = None, {}
+            return fake.transaction(queued or [], watched)
+        return fake.execute(args)
+
+
+class FakeRedis:
+    """Заменитель Redis для тестов и бенчмарков аренды.
+
+    Понимает подмножество команд, которым пользуется leases.RedisBackend:
+    PING, SELECT, AUTH, GET, MGET, SET с NX/XX/PX/EX, MSET, DEL, KEYS,
+    SCAN, ZADD, ZREM, ZREMRANGEBYSCORE, ZCARD, WATCH, UNWATCH, MULTI, EXEC
+    и DISCARD. Срок жизни ключей проверяется
+    при обращении к ним.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._data = {}
+        self._sets = {}
+        self._versions = {}
+        self._server = None
+
+    def start(self):
+        """Запускает сервер на свободном порту и возвращает его адрес."""
+        self._server = socketserver.ThreadingTCPServer(
+            ('127.0.0.1', 0), _RedisHandler)
+        self._server.daemon_threads = True
+        self._server.fake = self
+        threading.Thread(
+            target=self._server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        """Возвращает адрес для leases.backend_from_url."""
+        return f'redis://127.0.0.1:{self._server.server_address[1]}/0'
+
+    def stop(self):
+        """Останавливает сервер."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    @staticmethod
+    def encode(reply):
+        """Кодирует ответ в формат RESP2."""
+        if reply is None:
+            return b'$-1\r\n'
+        if isinstance(reply, int):
+            return f':{reply}\r\n'.encode()
+        if isinstance(reply, list):
+            return (f'*{len(reply)}\r\n'.encode()
+                    + b''.join(FakeRedis.encode(item) for item in reply))
+        if isinstance(reply, _Status):
+            return f'{reply}\r\n'.encode('utf-8')
+        data = reply.encode('utf-8')
+        return f'${len(data)}\r\n'.encode() + data + b'\r\n'
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is not None and item[1] is not None \
+                and item[1] <= time.monotonic():
+            self._delete(key)
+            item = None
+        return None if item is None else item[0]
+
+    def _set(self, key, value, expires=None):
+        self._data[key] = (value, expires)
+        self._versions[key] = self._versions.get(key, 0) + 1
+
+    def _delete(self, key):
+        if self._data.pop(key, None) is None:
+            return 0
+        self._versions[key] = self._versions.get(key, 0) + 1
+        return 1
+
+    def version(self, key):
+        """Возвращает номер изменения ключа для WATCH."""
+        with self.lock:
+            self._get(key)
+            return self._versions.get(key, 0)
+
+    def transaction(self, queued, watched):
+        """Выполняет MULTI/EXEC, если наблюдаемые ключи не менялись."""
+        with self.lock:
+            for key, version in watched.items():
+                self._get(key)
+                if self._versions.get(key, 0) != version:
+                    return None
+            return [self._execute(args) for args in queued]
+
+    def execute(self, args):
+        """Выполняет одну команду и возвращает ответ."""
+        with self.lock:
+            return self._execute(args)
+
+    def _execute(self, args):
+        name, args = args[0].upper(), args[1:]
+        if name in ('PING', 'SELECT', 'AUTH'):
+            return _Status('+PONG') if name == 'PING' else _OK
+        if name == 'GET':
+            return self._get(args[0])
+        if name == 'MGET':
+            return [self._get(key) for key in args]
+        if name == 'MSET':
+            for key, value in zip(args[::2], args[1::2]):
+                self._set(key, value)
+            return _OK
+        if name == 'DEL':
+            return sum(self._delete(key) for key in args)
+        if name in ('KEYS', 'SCAN'):
+            return self._scan(name, args)
+        if name.startswith('Z'):
+            return self._sorted_set(name, args)
+        if name == 'SET':
+            return self._set_command(args)
+        return _Status(f'-ERR unknown command {name}')
+
+    def _scan(self, name, args):
+        if name == 'KEYS':
+            return [key for key in list(self._data)
+                    if fnmatch.fnmatchcase(key, args[0])
+                    and self._get(key) is not None]
+        cursor = int(args[0])
+        options = {option.upper(): value
+                   for option, value in zip(args[1::2], args[2::2])}
+        count = int(options.get('COUNT', 10))
+        keys = sorted(self._data)[cursor:cursor + count]
+        following = cursor + count
+        if following >= len(self._data):
+            following = 0
+        return [str(following), [
+            key for key in keys
+            if fnmatch.fnmatchcase(key, options.get('MATCH', '*'))
+            and self._get(key) is not None
+        ]]
+
+    def _sorted_set(self, name, args):
+        members = self._sets.setdefault(args[0], {})
+        if name == 'ZADD':
+            added = args[2] not in members
+            members[args[2]] = float(args[1])
+            return int(added)
+        if name == 'ZREM':
+            return 0 if members.pop(args[1], None) is None else 1
+        if name == 'ZREMRANGEBYSCORE':
+            low, high = float(args[1]), float(args[2])
+            removed = [member for member, score in members.items()
+                       if low <= score <= high]
+            for member in removed:
+                del members[member]
+            return len(removed)
+        if name == 'ZCARD':
+            return len(members)
+        return _Status(f'-ERR unknown command {name}')
+
+    def _set_command(self, args):
+        key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+        expires = None
+        if 'PX' in options:
+            expires = int(args[2 + options.index('PX') + 1]) / 1000
+        elif 'EX' in options:
+            expires = int(args[2 + options.index('EX') + 1])
+        exists = self._get(key) is not None
+        if ('NX' in options and exists) or ('XX' in options and not exists):
+            return None
+        if expires is not None:
+            expires += time.monotonic()
+        self._set(key, value, expires)
+        return _OK
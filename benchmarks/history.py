@@ -0,0 +1,81 @@
+"""Запись в журнал смен статусов и запросы истории за месяц.
+
+Запуск:
+    python -m benchmarks.history --events 2000000 --tenants 100000
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.throughput import rss_bytes
+from history import TransitionLog
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+YEAR = 365 * 24 * 3600
+MONTH = 30 * 24 * 3600
+
+
+def run_benchmark(events=200000, tenants=10000, queries=1000, seed=0,
+                  directory=None):
+    """Пишет events смен статусов tenants подписок, равномерно за год.
+    Затем запрашивает историю случайных подписок за случайный месяц.
+    Возвращает скорость записи, задержки запросов, размер журнала и прирост
+    памяти процесса.
+    """
+    rng = random.Random(seed)
+    own_directory = directory is None
+    if own_directory:
+        directory = tempfile.mkdtemp(prefix='history-')
+    try:
+        log = TransitionLog(directory)
+        rss_before = rss_bytes()
+        started = time.perf_counter()
+        for index in range(events):
+            tenant = rng.randrange(tenants)
+            log.append(tenant, index, f'hw{index % 40}.zip',
+                       rng.choice(STATUSES), rng.choice(STATUSES),
+                       detected_at=index * YEAR / events)
+        append_seconds = time.perf_counter() - started
+        latencies = []
+        found = 0
+        for _ in range(queries):
+            since = rng.uniform(0, YEAR - MONTH)
+            started = time.perf_counter()
+            found += len(log.history(rng.randrange(tenants), since,
+                                     since + MONTH))
+            latencies.append(time.perf_counter() - started)
+        latencies.sort()
+        result = {
+            'appends_per_second': events / append_seconds,
+            'query_p50_ms': statistics.median(latencies) * 1000,
+            'query_p99_ms': latencies[int(len(latencies) * 0.99)] * 1000,
+            'transitions_per_query': found / queries,
+            'log_mb': os.path.getsize(log.path) / 2 ** 20,
+            'index_mb': os.path.getsize(log.index_path) / 2 ** 20,
+            'rss_growth_mb': (rss_bytes() - rss_before) / 2 ** 20,
+        }
+        log.close()
+        return result
+    finally:
+        if own_directory:
+            shutil.rmtree(directory)
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--events', type=int, default=200000)
+    parser.add_argument('--tenants', type=int, default=10000)
+    parser.add_argument('--queries', type=int, default=1000)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
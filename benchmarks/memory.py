@@ -0,0 +1,88 @@
+"""Память на состояние подписок: словари из JSON против компактных записей.
+
+Запуск:
+    python -m benchmarks.memory --tenants 100000 --homeworks 30
+"""
+import argparse
+import gc
+import json
+import random
+import tracemalloc
+
+from records import Homework, HomeworkIndex
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+
+
+def _responses(tenants, homeworks, names, seed):
+    """Порождает тела ответов API, как их получает бот."""
+    rng = random.Random(seed)
+    for tenant in range(tenants):
+        works = [
+            {'id': tenant * homeworks + index,
+             'homework_name': f'{rng.choice(names)}.zip',
+             'status': rng.choice(STATUSES),
+             'reviewer_comment': 'Принято!',
+             'lesson_name': 'Итоговый проект',
+             'date_updated': '2022-01-01T00:00:00Z'}
+            for index in range(homeworks)
+        ]
+        yield json.dumps({'homeworks': works, 'current_date': 0})
+
+
+def _measure(build, bodies):
+    gc.collect()
+    tracemalloc.start()
+    state = [build(json.loads(body)['homeworks']) for body in bodies]
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del state
+    return size
+
+
+def _raw(works):
+    return works
+
+
+def _statuses(works):
+    return {str(work['id']): work['status'] for work in works}
+
+
+def _index(works):
+    return HomeworkIndex(Homework.from_api(work) for work in works)
+
+
+def run_benchmark(tenants=10000, homeworks=30, names=40, seed=0):
+    """Сравнивает память на tenants подписок по homeworks работ.
+    Названия работ выбираются из names вариантов, как у студентов одного
+    курса. Возвращает байты на подписку для сырых словарей из JSON,
+    словаря статусов по строковым ключам и HomeworkIndex.
+    """
+    names = [f'homework_{index:02d}' for index in range(names)]
+    bodies = list(_responses(tenants, homeworks, names, seed))
+    result = {}
+    for label, build in (('raw_dicts', _raw), ('status_dict', _statuses),
+                         ('index', _index)):
+        size = _measure(build, bodies)
+        result[f'{label}_bytes_per_tenant'] = size / tenants
+    result['index_vs_status_dict'] = (
+        result['index_bytes_per_tenant']
+        / result['status_dict_bytes_per_tenant'])
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=10000)
+    parser.add_argument('--homeworks', type=int, default=30)
+    parser.add_argument('--names', type=int, default=40)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>30}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
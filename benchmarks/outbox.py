@@ -0,0 +1,118 @@
+"""Уведомления при недоступности Telegram: без очереди и через Outbox.
+
+Запуск:
+    python -m benchmarks.outbox --rate 200 --duration 3 --outage 1
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from dispatcher import Dispatcher
+from outbox import Outbox
+
+
+def _run(path, chats, rate, duration, outage, repeat, global_rate,
+         chat_rate, seed):
+    rng = random.Random(seed)
+    delivered = []
+    lock = threading.Lock()
+    started = time.monotonic()
+    down_from = started + (duration - outage) / 2
+    down_until = down_from + outage
+
+    def send(chat_id, message):
+        now = time.monotonic()
+        if down_from <= now < down_until:
+            raise ConnectionError('Telegram недоступен')
+        with lock:
+            delivered.append((now, message))
+
+    dispatcher = Dispatcher(send, global_rate=global_rate,
+                            chat_rate=chat_rate)
+    dispatcher.start()
+    outbox = None
+    submit = dispatcher.submit
+    if path:
+        outbox = Outbox(path, dispatcher.submit, interval=0.05, retry=0.5,
+                        max_retry=2)
+        outbox.start()
+        submit = outbox.put
+    produced = 0
+    created = {}
+    while time.monotonic() < started + duration:
+        produced += 1
+        key = f'hw{produced}'
+        created[key] = time.monotonic()
+        chat_id = rng.randrange(chats)
+        # Часть уведомлений приходит снова, как после перезапуска опроса.
+        for _ in range(2 if rng.random() < repeat else 1):
+            if outbox is None:
+                submit(chat_id, key)
+            else:
+                submit(chat_id, key, key)
+        time.sleep(1 / rate)
+    while len(dispatcher) or (outbox is not None and len(outbox)):
+        time.sleep(0.01)
+    if outbox is not None:
+        outbox.stop()
+    dispatcher.close(timeout=60)
+    if outbox is not None:
+        outbox.close()
+    unique = {message for _, message in delivered}
+    # Догнать — доставить всё, что создано до конца сбоя.
+    backlog = [moment for moment, message in delivered
+               if moment >= down_until and created[message] < down_until]
+    caught_up = max(backlog, default=down_until)
+    recent = [moment for moment, _ in delivered
+              if down_until <= moment <= caught_up]
+    return {
+        'lost': produced - len(unique),
+        'duplicates': len(delivered) - len(unique),
+        'catch_up_seconds': caught_up - down_until,
+        'catch_up_rate': len(recent) / max(caught_up - down_until, 1e-9),
+    }
+
+
+def run_benchmark(chats=200, rate=200, duration=3.0, outage=1.0, repeat=0.1,
+                  global_rate=1000, chat_rate=10, seed=0):
+    """Шлёт rate уведомлений в секунду duration секунд в chats чатов.
+    Посередине Telegram outage секунд не принимает сообщения; repeat
+    уведомлений приходят повторно. Возвращает потери, повторы, время, за
+    которое доставлено всё созданное до конца сбоя, и скорость доставки
+    за это время при пределе global_rate.
+    """
+    result = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'outbox.sqlite3')
+        for label, outbox_path in (('direct', None), ('outbox', path)):
+            run = _run(outbox_path, chats, rate, duration, outage, repeat,
+                       global_rate, chat_rate, seed)
+            for name, value in run.items():
+                result[f'{label}_{name}'] = value
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--chats', type=int, default=200)
+    parser.add_argument('--rate', type=float, default=200)
+    parser.add_argument('--duration', type=float, default=3.0)
+    parser.add_argument('--outage', type=float, default=1.0)
+    parser.add_argument('--repeat', type=float, default=0.1)
+    parser.add_argument('--global-rate', type=float, default=1000)
+    parser.add_argument('--chat-rate', type=float, default=10)
+    args = parser.parse_args()
+    # Ошибки отправки во время сбоя ожидаемы и только засоряют вывод.
+    logging.disable(logging.ERROR)
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
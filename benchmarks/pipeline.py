@@ -0,0 +1,170 @@
+"""Шаги опроса по отдельности и конвейер с медленной отправкой в Telegram.
+
+Запуск:
+    python -m benchmarks.pipeline --tenants 2000 --send-seconds 0.0005
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from engine import PollingEngine, Tenant
+from homework import check_response, parse_status
+
+STATUSES = ('reviewing', 'approved', 'rejected')
+
+
+def _responses(homeworks, rounds):
+    return [
+        {'homeworks': [
+            {'id': key, 'homework_name': f'hw{key}.zip',
+             'status': STATUSES[(key + number) % 3],
+             'date_updated': '2022-01-01T00:00:00Z'}
+            for key in range(homeworks)
+        ], 'current_date': 1640995200 + number}
+        for number in range(rounds)
+    ]
+
+
+class _Counters:
+
+    def __init__(self, homeworks):
+        self.homeworks = homeworks
+        self.fetched = 0
+        self.delivered = 0
+        self.backlog = 0
+        self.lock = threading.Lock()
+
+    def fetch(self):
+        with self.lock:
+            self.fetched += 1
+            self.backlog = max(self.backlog, self.fetched * self.homeworks
+                               - self.delivered)
+
+    def deliver(self):
+        with self.lock:
+            self.delivered += 1
+
+
+def _engine(tenants, homeworks, fetch_latency, send, counters):
+    responses = _responses(homeworks, 2)
+    rounds = {}
+
+    def fetch(token, timestamp):
+        counters.fetch()
+        time.sleep(fetch_latency)
+        number = rounds.get(token, 0)
+        rounds[token] = number + 1
+        return responses[number % len(responses)]
+
+    return PollingEngine(
+        [Tenant(f'token{number}', number) for number in range(tenants)],
+        fetch=fetch, check=check_response, parse=parse_status, send=send,
+        overlap=0,
+    )
+
+
+def _stage_costs(tenants, homeworks):
+    """Измеряет каждый шаг отдельно, без задержек сети и Telegram."""
+    counters = _Counters(homeworks)
+    engine = _engine(tenants, homeworks, 0, lambda chat_id, message: None,
+                     counters)
+    polls = engine.tenants
+    result = {}
+    for step in (engine.fetch_step, engine.validate_step, engine.diff_step,
+                 engine.render_step, engine.send_step):
+        started = time.perf_counter()
+        polls = [step(poll) for poll in polls]
+        result[f'{step.__name__[:-5]}_us'] = (
+            (time.perf_counter() - started) / tenants * 1e6)
+    return result
+
+
+def _unbounded(tenants, homeworks, fetch_latency, send_seconds, workers):
+    """Прежний путь: опросы в пуле, отправка из неограниченной очереди."""
+    counters = _Counters(homeworks)
+    pending = []
+    condition = threading.Condition()
+    finished = threading.Event()
+
+    def sender():
+        while True:
+            with condition:
+                while not pending and not finished.is_set():
+                    condition.wait()
+                if not pending:
+                    return
+                pending.pop()
+            time.sleep(send_seconds)
+            counters.deliver()
+
+    def send(chat_id, message):
+        with condition:
+            pending.append(message)
+            condition.notify()
+
+    engine = _engine(tenants, homeworks, fetch_latency, send, counters)
+    thread = threading.Thread(target=sender)
+    started = time.perf_counter()
+    thread.start()
+    with ThreadPoolExecutor(workers) as executor:
+        list(executor.map(engine.poll_once, engine.tenants))
+    with condition:
+        finished.set()
+        condition.notify()
+    thread.join()
+    return time.perf_counter() - started, counters.backlog
+
+
+def _pipeline(tenants, homeworks, fetch_latency, send_seconds, workers,
+              capacity):
+    counters = _Counters(homeworks)
+
+    def send(chat_id, message):
+        time.sleep(send_seconds)
+        counters.deliver()
+
+    engine = _engine(tenants, homeworks, fetch_latency, send, counters)
+    started = time.perf_counter()
+    engine.sweep(fetch_workers=workers, capacity=capacity)
+    return time.perf_counter() - started, counters.backlog
+
+
+def run_benchmark(tenants=2000, homeworks=3, fetch_latency=0.002,
+                  send_seconds=0.0005, workers=32, capacity=16):
+    """Измеряет шаги опроса по отдельности и опрос tenants подписок.
+    Отправка занимает send_seconds на уведомление и медленнее запросов,
+    поэтому сравнивается наибольшее число уведомлений, ждущих отправки,
+    в пуле с неограниченной очередью и в конвейере с очередями на
+    capacity опросов.
+    """
+    result = _stage_costs(tenants, homeworks)
+    for label, run in (
+            ('unbounded', lambda: _unbounded(
+                tenants, homeworks, fetch_latency, send_seconds, workers)),
+            ('pipeline', lambda: _pipeline(
+                tenants, homeworks, fetch_latency, send_seconds, workers,
+                capacity))):
+        seconds, backlog = run()
+        result[f'{label}_seconds'] = seconds
+        result[f'{label}_peak_backlog'] = backlog
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=2000)
+    parser.add_argument('--homeworks', type=int, default=3)
+    parser.add_argument('--fetch-latency', type=float, default=0.002)
+    parser.add_argument('--send-seconds', type=float, default=0.0005)
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--capacity', type=int, default=16)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""Накладные расходы профилировщика на опрос подписок.
+
+Запуск:
+    python -m benchmarks.profiling --tenants 100 --days 0.5 --memory
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import homework
+from benchmarks.replay import synthesize
+from profiling import Profiler
+from replay import replay
+from scheduling import FixedPolicy
+
+
+def _replay(entries, repeat=3):
+    """Возвращает лучшее из repeat времён прогона записи."""
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        replay(entries, homework.get_api_answer_for, homework.check_response,
+               homework.parse_status, policy=FixedPolicy(60), retry_time=60)
+        times.append(time.perf_counter() - started)
+    return min(times)
+
+
+def run_benchmark(tenants=100, days=0.5, interval=0.01, memory=False):
+    """Сравнивает время одного и того же опроса с профилем и без.
+    Опрос идёт на виртуальных часах без профиля, со снятием стеков раз в
+    interval секунд и, если memory, с tracemalloc. Возвращает время
+    прогонов, замедление и размер отчётов.
+    """
+    entries = synthesize(tenants, days)
+    directory = tempfile.mkdtemp(prefix='profiles-')
+    try:
+        baseline = _replay(entries)
+        result = {'off_seconds': baseline}
+        profiler = Profiler(directory, interval, dump_interval=3600)
+        profiler.start()
+        result['stacks_seconds'] = _replay(entries)
+        profiler.stop(wait=True)
+        if memory:
+            profiler = Profiler(directory, interval, dump_interval=3600,
+                                memory=True)
+            profiler.start()
+            result['stacks_memory_seconds'] = _replay(entries, repeat=1)
+            profiler.stop(wait=True)
+        for key in list(result):
+            if key != 'off_seconds':
+                name = key.replace('_seconds', '_overhead')
+                result[name] = result[key] / baseline - 1
+        result['report_kb'] = sum(
+            os.path.getsize(os.path.join(directory, name))
+            for name in os.listdir(directory)) / 1024
+        return result
+    finally:
+        shutil.rmtree(directory)
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=100)
+    parser.add_argument('--days', type=float, default=0.5)
+    parser.add_argument('--interval', type=float, default=0.01)
+    parser.add_argument('--memory', action='store_true')
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
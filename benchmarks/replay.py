@@ -0,0 +1,107 @@
+"""Политики опроса на записанном или синтетическом трафике API.
+
+Запуск:
+    python -m benchmarks.replay --tenants 1000 --days 1
+    python -m benchmarks.replay --recording api.jsonl
+"""
+import argparse
+import json
+import random
+
+import homework
+from replay import load_recording, replay, token_key
+from resilience import Backoff
+from scheduling import AdaptivePolicy, FixedPolicy
+
+DAY = 24 * 3600
+START = 1640995200.0
+
+
+def _iso(moment):
+    from datetime import datetime, timezone
+
+    return datetime.fromtimestamp(moment, timezone.utc).strftime(
+        '%Y-%m-%dT%H:%M:%SZ')
+
+
+def synthesize(tenants=1000, days=1.0, homeworks=2, review_hours=6.0,
+               seed=0):
+    """Порождает запись ответов API в формате Recorder.
+    Каждый студент сдаёт homeworks работ в случайные моменты, ревьюер
+    отвечает в среднем через review_hours часов. Ответ записывается в
+    момент каждого изменения, между ними API отвечает так же.
+    """
+    rng = random.Random(seed)
+    duration = days * DAY
+    entries = []
+    for tenant in range(tenants):
+        token = token_key(f'token{tenant}')
+        events = []
+        for number in range(homeworks):
+            key = tenant * homeworks + number
+            submitted = rng.uniform(0, duration * 0.8)
+            reviewed = submitted + rng.expovariate(1 / (review_hours * 3600))
+            verdict = 'approved' if rng.random() < 0.7 else 'rejected'
+            events.append((submitted, key, 'reviewing'))
+            if reviewed < duration:
+                events.append((reviewed, key, verdict))
+        events.sort()
+        state = {}
+        entries.append({'at': START, 'token': token, 'status': 200,
+                        'body': json.dumps({'homeworks': [],
+                                            'current_date': START})})
+        for moment, key, status in events:
+            at = START + moment
+            state[key] = {'id': key, 'homework_name': f'hw{key}.zip',
+                          'status': status, 'date_updated': _iso(at)}
+            works = sorted(state.values(), key=lambda work: work['id'],
+                           reverse=True)
+            entries.append({
+                'at': at, 'token': token, 'status': 200,
+                'body': json.dumps({'homeworks': works,
+                                    'current_date': int(at)}),
+            })
+    return entries
+
+
+def run_benchmark(recording=None, tenants=1000, days=1.0, homeworks=2,
+                  retry_time=600, seed=0):
+    """Сравнивает постоянный интервал retry_time и адаптивную политику.
+    Воспроизводит запись recording, а без неё — синтетический трафик
+    tenants подписок за days суток. Возвращает словарь результатов с
+    префиксом политики.
+    """
+    if recording:
+        entries = load_recording(recording)
+    else:
+        entries = synthesize(tenants, days, homeworks, seed=seed)
+    policies = {
+        'fixed': FixedPolicy(retry_time),
+        'adaptive': AdaptivePolicy(base=retry_time),
+    }
+    result = {}
+    for label, policy in policies.items():
+        run = replay(entries, homework.get_api_answer_for,
+                     homework.check_response, homework.parse_status,
+                     policy=policy, backoff=Backoff(), retry_time=retry_time)
+        for name, value in run.items():
+            result[f'{label}_{name}'] = value
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--recording')
+    parser.add_argument('--tenants', type=int, default=1000)
+    parser.add_argument('--days', type=float, default=1.0)
+    parser.add_argument('--homeworks', type=int, default=2)
+    parser.add_argument('--retry-time', type=float, default=600)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
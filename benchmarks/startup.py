@@ -0,0 +1,94 @@
+"""Время импорта бота по профилю python -X importtime.
+
+Запуск:
+    python -m benchmarks.startup --runs 5
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Бюджет на импорт homework без зависимостей и модулей, которые нужны только
+# боту в работе. До отложенных импортов было около 260 мс, после отложенных
+# зависимостей — около 65 мс, после отложенных модулей бота — около 12 мс.
+BUDGET_MS = 40
+# Сколько модулей может загрузить импорт homework: сейчас около десятка.
+# Число не зависит от загрузки машины и ловит новый тяжёлый импорт там,
+# где время ещё укладывается в бюджет.
+MAX_MODULES = 25
+# Модули, которые импортируются только при первом использовании.
+DEFERRED = ('telegram', 'requests', 'dotenv', 'asyncio', 'http.server',
+            'multiprocessing', 'sqlite3', 'checkpoints', 'coalescing',
+            'commands', 'digest', 'dispatcher', 'engine', 'history',
+            'leases', 'log_config', 'metrics', 'outbox', 'profiling',
+            'resilience', 'scheduling', 'sharding', 'streaming')
+
+
+def profile_import(module='homework'):
+    """Импортирует module в чистом процессе.
+    Возвращает словарь: время импорта в миллисекундах, число и самые
+    долгие из вложенных импортов и список загруженных модулей из DEFERRED.
+    """
+    code = (
+        f'import sys, {module}; '
+        f'print(",".join(m for m in {DEFERRED!r} if m in sys.modules))'
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    total = 0
+    nested = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if name.strip() == 'site':
+            # Всё, что выше, импортирует сам интерпретатор при запуске.
+            nested = []
+        elif name.strip() == module:
+            total = int(cumulative) / 1000
+        else:
+            nested.append((int(cumulative) / 1000, name.rstrip()))
+    loaded = result.stdout.strip()
+    return {
+        'import_ms': total,
+        'modules': len(nested),
+        'slowest': sorted(nested, reverse=True)[:10],
+        'loaded_deferred': loaded.split(',') if loaded else [],
+    }
+
+
+def run_benchmark(runs=5, module='homework'):
+    """Повторяет profile_import() runs раз и возвращает медиану и максимум."""
+    profiles = [profile_import(module) for _ in range(runs)]
+    times = [profile['import_ms'] for profile in profiles]
+    return {
+        'median_ms': statistics.median(times),
+        'max_ms': max(times),
+        'modules': profiles[-1]['modules'],
+        'slowest': profiles[-1]['slowest'],
+        'loaded_deferred': profiles[-1]['loaded_deferred'],
+    }
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--module', default='homework')
+    args = parser.parse_args()
+    result = run_benchmark(args.runs, args.module)
+    print(f'{"median_ms":>26}: {result["median_ms"]:.1f}')
+    print(f'{"max_ms":>26}: {result["max_ms"]:.1f}')
+    print(f'{"budget_ms":>26}: {BUDGET_MS}')
+    print(f'{"modules":>26}: {result["modules"]} из {MAX_MODULES}')
+    print(f'{"loaded_deferred":>26}: {result["loaded_deferred"]}')
+    for cumulative, name in result['slowest']:
+        print(f'{cumulative:>24.1f} ms {name}')
+
+
+if __name__ == '__main__':
+    main()
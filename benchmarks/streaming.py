@@ -0,0 +1,93 @@
+"""Пик памяти и время разбора длинного ответа API целиком и потоком.
+
+Запуск:
+    python -m benchmarks.streaming --homeworks 20000 100000
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+from streaming import CHUNK_SIZE, HomeworkStream, loads
+
+
+def make_body(homeworks):
+    """Возвращает тело ответа API с homeworks работами."""
+    works = [
+        {'id': number, 'status': 'approved', 'homework_name':
+         f'student{number}__hw{number % 20}.zip',
+         'reviewer_comment': 'Отличная работа, замечаний нет. ' * 3,
+         'date_updated': '2022-01-01T00:00:00Z',
+         'lesson_name': f'Спринт {number % 20}'}
+        for number in range(homeworks)
+    ]
+    return json.dumps({'homeworks': works, 'current_date': 1640995200},
+                      ensure_ascii=False).encode('utf-8')
+
+
+def _chunks(body):
+    for start in range(0, len(body), CHUNK_SIZE):
+        yield body[start:start + CHUNK_SIZE]
+
+
+def _whole_json(body):
+    return len(json.loads(b''.join(_chunks(body)))['homeworks'])
+
+
+def _whole_fast(body):
+    return len(loads(b''.join(_chunks(body)))['homeworks'])
+
+
+def _stream(body):
+    return sum(1 for _ in HomeworkStream(_chunks(body)))
+
+
+def _measure(decode, body, repeat):
+    seconds = min(_timed(decode, body) for _ in range(repeat))
+    tracemalloc.start()
+    try:
+        decode(body)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return seconds, peak
+
+
+def _timed(decode, body):
+    started = time.perf_counter()
+    decode(body)
+    return time.perf_counter() - started
+
+
+def run_benchmark(homeworks=(20000, 100000), repeat=3):
+    """Разбирает ответы с каждым числом работ из homeworks тремя способами.
+    Как response.json(), быстрым разбором целиком и потоком
+    HomeworkStream. Возвращает лучшее из repeat время и пик памяти сверх
+    уже прочитанного тела.
+    """
+    result = {}
+    for count in homeworks:
+        body = make_body(count)
+        result[f'body_mb_{count}'] = len(body) / 2 ** 20
+        for label, decode in (('json', _whole_json), ('fast', _whole_fast),
+                              ('stream', _stream)):
+            seconds, peak = _measure(decode, body, repeat)
+            result[f'{label}_seconds_{count}'] = seconds
+            result[f'{label}_peak_mb_{count}'] = peak / 2 ** 20
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--homeworks', type=int, nargs='+',
+                        default=[20000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
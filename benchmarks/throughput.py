@@ -0,0 +1,133 @@
+"""Нагрузочный прогон бота против локальных заменителей API.
+
+Запуск:
+    python -m benchmarks.throughput --tenants 1000 --duration 30
+"""
+import argparse
+import asyncio
+import os
+import resource
+import time
+
+import telegram
+from telegram.utils.request import Request
+
+import homework
+from benchmarks.fake_servers import FakePracticum, FakeTelegram
+from dispatcher import Dispatcher
+from engine import PollingEngine, Tenant
+from metrics import (FETCH_SECONDS, NOTIFICATIONS, POLLS, PARSE_SECONDS,
+                     SEND_SECONDS)
+from scheduling import AdaptivePolicy
+
+
+def rss_bytes():
+    """Возвращает текущий размер резидентной памяти процесса."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def _run_for(engine, duration):
+    asyncio.get_running_loop().call_later(duration, engine.stop)
+    await engine.run()
+
+
+def run_benchmark(tenants=100, duration=10.0, retry_time=1.0,
+                  concurrency=32, workers=8, homeworks=1, change_rate=0.1,
+                  api_latency=0.0, api_error_rate=0.0, tg_latency=0.0,
+                  tg_error_rate=0.0, global_rate=1000, chat_rate=100,
+                  adaptive=False):
+    """Гоняет tenants подписок через настоящие функции бота.
+    Возвращает словарь с пропускной способностью, задержками и расходом
+    памяти и процессорного времени на подписку.
+    """
+    practicum = FakePracticum(api_latency, api_error_rate, homeworks,
+                              change_rate)
+    fake_telegram = FakeTelegram(tg_latency, tg_error_rate)
+    practicum.start()
+    fake_telegram.start()
+    endpoint = homework.ENDPOINT
+    homework.ENDPOINT = practicum.endpoint
+    bot = telegram.Bot(
+        token='1234:benchmark', base_url=fake_telegram.base_url,
+        request=Request(con_pool_size=workers))
+    dispatcher = Dispatcher(
+        lambda chat_id, message: homework.send_message_to(
+            bot, chat_id, message),
+        global_rate=global_rate, chat_rate=chat_rate, workers=workers)
+    policy = None
+    if adaptive:
+        policy = AdaptivePolicy(
+            floor=retry_time / 10, ceiling=retry_time * 3, base=retry_time)
+    rss_before = rss_bytes()
+    engine = PollingEngine(
+        [Tenant(f'token{i}', i + 1) for i in range(tenants)],
+        fetch=homework.get_api_answer_for,
+        check=homework.check_response,
+        parse=homework.parse_status,
+        send=dispatcher.submit,
+        retry_time=retry_time,
+        concurrency=concurrency,
+        policy=policy,
+    )
+    polls = POLLS.value()
+    notifications = NOTIFICATIONS.value()
+    histograms = [FETCH_SECONDS, PARSE_SECONDS, SEND_SECONDS]
+    snapshots = [histogram.snapshot() for histogram in histograms]
+    cpu = time.process_time()
+    started = time.perf_counter()
+    try:
+        dispatcher.start()
+        asyncio.run(_run_for(engine, duration))
+        dispatcher.close()
+    finally:
+        homework.ENDPOINT = endpoint
+        practicum.stop()
+        fake_telegram.stop()
+    elapsed = time.perf_counter() - started
+    cpu = time.process_time() - cpu
+    result = {
+        'tenants': tenants,
+        'elapsed': elapsed,
+        'polls_per_second': (POLLS.value() - polls) / elapsed,
+        'notifications_per_second':
+            (NOTIFICATIONS.value() - notifications) / elapsed,
+        'rss_per_tenant': max(rss_bytes() - rss_before, 0) / tenants,
+        'cpu_per_tenant': cpu / tenants,
+    }
+    for histogram, snapshot in zip(histograms, snapshots):
+        stage = histogram.name[len('bot_'):-len('_seconds')]
+        result[f'{stage}_p50'] = histogram.quantile(0.5, snapshot)
+        result[f'{stage}_p99'] = histogram.quantile(0.99, snapshot)
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=100)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--retry-time', type=float, default=1.0)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--homeworks', type=int, default=1)
+    parser.add_argument('--change-rate', type=float, default=0.1)
+    parser.add_argument('--api-latency', type=float, default=0.0)
+    parser.add_argument('--api-error-rate', type=float, default=0.0)
+    parser.add_argument('--tg-latency', type=float, default=0.0)
+    parser.add_argument('--tg-error-rate', type=float, default=0.0)
+    parser.add_argument('--global-rate', type=float, default=1000)
+    parser.add_argument('--chat-rate', type=float, default=100)
+    parser.add_argument('--adaptive', action='store_true',
+                        help='адаптивный интервал опроса')
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
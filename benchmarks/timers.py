@@ -0,0 +1,108 @@
+"""Бенчмарк колеса таймеров против кучи на миллионе сроков опроса.
+
+Запуск:
+    python -m benchmarks.timers --timers 1000000
+"""
+import argparse
+import gc
+import heapq
+import random
+import time
+
+from benchmarks.throughput import rss_bytes
+from scheduling import token_phase
+from timers import TimingWheel
+
+
+def _heap_reschedules(deadlines, rounds):
+    queue = [(deadline, index) for index, deadline in enumerate(deadlines)]
+    heapq.heapify(queue)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        deadline, index = heapq.heappop(queue)
+        heapq.heappush(queue, (deadline + 600, index))
+    return (time.perf_counter() - started) / rounds
+
+
+def run_benchmark(timers=1000000, interval=600.0, tick=0.05, rounds=3,
+                  seed=0):
+    """Гоняет колесо таймеров в виртуальном времени.
+    Ставит timers сроков, разложенных по interval секундам, и прокручивает
+    колесо rounds полных интервалов, переставляя каждый сработавший таймер
+    на interval вперёд.
+    Возвращает словарь со стоимостью операций, памятью после первого и
+    последнего оборота, опозданием срабатывания и числом срабатываний
+    по секундам.
+    """
+    rng = random.Random(seed)
+    tokens = [f'token{rng.getrandbits(64)}' for _ in range(timers)]
+    deadlines = [interval * token_phase(token) for token in tokens]
+    gc.collect()
+    rss_before = rss_bytes()
+    wheel = TimingWheel(tick, now=0.0)
+    started = time.perf_counter()
+    for index, deadline in enumerate(deadlines):
+        wheel.schedule(index, deadline, index)
+    insert_seconds = (time.perf_counter() - started) / timers
+    rss_after_insert = rss_bytes()
+
+    started = time.perf_counter()
+    for index in range(0, timers, 10):
+        wheel.cancel(index)
+    for index in range(0, timers, 10):
+        wheel.schedule(index, deadlines[index], index)
+    cancel_seconds = (time.perf_counter() - started) / (2 * (timers // 10))
+
+    fired = 0
+    late = 0.0
+    per_second = {}
+    advance_seconds = 0.0
+    steps = int(interval / tick)
+    rss_rounds = []
+    for step in range(1, rounds * steps + 1):
+        now = step * tick
+        started = time.perf_counter()
+        entries = wheel.advance(now)
+        for deadline, index in entries:
+            late = max(late, now - deadline)
+            wheel.schedule(index, deadline + interval, index)
+        advance_seconds += time.perf_counter() - started
+        fired += len(entries)
+        second = int((step - 1) * tick)
+        per_second[second] = per_second.get(second, 0) + len(entries)
+        if step % steps == 0:
+            rss_rounds.append(rss_bytes())
+    counts = list(per_second.values())
+    mean = sum(counts) / len(counts)
+    return {
+        'timers': timers,
+        'insert_us': insert_seconds * 1e6,
+        'cancel_reschedule_us': cancel_seconds * 1e6,
+        'heap_reschedule_us': _heap_reschedules(deadlines, 100000) * 1e6,
+        'fire_reschedule_us': advance_seconds / max(fired, 1) * 1e6,
+        'fired': fired,
+        'max_late_seconds': late,
+        'per_second_mean': mean,
+        'per_second_max': max(counts),
+        'per_second_min': min(counts),
+        'rss_mb_after_insert': (rss_after_insert - rss_before) / 2 ** 20,
+        'rss_mb_first_round': (rss_rounds[0] - rss_before) / 2 ** 20,
+        'rss_mb_last_round': (rss_rounds[-1] - rss_before) / 2 ** 20,
+    }
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--timers', type=int, default=1000000)
+    parser.add_argument('--interval', type=float, default=600.0)
+    parser.add_argument('--tick', type=float, default=0.05)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""Пропуски и объём ответов API при разных способах выбора from_date.
+
+Запуск:
+    python -m benchmarks.watermark --tenants 300 --days 1 --skew 120
+"""
+import argparse
+import random
+from bisect import bisect_right
+
+from clock import VirtualClock
+from engine import PollingEngine, Tenant
+
+START = 1640995200.0
+DAY = 24 * 3600
+
+
+def _iso(moment):
+    from datetime import datetime, timezone
+
+    return datetime.fromtimestamp(moment, timezone.utc).strftime(
+        '%Y-%m-%dT%H:%M:%SZ')
+
+
+class SyntheticApi:
+    """API, который отдаёт работы, обновлённые не раньше from_date.
+
+    Часы API отстают от часов бота на skew секунд, изменение становится
+    видно в ответах только через lag секунд после date_updated, а
+    current_date пропадает из доли missing ответов.
+    """
+
+    def __init__(self, clock, tenants, homeworks, days, skew, lag, missing,
+                 seed):
+        self.clock = clock
+        self.skew = skew
+        self.lag = lag
+        self.missing = missing
+        self.random = random.Random(seed)
+        self.events = {}
+        self.downloaded = 0
+        for tenant in range(tenants):
+            events = []
+            for key in range(homeworks):
+                moment = START + self.random.uniform(0, days * DAY * 0.8)
+                for status in ('reviewing', 'approved'):
+                    # Последние часы прогона оставлены на то, чтобы
+                    # изменения успели попасть в ответы.
+                    if moment < START + days * DAY * 0.9:
+                        events.append(
+                            (moment, tenant * homeworks + key, status))
+                    moment += self.random.expovariate(1 / 3600)
+            events.sort()
+            self.events[f'token{tenant}'] = events
+
+    def final(self, token):
+        """Возвращает последние статусы работ, которые отдаст API."""
+        return {key: status for _, key, status in self.events[token]}
+
+    def __call__(self, token, from_date):
+        """Отвечает на запрос владельца токена token."""
+        now = self.clock.time() - self.skew
+        events = self.events[token]
+        state = {}
+        for moment, key, status in events[:bisect_right(
+                events, (now - self.lag, float('inf')))]:
+            state[key] = (moment, status)
+        works = [
+            {'id': key, 'homework_name': f'hw{key}.zip', 'status': status,
+             'date_updated': _iso(moment)}
+            for key, (moment, status) in sorted(
+                state.items(), key=lambda item: item[1][0], reverse=True)
+            if moment >= from_date
+        ]
+        self.downloaded += len(works)
+        response = {'homeworks': works}
+        if self.random.random() >= self.missing:
+            response['current_date'] = int(now)
+        return response
+
+
+def _full(api):
+    return lambda token, timestamp: api(token, 0)
+
+
+def _from_current_date(api, clock):
+    # Прежний способ: from_date — current_date прошлого ответа, а без него —
+    # часы процесса.
+    last = {}
+
+    def fetch(token, timestamp):
+        from_date = last.get(token)
+        if from_date is None:
+            from_date = int(clock.time())
+        response = api(token, from_date)
+        last[token] = response.get('current_date')
+        return response
+
+    return fetch
+
+
+def _run(mode, tenants, homeworks, days, skew, lag, missing, retry_time,
+         overlap, seed):
+    clock = VirtualClock(START)
+    api = SyntheticApi(clock, tenants, homeworks, days, skew, lag, missing,
+                       seed)
+    fetch = api
+    if mode == 'full':
+        fetch = _full(api)
+    elif mode == 'current_date':
+        fetch = _from_current_date(api, clock)
+    sent = []
+    population = [Tenant(f'token{number}', number)
+                  for number in range(tenants)]
+    engine = PollingEngine(
+        population, fetch=fetch, check=lambda response: response['homeworks'],
+        parse=lambda homework: homework['status'],
+        send=lambda chat_id, message: sent.append(message),
+        retry_time=retry_time, overlap=overlap, clock=clock,
+    )
+    polls = engine.simulate(days * DAY)
+    missed = 0
+    for tenant in population:
+        for key, status in api.final(tenant.token).items():
+            missed += tenant.homeworks.status_of(key) != status
+    return {
+        'missed_statuses': missed,
+        'notifications': len(sent),
+        'homeworks_per_poll': api.downloaded / polls,
+    }
+
+
+def run_benchmark(tenants=300, homeworks=3, days=1.0, skew=120.0, lag=30.0,
+                  missing=0.05, retry_time=600, overlap=60, seed=0):
+    """Опрашивает синтетический API tenants подписок days суток.
+    Сравнивает запрос всей истории, from_date из current_date прошлого
+    ответа и отметку по датам работ с перекрытием overlap секунд.
+    Возвращает число незамеченных статусов, уведомлений и работ в ответе.
+    """
+    result = {}
+    for mode in ('full', 'current_date', 'watermark'):
+        run = _run(mode, tenants, homeworks, days, skew, lag, missing,
+                   retry_time, overlap, seed)
+        for name, value in run.items():
+            result[f'{mode}_{name}'] = value
+    return result
+
+
+def main():
+    """Разбирает аргументы командной строки и печатает результат."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tenants', type=int, default=300)
+    parser.add_argument('--homeworks', type=int, default=3)
+    parser.add_argument('--days', type=float, default=1.0)
+    parser.add_argument('--skew', type=float, default=120.0)
+    parser.add_argument('--lag', type=float, default=30.0)
+    parser.add_argument('--missing', type=float, default=0.05)
+    parser.add_argument('--retry-time', type=float, default=600)
+    parser.add_argument('--overlap', type=float, default=60)
+    args = parser.parse_args()
+    result = run_benchmark(**vars(args))
+    for name, value in result.items():
+        print(f'{name:>26}: {value:.6g}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+import json
+import logging
+import threading
+
+from streaming import loads
+
+
+class BufferedStore:
+    """Основа хранилищ состояния подписок с отложенной записью.
+
+    save() только кладёт состояние в буфер в памяти, а фоновый поток раз
+    в flush_interval секунд записывает весь буфер одним пакетом. Так
+    опрос не ждёт хранилища, а при падении теряется не больше одного
+    окна записи. Наследники реализуют load(), _write() и _close().
+    """
+
+    def __init__(self, flush_interval=1.0):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Запускает фоновую запись буфера."""
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._flush_loop, name='checkpoints', daemon=True)
+            self._thread.start()
+
+    def load(self, tenant_ids=None):
+        """Возвращает словарь состояний подписок по их идентификаторам.
+        Если передан список tenant_ids, загружаются только эти подписки.
+        """
+        raise NotImplementedError
+
+    def save(self, tenant_id, state):
+        """Запоминает состояние подписки для ближайшей записи."""
+        with self._lock:
+            self._pending[tenant_id] = state
+
+    def flush(self):
+        """Записывает накопленные состояния одним пакетом.
+        Пакеты пишутся по очереди, чтобы старый не затёр более новый.
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+            self._write({
+                tenant_id: json.dumps(state, ensure_ascii=False)
+                for tenant_id, state in pending.items()
+            })
+
+    def _write(self, rows):
+        raise NotImplementedError
+
+    def _close(self):
+        pass
+
+    def _flush_loop(self):
+        while not self._closed.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception as error:
+                logging.error(f'Ошибка записи контрольных точек: {error}')
+
+    def close(self):
+        """Останавливает фоновую запись и сохраняет остаток буфера."""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+        self._close()
+
+
+class CheckpointStore(BufferedStore):
+    """Хранит состояние подписок между перезапусками в SQLite.
+
+    Буфер записывается одной транзакцией, WAL-журнал защищает файл от
+    повреждения при аварии.
+    """
+
+    def __init__(self, path, flush_interval=1.0):
+        import sqlite3
+
+        super().__init__(flush_interval)
+        self.path = path
+        # Файл могут делить процессы-шарды, поэтому ждём чужую запись.
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS checkpoints ('
+            'tenant_id TEXT PRIMARY KEY, state TEXT NOT NULL)'
+        )
+        self._connection.commit()
+        self._db_lock = threading.Lock()
+
+    def load(self, tenant_ids=None):
+        """Возвращает словарь состояний подписок по их идентификаторам.
+        Если передан список tenant_ids, загружаются только эти подписки.
+        """
+        with self._db_lock:
+            if tenant_ids is None:
+                rows = self._connection.execute(
+                    'SELECT tenant_id, state FROM checkpoints').fetchall()
+            else:
+                rows = self._select(list(tenant_ids))
+        return {tenant_id: loads(state) for tenant_id, state in rows}
+
+    def _select(self, tenant_ids, chunk=500):
+        rows = []
+        for start in range(0, len(tenant_ids), chunk):
+            part = tenant_ids[start:start + chunk]
+            rows.extend(self._connection.execute(
+                'SELECT tenant_id, state FROM checkpoints WHERE tenant_id IN '
+                f'({",".join("?" * len(part))})', part).fetchall())
+        return rows
+
+    def _write(self, rows):
+        with self._db_lock:
+            with self._connection:
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO checkpoints (tenant_id, state) '
+                    'VALUES (?, ?)', list(rows.items())
+                )
+
+    def _close(self):
+        self._connection.close()
+
+
+def _batches(items, size):
+    """Делит поток items на списки не длиннее size."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class BackendCheckpointStore(BufferedStore):
+    """Хранит состояние подписок в общем для узлов хранилище.
+    Нужен, когда подписки переходят между узлами: новый владелец
+    продолжает с того же from_date и индекса статусов. Состояния читаются
+    пакетами по batch ключей.
+    """
+
+    def __init__(self, backend, prefix='homework_bot', flush_interval=1.0,
+                 batch=1000):
+        super().__init__(flush_interval)
+        self.backend = backend
+        self.prefix = f'{prefix}:state:'
+        self.batch = batch
+
+    def load(self, tenant_ids=None):
+        """Возвращает словарь состояний подписок по их идентификаторам.
+        Если передан список tenant_ids, загружаются только эти подписки.
+        """
+        if tenant_ids is None:
+            keys = self.backend.scan(self.prefix + '*', self.batch)
+        else:
+            keys = (self.prefix + tenant_id for tenant_id in tenant_ids)
+        states = {}
+        for part in _batches(keys, self.batch):
+            for key, value in zip(part, self.backend.mget(part)):
+                if value is not None:
+                    states[key[len(self.prefix):]] = loads(value)
+        return states
+
+    def _write(self, rows):
+        self.backend.mset({
+            self.prefix + tenant_id: state
+            for tenant_id, state in rows.items()
+        })
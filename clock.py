@@ -0,0 +1,57 @@
+import threading
+import time
+
+
+class SystemClock:
+    """Настоящие часы процесса."""
+
+    def time(self):
+        """Возвращает время Unix в секундах."""
+        return time.time()
+
+    def monotonic(self):
+        """Возвращает показания монотонных часов."""
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        """Останавливает поток на seconds секунд."""
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Часы, которые идут только по вызовам advance(), advance_to() и sleep().
+
+    Обе шкалы, time() и monotonic(), показывают одно и то же время, поэтому
+    записанные моменты из API и сроки опроса сравнимы напрямую. Сутки
+    опроса на таких часах проходят за то время, которое нужно на сами
+    вызовы, без ожидания.
+    """
+
+    def __init__(self, start=0.0):
+        self._now = float(start)
+        self._lock = threading.Lock()
+
+    def time(self):
+        """Возвращает текущее виртуальное время."""
+        return self._now
+
+    def monotonic(self):
+        """Возвращает текущее виртуальное время."""
+        return self._now
+
+    def sleep(self, seconds):
+        """Сдвигает часы на seconds секунд вместо ожидания."""
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        """Сдвигает часы вперёд на seconds секунд."""
+        with self._lock:
+            self._now += max(seconds, 0)
+
+    def advance_to(self, moment):
+        """Переводит часы на moment, если он ещё не наступил."""
+        with self._lock:
+            self._now = max(self._now, moment)
+
+
+SYSTEM_CLOCK = SystemClock()
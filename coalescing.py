@@ -0,0 +1,72 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+from metrics import FETCH_SHARED
+from streaming import HomeworkStream
+
+
+class CoalescingFetcher:
+    """Объединяет одинаковые запросы к API от разных подписок.
+
+    Ключ запроса — токен и from_date. Если такой запрос уже выполняется,
+    остальные подписки ждут его результата, а не делают свой. Успешный
+    ответ ещё ttl секунд отдаётся из кэша, который хранит не больше
+    max_size ответов и вытесняет давно не использованные. Ответ общий для
+    всех подписок, поэтому изменять его нельзя. Потоковый ответ
+    HomeworkStream читается один раз, поэтому не кэшируется, а ждавшие
+    его подписки делают свой запрос.
+    """
+
+    def __init__(self, fetch, ttl=5, max_size=4096):
+        self.fetch = fetch
+        self.ttl = ttl
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, token, timestamp):
+        """Возвращает ответ API для токена, по возможности чужой."""
+        if timestamp is None:
+            timestamp = int(time.time())
+        key = (token, timestamp)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] > time.monotonic():
+                self._cache.move_to_end(key)
+                FETCH_SHARED.inc('cache')
+                return cached[1]
+            future = self._in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._in_flight[key] = future
+        if not leader:
+            response = future.result()
+            if response is None:
+                return self.fetch(token, timestamp)
+            FETCH_SHARED.inc('in_flight')
+            return response
+        try:
+            response = self.fetch(token, timestamp)
+        except Exception as error:
+            future.set_exception(error)
+            raise
+        else:
+            shared = not isinstance(response, HomeworkStream)
+            future.set_result(response if shared else None)
+            if shared:
+                self._store(key, response)
+            return response
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+
+    def _store(self, key, response):
+        with self._lock:
+            self._cache[key] = (time.monotonic() + self.ttl, response)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
@@ -0,0 +1,162 @@
+import logging
+import threading
+import time
+
+from engine import Tenant
+
+HELP = ('/status — последние известные статусы ваших работ\n'
+        '/history [N] — последние N смен статусов (по умолчанию 10)')
+HISTORY_LIMIT = 50
+
+
+class TenantDirectory:
+    """Находит состояние подписок чата для ответов на команды.
+
+    Подписки, которые опрашивает движок engine этого процесса, читаются
+    прямо из памяти, остальные — из хранилища контрольных точек store,
+    куда их сохраняют другие процессы. Ни то, ни другое не обращается к
+    API Практикума.
+    """
+
+    def __init__(self, tenants, engine=None, store=None):
+        self.engine = engine
+        self.store = store
+        self._by_chat = {}
+        for tenant in tenants:
+            self._by_chat.setdefault(str(tenant.chat_id), []).append(tenant)
+
+    def tenants(self, chat_id):
+        """Возвращает подписки чата с их последним известным состоянием."""
+        found = []
+        missing = []
+        for tenant in self._by_chat.get(str(chat_id), []):
+            live = None
+            if self.engine is not None:
+                live = self.engine.tenant(tenant.tenant_id)
+            if live is not None:
+                found.append(live)
+            else:
+                missing.append(tenant)
+        if missing and self.store is not None:
+            states = self.store.load([tenant.tenant_id for tenant in missing])
+            for tenant in missing:
+                copy = Tenant(tenant.token, tenant.chat_id, tenant.tenant_id)
+                copy.restore(states.get(tenant.tenant_id, {}))
+                found.append(copy)
+        else:
+            found.extend(missing)
+        return found
+
+
+class CommandHandler:
+    """Отвечает на команды чата /status и /history.
+
+    Статусы берутся из directory, история — из журнала смен статусов
+    history, если он есть. verdicts переводит статус в текст для ответа.
+    """
+
+    def __init__(self, directory, history=None, verdicts=None):
+        self.directory = directory
+        self.history = history
+        self.verdicts = verdicts or {}
+
+    def handle(self, chat_id, text):
+        """Возвращает ответ на команду text или None, если это не команда."""
+        if not text or not text.startswith('/'):
+            return None
+        command, *args = text.split()
+        command = command.split('@', 1)[0].lower()
+        if command == '/status':
+            return self.status(chat_id)
+        if command == '/history':
+            limit = 10
+            if args and args[0].isdigit():
+                limit = min(max(int(args[0]), 1), HISTORY_LIMIT)
+            return self.recent(chat_id, limit)
+        return HELP
+
+    def status(self, chat_id):
+        """Возвращает последние известные статусы работ чата."""
+        tenants = self.directory.tenants(chat_id)
+        if not tenants:
+            return 'Этот чат не подписан на статусы работ.'
+        lines = []
+        for tenant in tenants:
+            for record in tenant.homeworks:
+                verdict = self.verdicts.get(record.status, record.status)
+                lines.append(f'{record.name or record.key}: {verdict}')
+        if not lines:
+            return 'Изменений статусов работ пока не было.'
+        return '\n'.join(lines)
+
+    def recent(self, chat_id, limit=10):
+        """Возвращает последние limit смен статусов работ чата."""
+        if self.history is None:
+            return 'История статусов не ведётся.'
+        tenants = self.directory.tenants(chat_id)
+        if not tenants:
+            return 'Этот чат не подписан на статусы работ.'
+        transitions = []
+        for tenant in tenants:
+            transitions.extend(
+                self.history.history(tenant.tenant_id, limit=limit))
+        transitions.sort(key=lambda transition: transition.detected_at)
+        if not transitions:
+            return 'Изменений статусов работ пока не было.'
+        return '\n'.join(
+            f'{time.strftime("%Y-%m-%d %H:%M", time.gmtime(item.detected_at))}'
+            f' UTC {item.name or item.key}: {item.old or "—"} → {item.new}'
+            for item in transitions[-limit:]
+        )
+
+
+class CommandPoller:
+    """Получает команды из Telegram длинным опросом getUpdates.
+
+    Работает в своём потоке и не задерживает опрос API: ответы берутся из
+    памяти и хранилища через handler и ставятся в очередь send. Ошибка
+    getUpdates повторяется через retry секунд.
+    """
+
+    def __init__(self, bot, handler, send, timeout=30, retry=5):
+        self.bot = bot
+        self.handler = handler
+        self.send = send
+        self.timeout = timeout
+        self.retry = retry
+        self._offset = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def poll_once(self):
+        """Обрабатывает одну пачку обновлений и возвращает её размер."""
+        updates = self.bot.get_updates(
+            offset=self._offset, timeout=self.timeout,
+            allowed_updates=['message'])
+        for update in updates:
+            self._offset = update.update_id + 1
+            message = update.message
+            if message is None:
+                continue
+            reply = self.handler.handle(message.chat_id, message.text)
+            if reply:
+                self.send(message.chat_id, reply)
+        return len(updates)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self.poll_once()
+            except Exception as error:
+                logging.error(f'Не удалось получить команды: {error}')
+                self._stopped.wait(self.retry)
+
+    def start(self):
+        """Запускает поток приёма команд."""
+        self._thread = threading.Thread(
+            target=self._run, name='commands', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает приём команд после текущего запроса getUpdates."""
+        self._stopped.set()
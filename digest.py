@@ -0,0 +1,159 @@
+import heapq
+import logging
+import threading
+import time
+
+from metrics import DIGESTED
+
+
+class _Batch:
+    __slots__ = ('messages', 'callbacks', 'length', 'deadline')
+
+    def __init__(self, deadline):
+        self.messages = []
+        self.callbacks = []
+        self.length = 0
+        self.deadline = deadline
+
+    def on_done(self, error=None):
+        for callback in self.callbacks:
+            callback(error)
+
+
+class Digest:
+    """Собирает уведомления одного чата в одно сообщение.
+
+    Первое уведомление чата открывает сводку, которая уходит через window
+    секунд. Уведомления, пришедшие за это время, добавляются в неё через
+    пустую строку. Сводка уходит раньше, если в ней max_messages
+    уведомлений или следующее не поместится в max_length символов
+    (предел длины сообщения Telegram). Для уведомления, на котором
+    urgent(message) истинно, сводка уходит не позже чем через
+    urgent_delay секунд. При window не больше нуля уведомления уходят в
+    send сразу, по одному.
+
+    Сводки передаются в send под блокировкой, чтобы сводки одного чата не
+    обгоняли друг друга, поэтому send должен только ставить сообщение в
+    очередь, как Dispatcher.submit. Если у уведомлений есть on_done, они
+    вызываются, когда send сообщит, отправлена ли сводка.
+    """
+
+    def __init__(self, send, window=60, max_messages=20, urgent_delay=10,
+                 urgent=None, max_length=4096):
+        self.send = send
+        self.window = window
+        self.max_messages = max_messages
+        self.urgent_delay = urgent_delay
+        self.urgent = urgent
+        self.max_length = max_length
+        self._batches = {}
+        self._deadlines = []
+        self._counter = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def __len__(self):
+        return sum(len(batch.messages) for batch in self._batches.values())
+
+    def submit(self, chat_id, message, on_done=None):
+        """Добавляет уведомление в сводку чата, не дожидаясь отправки."""
+        if self.window <= 0:
+            self._send(chat_id, message, on_done)
+            return
+        now = time.monotonic()
+        with self._condition:
+            batch = self._batches.get(chat_id)
+            if batch is not None and (
+                    batch.length + len(message) + 2 > self.max_length):
+                self._deliver(chat_id, self._batches.pop(chat_id))
+                batch = None
+            if batch is None:
+                batch = _Batch(now + self.window)
+                self._batches[chat_id] = batch
+                self._schedule(chat_id, batch.deadline)
+            batch.messages.append(message)
+            if on_done is not None:
+                batch.callbacks.append(on_done)
+            batch.length += len(message) + 2
+            if self.urgent is not None and self.urgent(message):
+                deadline = now + self.urgent_delay
+                if deadline < batch.deadline:
+                    batch.deadline = deadline
+                    self._schedule(chat_id, deadline)
+            if len(batch.messages) >= self.max_messages:
+                self._deliver(chat_id, self._batches.pop(chat_id))
+
+    def _schedule(self, chat_id, deadline):
+        self._counter += 1
+        heapq.heappush(self._deadlines, (deadline, self._counter, chat_id))
+        self._condition.notify()
+
+    def _deliver(self, chat_id, batch):
+        if len(batch.messages) > 1:
+            DIGESTED.inc(amount=len(batch.messages))
+        try:
+            self._send(chat_id, '\n\n'.join(batch.messages),
+                       batch.on_done if batch.callbacks else None)
+        except Exception as error:
+            logging.error(f'Сводка для чата {chat_id} не отправлена: {error}')
+            batch.on_done(error)
+
+    def _send(self, chat_id, message, on_done):
+        if on_done is None:
+            self.send(chat_id, message)
+        else:
+            self.send(chat_id, message, on_done)
+
+    def _due(self):
+        """Дожидается сводки, срок которой наступил."""
+        while self._running:
+            if not self._deadlines:
+                self._condition.wait()
+                continue
+            deadline, _, chat_id = self._deadlines[0]
+            now = time.monotonic()
+            if deadline > now:
+                self._condition.wait(deadline - now)
+                continue
+            heapq.heappop(self._deadlines)
+            batch = self._batches.get(chat_id)
+            # Устаревшие сроки остаются в куче и пропускаются здесь.
+            if batch is not None and batch.deadline <= now:
+                del self._batches[chat_id]
+                return chat_id, batch
+        return None
+
+    def _run(self):
+        with self._condition:
+            while True:
+                item = self._due()
+                if item is None:
+                    return
+                self._deliver(*item)
+
+    def flush(self):
+        """Отправляет все накопленные сводки сразу."""
+        with self._condition:
+            batches, self._batches = self._batches, {}
+            self._deadlines = []
+            for chat_id, batch in batches.items():
+                self._deliver(chat_id, batch)
+
+    def start(self):
+        """Запускает поток, отправляющий сводки по сроку."""
+        if self.window <= 0:
+            return
+        self._running = True
+        self._thread = threading.Thread(
+            target=self._run, name='digest', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        """Останавливает поток и отправляет оставшиеся сводки."""
+        with self._condition:
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
@@ -0,0 +1,227 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import ERRORS, NOTIFICATIONS, SEND_SECONDS
+
+
+class TokenBucket:
+    """Ведро токенов: rate токенов в секунду, не больше capacity сразу."""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def wait_time(self, now):
+        """Возвращает, сколько секунд ждать до появления токена."""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now):
+        """Забирает один токен."""
+        self._refill(now)
+        self.tokens -= 1
+
+    def is_full(self, now):
+        """Проверяет, восстановилось ли ведро полностью."""
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+def retry_after(error):
+    """Возвращает паузу из ответа 429 Telegram, если ошибка вызвана им."""
+    while error is not None:
+        delay = getattr(error, 'retry_after', None)
+        if delay is not None:
+            return delay
+        error = error.__cause__
+    return None
+
+
+class Dispatcher:
+    """Очередь исходящих сообщений в Telegram с ограничением частоты.
+
+    Опрос только кладёт сообщение в очередь чата и сразу продолжает
+    работу. Отдельный поток выбирает чаты, для которых есть токены и в
+    ведре чата, и в общем ведре бота, и отдаёт отправку в пул потоков.
+    Сообщения одного чата уходят строго по очереди. Если Telegram ответил
+    429, чат ставится на паузу на retry_after секунд, а сообщение
+    возвращается в начало его очереди. Если у сообщения есть on_done, он
+    вызывается после отправки с None, а если сообщение не отправлено —
+    с ошибкой. Если задан max_pending, submit ждёт, пока в очереди
+    больше max_pending сообщений: медленный Telegram придерживает опрос,
+    а не копит сообщения в памяти.
+    """
+
+    def __init__(self, send, global_rate=30, chat_rate=1, workers=8,
+                 max_pending=0):
+        self.send = send
+        self.max_pending = max_pending
+        self.chat_rate = chat_rate
+        self.workers = workers
+        self._global = TokenBucket(global_rate, global_rate, time.monotonic())
+        self._buckets = {}
+        self._chats = {}
+        self._ready = []
+        self._counter = 0
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+        self._executor = None
+
+    def __len__(self):
+        return self._pending
+
+    def set_global_rate(self, rate):
+        """Меняет общий лимит бота на rate сообщений в секунду.
+        Накопленный запас токенов не превышает нового лимита.
+        """
+        with self._condition:
+            bucket = self._global
+            bucket._refill(time.monotonic())
+            bucket.rate = rate
+            bucket.capacity = rate
+            bucket.tokens = min(bucket.tokens, rate)
+            self._condition.notify_all()
+
+    def submit(self, chat_id, message, on_done=None):
+        """Ставит сообщение в очередь отправки, не дожидаясь её.
+        Ждёт только места в очереди, если задан max_pending.
+        """
+        item = (message, on_done)
+        with self._condition:
+            while (self.max_pending and self._running
+                   and self._pending >= self.max_pending):
+                self._condition.wait()
+            self._pending += 1
+            queue = self._chats.get(chat_id)
+            if queue is None:
+                self._chats[chat_id] = deque([item])
+                self._push(chat_id, time.monotonic())
+            else:
+                queue.append(item)
+
+    def _push(self, chat_id, not_before):
+        self._counter += 1
+        heapq.heappush(self._ready, (not_before, self._counter, chat_id))
+        # На условии могут ждать и submit, поэтому будятся все.
+        self._condition.notify_all()
+
+    def _bucket(self, chat_id, now):
+        bucket = self._buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.chat_rate, 1, now)
+            self._buckets[chat_id] = bucket
+        return bucket
+
+    def _next(self):
+        """Дожидается чата, которому можно отправить сообщение."""
+        while self._running:
+            if not self._ready:
+                self._condition.wait()
+                continue
+            now = time.monotonic()
+            not_before, _, chat_id = self._ready[0]
+            if not_before > now:
+                self._condition.wait(not_before - now)
+                continue
+            heapq.heappop(self._ready)
+            bucket = self._bucket(chat_id, now)
+            delay = max(bucket.wait_time(now), self._global.wait_time(now))
+            if delay > 0:
+                self._push(chat_id, now + delay)
+                continue
+            bucket.consume(now)
+            self._global.consume(now)
+            return chat_id, self._chats[chat_id].popleft()
+        return None
+
+    def _deliver(self, chat_id, item):
+        message, on_done = item
+        pause = 0
+        failure = None
+        started = time.perf_counter()
+        try:
+            self.send(chat_id, message)
+            NOTIFICATIONS.inc()
+        except Exception as error:
+            ERRORS.inc('send')
+            failure = error
+            pause = retry_after(error)
+            if pause is None:
+                logging.error(f'Сообщение в чат {chat_id} не отправлено: '
+                              f'{error}')
+            else:
+                logging.warning(f'Telegram просит паузу {pause} с '
+                                f'для чата {chat_id}')
+        SEND_SECONDS.observe(time.perf_counter() - started)
+        if on_done is not None and not pause:
+            try:
+                on_done(failure)
+            except Exception as error:
+                logging.error(f'Ошибка после отправки в чат {chat_id}: '
+                              f'{error}')
+        with self._condition:
+            queue = self._chats[chat_id]
+            if pause:
+                queue.appendleft(item)
+            else:
+                self._pending -= 1
+            if queue:
+                self._push(chat_id, time.monotonic() + (pause or 0))
+            else:
+                del self._chats[chat_id]
+                self._prune(time.monotonic())
+            self._condition.notify_all()
+
+    def _prune(self, now):
+        """Удаляет вёдра простаивающих чатов, чтобы не копить память."""
+        if len(self._buckets) > 2 * len(self._chats) + 1024:
+            self._buckets = {
+                chat_id: bucket for chat_id, bucket in self._buckets.items()
+                if chat_id in self._chats or not bucket.is_full(now)
+            }
+
+    def _run(self):
+        with self._condition:
+            while True:
+                item = self._next()
+                if item is None:
+                    return
+                self._executor.submit(self._deliver, *item)
+
+    def start(self):
+        """Запускает поток отправки."""
+        self._running = True
+        self._executor = ThreadPoolExecutor(self.workers)
+        self._thread = threading.Thread(
+            target=self._run, name='dispatcher', daemon=True)
+        self._thread.start()
+
+    def close(self, timeout=10):
+        """Дожидается отправки очереди, но не дольше timeout секунд."""
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._pending and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            self._running = False
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,647 @@
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from clock import SYSTEM_CLOCK
+from exceptions import CircuitOpenException
+from metrics import (ERRORS, FETCH_SECONDS, LOOP_LAG_SECONDS, PARSE_SECONDS,
+                     POLLS, TENANTS)
+from records import Homework, HomeworkIndex, parse_timestamp
+from scheduling import FixedPolicy, token_phase
+from timers import TimingWheel
+
+
+class Tenant:
+    """Подписка одного чата на статусы одного токена Практикума.
+
+    Слоты вместо словаря атрибутов: на тысячи подписок это заметная
+    экономия памяти. В homeworks хранится последний известный статус
+    каждой работы, по нему определяются настоящие переходы. watermark —
+    момент по часам API, до которого изменения уже учтены, timestamp —
+    from_date следующего запроса. Восстановленный индекс разбирается при
+    первом обращении к homeworks, поэтому восстановление подписок не
+    зависит от числа их работ.
+    """
+
+    __slots__ = ('tenant_id', 'token', 'chat_id', 'timestamp', 'watermark',
+                 '_homeworks', '_packed', 'error_message', 'interval',
+                 'failures', 'retry_after')
+
+    def __init__(self, token, chat_id, tenant_id=None, timestamp=None):
+        self.tenant_id = str(tenant_id or chat_id)
+        self.token = token
+        self.chat_id = chat_id
+        self.timestamp = timestamp
+        self.watermark = None
+        self._homeworks = HomeworkIndex()
+        self._packed = None
+        self.error_message = ''
+        self.interval = None
+        self.failures = 0
+        self.retry_after = None
+
+    def __repr__(self):
+        return f'Tenant({self.tenant_id!r})'
+
+    @property
+    def homeworks(self):
+        """Индекс последних статусов работ подписки."""
+        if self._packed is not None:
+            self._homeworks = HomeworkIndex.load(self._packed)
+            self._packed = None
+        return self._homeworks
+
+    @homeworks.setter
+    def homeworks(self, homeworks):
+        self._homeworks = homeworks
+        self._packed = None
+
+    @property
+    def statuses(self):
+        """Словарь последних статусов по строковым ключам работ."""
+        return self.homeworks.statuses()
+
+    @statuses.setter
+    def statuses(self, statuses):
+        self.homeworks = HomeworkIndex.from_statuses(statuses)
+
+    def advance(self, watermark, overlap=0):
+        """Сдвигает отметку watermark вперёд и пересчитывает from_date.
+        Отметка никогда не уходит назад, а запрос захватывает ещё overlap
+        секунд до неё: так не теряются работы, которые API показал с
+        опозданием, а повторы отсеивает индекс статусов.
+        """
+        if watermark is not None and (
+                self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+        if self.watermark is not None:
+            self.timestamp = max(int(self.watermark - overlap), 0)
+
+    def checkpoint(self):
+        """Возвращает состояние подписки для сохранения между запусками."""
+        homeworks = self._packed
+        if homeworks is None:
+            homeworks = self._homeworks.dump()
+        return {
+            'timestamp': self.timestamp,
+            'watermark': self.watermark,
+            'homeworks': homeworks,
+            'error_message': self.error_message,
+            'interval': self.interval,
+        }
+
+    def restore(self, state):
+        """Восстанавливает состояние, сохранённое методом checkpoint()."""
+        self.timestamp = state.get('timestamp', self.timestamp)
+        self.watermark = state.get('watermark', self.watermark)
+        if 'homeworks' in state:
+            self._packed = state['homeworks']
+        elif 'statuses' in state:
+            # Контрольные точки старого формата.
+            self.statuses = state['statuses']
+        self.error_message = state.get('error_message', self.error_message)
+        self.interval = state.get('interval', self.interval)
+
+
+def watermark(response, latest, failed=()):
+    """Возвращает момент, до которого ответ API учтён полностью.
+    Это наибольшая из current_date и latest — самой поздней даты
+    обновления работ, но не позже даты работы из failed, которую не
+    удалось обработать: она придёт снова в следующем ответе. Если дат
+    нет, возвращает None.
+    """
+    dates = [] if latest is None else [latest]
+    current = response.get('current_date')
+    if isinstance(current, (int, float)) and not isinstance(current, bool):
+        dates.append(current)
+    for homework in failed:
+        if not isinstance(homework, dict):
+            continue
+        updated = parse_timestamp(homework.get('date_updated'))
+        if updated is None:
+            return None
+        dates = [min(date, updated) for date in dates]
+    return max(dates, default=None)
+
+
+def load_tenants(path=None, token=None, chat_id=None):
+    """Загружает список подписок.
+    Если задан путь к JSON-файлу, читает из него список объектов с ключами
+    token, chat_id и необязательным id. Иначе возвращает единственную
+    подписку из переменных окружения. Идентификатор подписки по умолчанию
+    — chat_id, и состояние подписок хранится по нему, поэтому повтор
+    идентификатора — ошибка: второй токен того же чата требует своего id.
+    """
+    if not path:
+        if not (token and chat_id):
+            return []
+        return [Tenant(token, chat_id)]
+    with open(path, encoding='utf-8') as file:
+        entries = json.load(file)
+    if not isinstance(entries, list):
+        raise TypeError('Файл подписок должен содержать список')
+    tenants = [
+        Tenant(entry['token'], entry['chat_id'], entry.get('id'))
+        for entry in entries
+    ]
+    seen = set()
+    for tenant in tenants:
+        if tenant.tenant_id in seen:
+            raise ValueError(f'Подписка {tenant.tenant_id} указана дважды, '
+                             f'задайте ей отдельный id')
+        seen.add(tenant.tenant_id)
+    return tenants
+
+
+class _Poll:
+    """Опрос одной подписки по пути через шаги движка."""
+
+    __slots__ = ('tenant', 'response', 'homeworks', 'latest', 'failed')
+
+    def __init__(self, tenant, response):
+        self.tenant = tenant
+        self.response = response
+        self.homeworks = ()
+        self.latest = None
+        self.failed = []
+
+
+class PollingEngine:
+    """Опрашивает API Практикума для множества подписок в одном процессе.
+
+    Сроки следующего опроса хранятся в иерархическом колесе таймеров с
+    шагом tick секунд: постановка и отмена срока стоят O(1), и на
+    подписку не заводится отдельная корутина. Блокирующие вызовы цепочки
+    fetch -> check -> parse -> send выполняются в пуле потоков, размер
+    которого ограничивает число одновременных запросов к API. Те же шаги
+    по отдельности (fetch_step, validate_step, diff_step, render_step,
+    send_step) собираются в конвейер pipeline.Pipeline методом sweep():
+    первые три — в один шаг receive_step.
+    Если передано хранилище store, состояние подписок восстанавливается
+    из него при запуске и сохраняется после каждого опроса. Интервал до
+    следующего опроса выбирает policy, по умолчанию — retry_time для всех,
+    а после сбоев запроса к API — backoff, если он передан. Замеченные
+    смены статусов дописываются в журнал history, если он передан.
+    Сроки опроса отсчитываются по часам clock; с виртуальными часами
+    simulate() прогоняет опрос без ожидания. from_date каждого запроса —
+    отметка подписки из дат ответа API минус overlap секунд, поэтому
+    запрос получает только новые изменения и не зависит от часов
+    процесса; первый запрос подписки идёт с текущего момента. Если
+    передана надёжная очередь outbox, уведомления о статусах кладутся в
+    неё с ключом идемпотентности, а не отправляются через send.
+    """
+
+    def __init__(self, tenants, fetch, check, parse, send,
+                 retry_time=600, concurrency=32, store=None, policy=None,
+                 backoff=None, tick=0.05, history=None, clock=None,
+                 outbox=None, overlap=60):
+        self.clock = clock or SYSTEM_CLOCK
+        self.store = store
+        self.history = history
+        self.outbox = outbox
+        self.backoff = backoff
+        self.policy = policy or FixedPolicy(retry_time)
+        self.fetch = fetch
+        self.check = check
+        self.parse = parse
+        self.send = send
+        self.retry_time = retry_time
+        self.overlap = overlap
+        self.concurrency = concurrency
+        self.tenants = list(tenants)
+        self._active = {}
+        self._polling = {}
+        self._timers = TimingWheel(tick, now=self.clock.monotonic())
+        self._sleep_until = None
+        self._running = False
+        self._wakeup = None
+        self._loop = None
+        self.started = threading.Event()
+
+    def schedule(self, tenant, deadline):
+        """Ставит подписку в очередь на опрос к моменту deadline.
+        Прежний срок опроса этой подписки отменяется.
+        """
+        self._timers.schedule(tenant.tenant_id, deadline, tenant)
+        if (self._wakeup is not None and self._sleep_until is not None
+                and deadline < self._sleep_until):
+            self._wakeup.set()
+
+    def tenant(self, tenant_id):
+        """Возвращает опрашиваемую подписку с идентификатором tenant_id.
+        Если движок её не опрашивает, возвращает None.
+        """
+        return self._active.get(str(tenant_id))
+
+    def poll_once(self, tenant):
+        """Выполняет один цикл опроса подписки.
+        Уведомление отправляется по каждой работе, статус которой
+        отличается от запомненного в индексе подписки. Ошибки сообщаются
+        в чат один раз. Возвращает число отправленных уведомлений.
+        """
+        poll = self.fetch_step(tenant)
+        if poll is None:
+            return 0
+        started = time.perf_counter()
+        for step in (self.validate_step, self.diff_step, self.render_step):
+            poll = step(poll)
+            if poll is None:
+                return 0
+        changed = self.send_step(poll)
+        PARSE_SECONDS.observe(time.perf_counter() - started)
+        return changed
+
+    def fetch_step(self, tenant):
+        """Запрашивает API для подписки.
+        Возвращает опрос для следующих шагов или None, если запрос не
+        удался.
+        """
+        POLLS.inc()
+        if tenant.timestamp is None:
+            tenant.timestamp = max(int(self.clock.time() - self.overlap), 0)
+        started = time.perf_counter()
+        try:
+            response = self.fetch(tenant.token, tenant.timestamp)
+        except CircuitOpenException as error:
+            # Недоступность API уже сообщена в чат исходной ошибкой.
+            logging.debug(f'{tenant.tenant_id}: {error}')
+            tenant.retry_after = error.retry_after
+            return None
+        except Exception as error:
+            ERRORS.inc('fetch')
+            tenant.failures += 1
+            tenant.retry_after = getattr(error, 'retry_after', None)
+            self.report_error(tenant, error)
+            return None
+        finally:
+            FETCH_SECONDS.observe(time.perf_counter() - started)
+        tenant.failures = 0
+        tenant.retry_after = None
+        return _Poll(tenant, response)
+
+    def receive_step(self, tenant):
+        """Выполняет fetch_step, validate_step и diff_step одним шагом.
+        Потоковый ответ дочитывается в потоке, который его запросил, и в
+        очереди конвейера не ждут занятые им соединения пула.
+        """
+        poll = self.fetch_step(tenant)
+        if poll is not None:
+            poll = self.validate_step(poll)
+        if poll is not None:
+            poll = self.diff_step(poll)
+        return poll
+
+    def validate_step(self, poll):
+        """Проверяет ответ API функцией check."""
+        try:
+            poll.homeworks = self.check(poll.response)
+        except Exception as error:
+            ERRORS.inc('check')
+            self.report_error(poll.tenant, error)
+            return None
+        return poll
+
+    def diff_step(self, poll):
+        """Отбирает работы, статус которых отличается от индекса подписки.
+        Работы читаются по одной, поэтому потоковый ответ не собирается в
+        памяти целиком. Запоминает и самую позднюю дату обновления среди
+        всех работ ответа.
+        """
+        changed = []
+        latest = None
+        try:
+            for homework in poll.homeworks:
+                if isinstance(homework, dict):
+                    updated = parse_timestamp(homework.get('date_updated'))
+                    if updated is not None and (
+                            latest is None or updated > latest):
+                        latest = updated
+                    record = Homework.from_api(homework)
+                    if self._unchanged(poll.tenant, record):
+                        continue
+                changed.append(homework)
+        except Exception as error:
+            ERRORS.inc('check')
+            self.report_error(poll.tenant, error)
+            return None
+        # API отдаёт работы от новых к старым, а сообщать удобнее по порядку.
+        changed.reverse()
+        poll.homeworks = changed
+        poll.latest = latest
+        return poll
+
+    def render_step(self, poll):
+        """Готовит тексты уведомлений функцией parse."""
+        rendered = []
+        for homework in poll.homeworks:
+            try:
+                entry = self._render(poll.tenant, homework)
+            except Exception as error:
+                ERRORS.inc('parse')
+                poll.failed.append(homework)
+                self.report_error(poll.tenant, error)
+            else:
+                if entry is not None:
+                    rendered.append(entry)
+        poll.homeworks = rendered
+        return poll
+
+    def send_step(self, poll):
+        """Отправляет уведомления и сдвигает отметку подписки.
+        Возвращает число отправленных уведомлений.
+        """
+        tenant = poll.tenant
+        sent = 0
+        for entry in poll.homeworks:
+            try:
+                self._deliver(tenant, *entry)
+            except Exception as error:
+                ERRORS.inc('send')
+                poll.failed.append(entry[0])
+                self.report_error(tenant, error)
+            else:
+                sent += 1
+        tenant.advance(watermark(poll.response, poll.latest, poll.failed),
+                       self.overlap)
+        return sent
+
+    def notify(self, tenant, homework):
+        """Сообщает об изменении статуса работы.
+        Работа, статус которой совпадает с индексом подписки, пропускается.
+        Возвращает True, если уведомление отправлено.
+        """
+        entry = self._render(tenant, homework)
+        if entry is None:
+            return False
+        self._deliver(tenant, *entry)
+        return True
+
+    def _render(self, tenant, homework):
+        record = Homework.from_api(homework)
+        if self._unchanged(tenant, record):
+            return None
+        old = tenant.homeworks.status_of(record.key)
+        return homework, record, old, self.parse(homework)
+
+    @staticmethod
+    def _unchanged(tenant, record):
+        """Проверяет, что статус работы уже есть в индексе подписки.
+        Работа без статуса изменённой не считается: её отклонит parse.
+        """
+        return (record.status is not None
+                and tenant.homeworks.status_of(record.key) == record.status)
+
+    def _deliver(self, tenant, homework, record, old, message):
+        logging.info(f'Сообщение в чат {tenant.chat_id}: {message}')
+        if self.outbox is not None:
+            # Повторная смена на тот же статус отличается датой обновления.
+            self.outbox.put(
+                tenant.chat_id, message,
+                f'{tenant.tenant_id}:{record.key}:{record.status}:'
+                f'{homework.get("date_updated") or ""}')
+        else:
+            self.send(tenant.chat_id, message)
+        tenant.homeworks.set(record)
+        if self.history is not None:
+            try:
+                self.history.append(
+                    tenant.tenant_id, record.key, record.name, old,
+                    record.status,
+                    parse_timestamp(homework.get('date_updated')))
+            except OSError as error:
+                logging.error(f'Не удалось записать историю: {error}')
+
+    def stages(self, fetch_workers=None, workers=1, send_workers=1,
+               capacity=64):
+        """Возвращает шаги опроса fetch → render → send.
+        Шаги для Pipeline: fetch (receive_step) выполняется в
+        fetch_workers потоков (по умолчанию concurrency), send — в
+        send_workers, render — в workers. Перед каждым шагом очередь на
+        capacity опросов. Ответ API читается целиком в шаге fetch: опрос
+        с недочитанным потоковым ответом держал бы в очереди соединение
+        пула, и при медленной отправке пул бы кончился.
+        """
+        from pipeline import Stage
+
+        return [
+            Stage('fetch', self.receive_step,
+                  fetch_workers or self.concurrency, capacity),
+            Stage('render', self.render_step, workers, capacity),
+            Stage('send', self.send_step, send_workers, capacity),
+        ]
+
+    def sweep(self, tenants=None, **options):
+        """Опрашивает подписки по разу конвейером из шагов stages().
+        Опросы разных подписок идут одновременно на разных шагах, а
+        медленная отправка через ограниченные очереди придерживает
+        запросы к API. Нельзя вызывать одновременно с run(). options
+        передаются в stages(). Возвращает число отправленных уведомлений.
+        """
+        from pipeline import Pipeline
+
+        pipeline = Pipeline(self.stages(**options))
+        return sum(pipeline.run(self.tenants if tenants is None else tenants))
+
+    def report_error(self, tenant, error):
+        """Сообщает об ошибке в чат, если она отличается от предыдущей."""
+        logging.error(f'{tenant.tenant_id}: {error}')
+        message = str(error)
+        if message != tenant.error_message:
+            try:
+                self.send(tenant.chat_id, message)
+            except Exception as send_error:
+                logging.error(send_error)
+            tenant.error_message = message
+
+    async def _poll(self, loop, executor, tenant):
+        changed = 0
+        try:
+            changed = await loop.run_in_executor(
+                executor, self.poll_once, tenant)
+        finally:
+            if self._active.get(tenant.tenant_id) is tenant:
+                self._reschedule(tenant, changed)
+            elif self.store is not None:
+                # Подписку исключили во время опроса: её состояние нужно
+                # новому владельцу.
+                self.store.save(tenant.tenant_id, tenant.checkpoint())
+
+    def _reschedule(self, tenant, changed):
+        interval = None
+        if self.backoff is not None:
+            interval = self.backoff.next_interval(tenant)
+        if interval is None:
+            interval = self.policy.next_interval(tenant, changed)
+        self.schedule(tenant, self.clock.monotonic() + interval)
+        if self.store is not None:
+            self.store.save(tenant.tenant_id, tenant.checkpoint())
+
+    def restore(self, tenants):
+        """Загружает сохранённое состояние подписок из хранилища."""
+        ids = None
+        if tenants is not self.tenants:
+            ids = [tenant.tenant_id for tenant in tenants]
+        states = self.store.load(ids)
+        restored = 0
+        for tenant in tenants:
+            state = states.get(tenant.tenant_id)
+            if state is not None:
+                tenant.restore(state)
+                restored += 1
+        logging.info(f'Восстановлено состояний подписок: {restored}')
+
+    def _spread(self, tenants, now):
+        """Раскладывает первые опросы равномерно по интервалу опроса."""
+        for tenant in tenants:
+            self._active[tenant.tenant_id] = tenant
+            self.schedule(
+                tenant, now + self.retry_time * token_phase(tenant.token))
+
+    def update_tenants(self, tenants):
+        """Заменяет набор подписок, не останавливая опрос.
+        Новые подписки восстанавливаются из хранилища и встают в очередь,
+        исключённые больше не опрашиваются. Можно вызывать из любого
+        потока. Возвращает concurrent.futures.Future, который завершается,
+        когда идущие опросы исключённых подписок закончились и их
+        состояние передано в store.
+        """
+        done = Future()
+        self._call(self._update_tenants, list(tenants), done)
+        return done
+
+    def _forget(self, tenant_id, task):
+        """Убирает завершённый опрос подписки из идущих."""
+        if self._polling.get(tenant_id) is task:
+            del self._polling[tenant_id]
+
+    def _update_tenants(self, tenants, done=None):
+        import asyncio
+
+        added = [t for t in tenants if t.tenant_id not in self._active]
+        kept = {t.tenant_id for t in tenants}
+        running = []
+        for tenant_id in list(self._active):
+            if tenant_id not in kept:
+                del self._active[tenant_id]
+                self._timers.cancel(tenant_id)
+                if tenant_id in self._polling:
+                    running.append(self._polling[tenant_id])
+        if done is not None:
+            if running:
+                finished = asyncio.gather(*running, return_exceptions=True)
+                finished.add_done_callback(lambda _: done.set_result(None))
+            else:
+                done.set_result(None)
+        self.tenants = tenants
+        TENANTS.set(len(tenants))
+        if self._running:
+            if self.store is not None and added:
+                self.restore(added)
+            self._spread(added, self.clock.monotonic())
+        logging.info(f'Подписок добавлено: {len(added)}, '
+                     f'всего: {len(tenants)}')
+
+    def _call(self, callback, *args):
+        """Выполняет callback в потоке цикла опроса."""
+        import asyncio
+
+        loop = self._loop
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if loop is None or running is loop:
+            callback(*args)
+        else:
+            loop.call_soon_threadsafe(callback, *args)
+
+    async def run(self):
+        """Запускает цикл опроса до вызова stop()."""
+        # asyncio нужен только работающему циклу, а не процессу-супервизору.
+        import asyncio
+
+        loop = asyncio.get_running_loop()
+        self._loop = loop
+        self._wakeup = asyncio.Event()
+        self._running = True
+        self.started.set()
+        tasks = set()
+        TENANTS.set(len(self.tenants))
+        if self.store is not None:
+            self.restore(self.tenants)
+        self._spread(self.tenants, self.clock.monotonic())
+        with ThreadPoolExecutor(self.concurrency) as executor:
+            while self._running:
+                now = self.clock.monotonic()
+                for deadline, tenant in self._timers.advance(now):
+                    if self._active.get(tenant.tenant_id) is not tenant:
+                        continue
+                    LOOP_LAG_SECONDS.observe(now - deadline)
+                    task = loop.create_task(
+                        self._poll(loop, executor, tenant))
+                    tasks.add(task)
+                    self._polling[tenant.tenant_id] = task
+                    task.add_done_callback(tasks.discard)
+                    task.add_done_callback(
+                        partial(self._forget, tenant.tenant_id))
+                self._sleep_until = self._timers.next_deadline()
+                if self._sleep_until is None:
+                    self._sleep_until = now + 1.0
+                delay = max(self._sleep_until - self.clock.monotonic(), 0)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        self._wakeup = None
+        self._loop = None
+        self.started.clear()
+
+    def simulate(self, duration):
+        """Прогоняет опрос на duration секунд по часам self.clock.
+        Опросы выполняются по очереди в текущем потоке, а между ними часы
+        переводятся сразу на срок следующего опроса, поэтому часы должны
+        быть виртуальными (clock.VirtualClock). Возвращает число опросов.
+        """
+        clock = self.clock
+        end = clock.monotonic() + duration
+        self._running = True
+        TENANTS.set(len(self.tenants))
+        if self.store is not None:
+            self.restore(self.tenants)
+        self._spread(self.tenants, clock.monotonic())
+        polls = 0
+        while self._running:
+            deadline = self._timers.next_deadline()
+            if deadline is None or deadline > end:
+                break
+            clock.advance_to(deadline)
+            # Срок — граница тика; полтика в запас не даёт погрешности
+            # сложения с большим началом отсчёта оставить тик несработавшим.
+            fired = self._timers.advance(deadline + self._timers.tick / 2)
+            for _, tenant in fired:
+                if self._active.get(tenant.tenant_id) is not tenant:
+                    continue
+                changed = self.poll_once(tenant)
+                polls += 1
+                if self._active.get(tenant.tenant_id) is tenant:
+                    self._reschedule(tenant, changed)
+        clock.advance_to(end)
+        self._running = False
+        return polls
+
+    def stop(self):
+        """Останавливает цикл опроса после завершения текущих запросов.
+        Можно вызывать из любого потока.
+        """
+        self._call(self._stop)
+
+    def _stop(self):
+        self._running = False
+        if self._wakeup is not None:
+            self._wakeup.set()
@@ -16,3 +16,20 @@ class BotException(Exception):
 
 class StatusException(Exception):
     pass
+
+
+class ApiStatusException(ApiException):
+    """API ответило кодом, отличным от 200."""
+
+    def __init__(self, message, status_code=None, retry_after=None):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+class CircuitOpenException(ApiException):
+    """Запрос не выполнялся: API считается недоступным."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
@@ -0,0 +1,235 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from clock import SYSTEM_CLOCK
+
+_MAGIC = b'HWIDX001'
+# Заголовок индекса: сигнатура, число ячеек, число занятых ячеек.
+_INDEX_HEADER = struct.Struct('<8sQQ')
+# Ячейка индекса: хеш подписки и смещение её последней записи плюс один.
+_SLOT = struct.Struct('<QQ')
+# Заголовок записи: длина тела, смещение предыдущей записи той же подписки
+# плюс один, время обнаружения, время обновления в API, ключ работы.
+_RECORD = struct.Struct('<IQddq')
+_STRING = struct.Struct('<H')
+_MAX_LOAD = 0.7
+
+
+def _tenant_hash(tenant_id):
+    digest = hashlib.blake2b(
+        str(tenant_id).encode('utf-8'), digest_size=8).digest()
+    # Ноль обозначает пустую ячейку.
+    return int.from_bytes(digest, 'little') or 1
+
+
+def _encode(*values):
+    parts = []
+    for value in values:
+        data = (value or '').encode('utf-8')[:0xFFFF]
+        parts.append(_STRING.pack(len(data)) + data)
+    return b''.join(parts)
+
+
+def _decode(body, count):
+    values = []
+    position = 0
+    for _ in range(count):
+        (length,) = _STRING.unpack_from(body, position)
+        position += _STRING.size
+        values.append(body[position:position + length].decode('utf-8'))
+        position += length
+    return values
+
+
+class Transition:
+    """Смена статуса работы, которую заметил бот."""
+
+    __slots__ = ('tenant_id', 'key', 'name', 'old', 'new', 'detected_at',
+                 'updated_at')
+
+    def __init__(self, tenant_id, key, name, old, new, detected_at,
+                 updated_at=None):
+        self.tenant_id = tenant_id
+        self.key = key
+        self.name = name
+        self.old = old
+        self.new = new
+        self.detected_at = detected_at
+        self.updated_at = updated_at
+
+    def __repr__(self):
+        return (f'Transition({self.tenant_id!r}, {self.key!r}, '
+                f'{self.old!r} -> {self.new!r}, {self.detected_at!r})')
+
+
+class TransitionLog:
+    """Журнал смен статусов, в который записи только добавляются.
+
+    Записи лежат в transitions.log друг за другом, и каждая хранит
+    смещение предыдущей записи той же подписки. Файл transitions.idx —
+    отображённая в память хеш-таблица: для каждой подписки в ней смещение
+    её последней записи. Запрос истории подписки идёт по цепочке от
+    последней записи назад и читает с диска только её записи, поэтому
+    занимает миллисекунды при миллионах записей в журнале и не требует
+    держать журнал в памяти.
+
+    Запись идёт под блокировкой файла, поэтому журнал могут делить
+    процессы-шарды. Сначала дописывается запись, потом обновляется
+    индекс: оборванная при аварии запись просто не попадает в цепочку.
+    Время обнаружения берётся по часам clock.
+    """
+
+    def __init__(self, directory, capacity=1024, clock=None):
+        self.clock = clock or SYSTEM_CLOCK
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, 'transitions.log')
+        self.index_path = os.path.join(directory, 'transitions.idx')
+        self._lock = threading.Lock()
+        self._log = open(self.path, 'a+b')
+        self._index_file = None
+        self._index = None
+        self._inode = None
+        self._capacity = 0
+        with self._locked():
+            if not os.path.exists(self.index_path):
+                self._create_index(self.index_path, capacity)
+            self._map_index()
+
+    @contextmanager
+    def _locked(self):
+        with self._lock:
+            if fcntl is not None:
+                fcntl.flock(self._log.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._log.fileno(), fcntl.LOCK_UN)
+
+    @staticmethod
+    def _create_index(path, capacity, slots=()):
+        with open(path, 'wb') as file:
+            count = 0
+            table = bytearray(capacity * _SLOT.size)
+            for tenant_hash, offset in slots:
+                index = tenant_hash % capacity
+                while _SLOT.unpack_from(table, index * _SLOT.size)[0]:
+                    index = (index + 1) % capacity
+                _SLOT.pack_into(table, index * _SLOT.size, tenant_hash, offset)
+                count += 1
+            file.write(_INDEX_HEADER.pack(_MAGIC, capacity, count))
+            file.write(table)
+
+    def _map_index(self):
+        if self._index is not None:
+            self._index.close()
+            self._index_file.close()
+        self._index_file = open(self.index_path, 'r+b')
+        self._index = mmap.mmap(self._index_file.fileno(), 0)
+        magic, self._capacity, _ = _INDEX_HEADER.unpack_from(self._index)
+        if magic != _MAGIC:
+            raise ValueError(f'Повреждён индекс журнала {self.index_path}')
+        self._inode = os.fstat(self._index_file.fileno()).st_ino
+
+    def _remap_if_replaced(self):
+        """Перечитывает индекс, если другой процесс его перестроил."""
+        if os.stat(self.index_path).st_ino != self._inode:
+            self._map_index()
+
+    def _slot(self, tenant_hash):
+        """Возвращает номер ячейки подписки и хранящееся в ней смещение."""
+        index = tenant_hash % self._capacity
+        while True:
+            position = _INDEX_HEADER.size + index * _SLOT.size
+            stored, offset = _SLOT.unpack_from(self._index, position)
+            if stored == tenant_hash or not stored:
+                return position, offset if stored else 0
+            index = (index + 1) % self._capacity
+
+    def _grow(self):
+        slots = []
+        for index in range(self._capacity):
+            tenant_hash, offset = _SLOT.unpack_from(
+                self._index, _INDEX_HEADER.size + index * _SLOT.size)
+            if tenant_hash:
+                slots.append((tenant_hash, offset))
+        temporary = self.index_path + '.tmp'
+        self._create_index(temporary, self._capacity * 2, slots)
+        os.replace(temporary, self.index_path)
+        self._map_index()
+
+    def append(self, tenant_id, key, name, old, new, updated_at=None,
+               detected_at=None):
+        """Дописывает в журнал смену статуса работы key подписки."""
+        tenant_hash = _tenant_hash(tenant_id)
+        body = _encode(str(tenant_id), name, old, new)
+        if updated_at is None:
+            updated_at = math.nan
+        with self._locked():
+            # Время берётся под блокировкой, чтобы цепочка подписки шла
+            # по убыванию времени и запрос мог остановиться на since.
+            if detected_at is None:
+                detected_at = self.clock.time()
+            self._remap_if_replaced()
+            position, previous = self._slot(tenant_hash)
+            offset = os.fstat(self._log.fileno()).st_size
+            self._log.write(_RECORD.pack(
+                len(body), previous, detected_at, updated_at, key) + body)
+            self._log.flush()
+            _SLOT.pack_into(self._index, position, tenant_hash, offset + 1)
+            if not previous:
+                magic, capacity, count = _INDEX_HEADER.unpack_from(
+                    self._index)
+                _INDEX_HEADER.pack_into(
+                    self._index, 0, magic, capacity, count + 1)
+                if count + 1 > capacity * _MAX_LOAD:
+                    self._grow()
+
+    def _read(self, offset):
+        header = os.pread(self._log.fileno(), _RECORD.size, offset)
+        length, previous, detected_at, updated_at, key = _RECORD.unpack(
+            header)
+        body = os.pread(self._log.fileno(), length, offset + _RECORD.size)
+        tenant_id, name, old, new = _decode(body, 4)
+        transition = Transition(
+            tenant_id, key, name, old or None, new, detected_at,
+            None if math.isnan(updated_at) else updated_at)
+        return transition, previous
+
+    def history(self, tenant_id, since=None, until=None, limit=None):
+        """Возвращает смены статусов подписки от старых к новым.
+        since и until ограничивают время обнаружения, limit оставляет
+        только столько последних записей.
+        """
+        tenant_id = str(tenant_id)
+        with self._lock:
+            self._remap_if_replaced()
+            _, pointer = self._slot(_tenant_hash(tenant_id))
+        found = []
+        while pointer and (limit is None or len(found) < limit):
+            transition, pointer = self._read(pointer - 1)
+            if since is not None and transition.detected_at < since:
+                break
+            if transition.tenant_id != tenant_id:
+                continue
+            if until is None or transition.detected_at < until:
+                found.append(transition)
+        found.reverse()
+        return found
+
+    def close(self):
+        """Закрывает файлы журнала."""
+        with self._lock:
+            self._index.close()
+            self._index_file.close()
+            self._log.close()
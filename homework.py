@@ -1,32 +1,79 @@
+import atexit
 import logging
 import os
 import sys
 import time
 from http import HTTPStatus
 
-import requests
-import telegram
-from dotenv import load_dotenv
-
-from exceptions import (ApiException, BotException,
+from exceptions import (ApiException, ApiStatusException, BotException,
                         StatusException)
 
-logging.basicConfig(
-    level=logging.DEBUG,
-    filename='main.log',
-    format='%(funcName)s, %(lineno)s, %(levelname)s, %(message)s',
-    filemode='w'
-)
+if __name__ == '__main__':
+    # .env читается только при запуске бота: импорт модуля (тесты, шарды,
+    # бенчмарки) не должен менять окружение процесса.
+    from dotenv import load_dotenv
+    load_dotenv()
 
-load_dotenv()
 PRACTICUM_TOKEN = os.getenv('PRACTICUM_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('TELEGRAM_CHAT_ID')
-
+TENANTS_FILE = os.getenv('TENANTS_FILE')
+POLL_CONCURRENCY = int(os.getenv('POLL_CONCURRENCY', 32))
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', POLL_CONCURRENCY))
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', 5))
+HTTP_READ_TIMEOUT = float(os.getenv('HTTP_READ_TIMEOUT', 30))
+STREAM_THRESHOLD = int(os.getenv('STREAM_THRESHOLD', 1 << 20))
+CHECKPOINT_DB = os.getenv('CHECKPOINT_DB', 'checkpoints.sqlite3')
+CHECKPOINT_FLUSH_INTERVAL = float(os.getenv('CHECKPOINT_FLUSH_INTERVAL', 1))
+TELEGRAM_GLOBAL_RATE = float(os.getenv('TELEGRAM_GLOBAL_RATE', 30))
+TELEGRAM_CHAT_RATE = float(os.getenv('TELEGRAM_CHAT_RATE', 1))
+TELEGRAM_WORKERS = int(os.getenv('TELEGRAM_WORKERS', 8))
+TELEGRAM_MAX_PENDING = int(os.getenv('TELEGRAM_MAX_PENDING', 10000))
+LOG_FILE = os.getenv('LOG_FILE', 'main.log')
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'DEBUG')
+LOG_MAX_BYTES = int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv('LOG_BACKUP_COUNT', 5))
+LOG_ROTATE_WHEN = os.getenv('LOG_ROTATE_WHEN')
+LOG_SAMPLE_INTERVAL = float(os.getenv('LOG_SAMPLE_INTERVAL', 60))
+LOG_SAMPLE_BURST = int(os.getenv('LOG_SAMPLE_BURST', 20))
+METRICS_PORT = int(os.getenv('METRICS_PORT', 0))
+WORKERS = int(os.getenv('WORKERS', 1))
 
 RETRY_TIME = 600
+ADAPTIVE_POLLING = os.getenv('ADAPTIVE_POLLING', '1') == '1'
+POLL_INTERVAL_MIN = float(os.getenv('POLL_INTERVAL_MIN', 60))
+POLL_INTERVAL_MAX = float(os.getenv('POLL_INTERVAL_MAX', 1800))
+BACKOFF_BASE = float(os.getenv('BACKOFF_BASE', 30))
+BACKOFF_CAP = float(os.getenv('BACKOFF_CAP', 3600))
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 20))
+CIRCUIT_RESET_TIMEOUT = float(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))
+CIRCUIT_PROBES = int(os.getenv('CIRCUIT_PROBES', 3))
+FETCH_CACHE_TTL = float(os.getenv('FETCH_CACHE_TTL', 5))
+FETCH_CACHE_SIZE = int(os.getenv('FETCH_CACHE_SIZE', 4096))
+LEASE_BACKEND_URL = os.getenv('LEASE_BACKEND_URL')
+LEASE_TTL = float(os.getenv('LEASE_TTL', 30))
+LEASE_SLOTS = int(os.getenv('LEASE_SLOTS', 256))
+HISTORY_DIR = os.getenv('HISTORY_DIR', 'history')
+RECORD_FILE = os.getenv('RECORD_FILE')
+DIGEST_WINDOW = float(os.getenv('DIGEST_WINDOW', 0))
+DIGEST_MAX_MESSAGES = int(os.getenv('DIGEST_MAX_MESSAGES', 20))
+DIGEST_URGENT_DELAY = float(os.getenv('DIGEST_URGENT_DELAY', 10))
+WATERMARK_OVERLAP = float(os.getenv('WATERMARK_OVERLAP', 60))
+OUTBOX_DB = os.getenv('OUTBOX_DB', 'outbox.sqlite3')
+OUTBOX_RETRY = float(os.getenv('OUTBOX_RETRY', 30))
+OUTBOX_MAX_RETRY = float(os.getenv('OUTBOX_MAX_RETRY', 600))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 100))
+COMMANDS = os.getenv('COMMANDS', '1') == '1'
+COMMANDS_POLL_TIMEOUT = int(os.getenv('COMMANDS_POLL_TIMEOUT', 30))
+COMMANDS_RATE = float(os.getenv('COMMANDS_RATE', 3))
+PROFILE = os.getenv('PROFILE', '0') == '1'
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_INTERVAL = float(os.getenv('PROFILE_INTERVAL', 0.01))
+PROFILE_DUMP_INTERVAL = float(os.getenv('PROFILE_DUMP_INTERVAL', 60))
+PROFILE_MEMORY = os.getenv('PROFILE_MEMORY', '0') == '1'
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
 HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+HTTP_CLIENT = None
 
 
 HOMEWORK_STATUSES = {
@@ -36,16 +83,41 @@ HOMEWORK_STATUSES = {
 }
 
 
+def get_http_client():
+    """Возвращает общий HTTP-клиент, создавая его при первом запросе.
+    requests импортируется только здесь, чтобы не замедлять запуск.
+    """
+    global HTTP_CLIENT
+    if HTTP_CLIENT is None:
+        from http_client import HttpClient
+        HTTP_CLIENT = HttpClient(
+            pool_size=HTTP_POOL_SIZE,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+        )
+        if RECORD_FILE:
+            from replay import Recorder
+            HTTP_CLIENT = Recorder(HTTP_CLIENT, RECORD_FILE)
+    return HTTP_CLIENT
+
+
 def send_message(bot, message):
     """Отправляет сообщение в Telegram чат.
     Чат задан переменной окружения TELEGRAM_CHAT_ID.
     Принимает на вход два параметра: экземпляр класса Bot и
     строку с текстом сообщения.
     """
+    send_message_to(bot, TELEGRAM_CHAT_ID, message)
+
+
+def send_message_to(bot, chat_id, message):
+    """Отправляет сообщение в произвольный Telegram чат."""
+    from telegram.error import TelegramError
     try:
-        bot.send_message(TELEGRAM_CHAT_ID, message)
-    except telegram.error.TelegramError as e:
-        raise BotException(f'Ошибка отправки сообщения в телеграм: {e}')
+        bot.send_message(chat_id, message)
+    except TelegramError as e:
+        raise BotException(
+            f'Ошибка отправки сообщения в телеграм: {e}') from e
 
 
 def get_api_answer(current_timestamp):
@@ -54,16 +126,46 @@ def get_api_answer(current_timestamp):
     В случае успешного запроса должна вернуть ответ API,
     преобразовав его из формата JSON к типам данных Python.
     """
-    timestamp = current_timestamp or int(time.time())
+    return get_api_answer_for(PRACTICUM_TOKEN, current_timestamp)
+
+
+def get_api_answer_for(token, current_timestamp, client=None):
+    """Делает запрос к API от имени владельца токена token.
+    Запрос идёт через client, по умолчанию — общий HTTP-клиент.
+    """
+    from requests import RequestException
+    from resilience import parse_retry_after
+    from streaming import decode_response
+
+    timestamp = current_timestamp
+    if timestamp is None:
+        timestamp = int(time.time())
     params = {'from_date': timestamp}
+    headers = {'Authorization': f'OAuth {token}'}
+    client = client or get_http_client()
     try:
-        response = requests.get(ENDPOINT, headers=HEADERS, params=params)
-    except ApiException as error:
+        response = client.get(ENDPOINT, headers=headers, params=params,
+                              stream=True)
+    except RequestException as error:
         raise ApiException(f'Ошибка при запросе к основному API: {error}')
     if response.status_code != HTTPStatus.OK:
-        raise Exception(f'Ошибка {response.status_code}')
+        # Тело ошибки не читается, и без close соединение с stream=True
+        # не вернулось бы в пул.
+        close = getattr(response, 'close', None)
+        if close is not None:
+            close()
+        retry_after = None
+        if response.status_code in (HTTPStatus.TOO_MANY_REQUESTS,
+                                    HTTPStatus.SERVICE_UNAVAILABLE):
+            retry_after = parse_retry_after(
+                response.headers.get('Retry-After'))
+        raise ApiStatusException(
+            f'Ошибка {response.status_code}',
+            status_code=response.status_code,
+            retry_after=retry_after,
+        )
     try:
-        return response.json()
+        return decode_response(response, STREAM_THRESHOLD)
     except ValueError:
         raise ValueError('Ошибка парсинга ответа из формата json')
 
@@ -76,17 +178,20 @@ def check_response(response):
     список домашних работ (он может быть пустым), доступный в ответе
     API по ключу 'homeworks'
     """
+    from streaming import HomeworkStream
+
+    if isinstance(response, HomeworkStream):
+        # Работы длинного ответа проверяются по мере чтения.
+        return response
     if not isinstance(response, dict):
         raise TypeError('Ответ API отличен от словаря')
     try:
         list_works = response['homeworks']
     except KeyError:
         raise KeyError('Ошибка словаря по ключу homeworks')
-    try:
-        homework = list_works[0]
-    except IndexError:
-        raise IndexError('Список домашних работ пуст')
-    return homework
+    if not isinstance(list_works, list):
+        raise TypeError('Домашние работы в ответе API пришли не списком')
+    return list_works
 
 
 def parse_status(homework):
@@ -107,43 +212,353 @@ def parse_status(homework):
     return f'Изменился статус проверки работы "{homework_name}". {verdict}'
 
 
+def is_urgent(message):
+    """Проверяет, нужно ли отправить уведомление без ожидания сводки.
+    Срочны вердикты ревьюера и ошибки, а взятие работы на проверку — нет.
+    """
+    return not message.endswith(HOMEWORK_STATUSES['reviewing'])
+
+
 def check_tokens():
     """Проверяет доступность переменных окружения, необходимых для работы.
     Если отсутствует хотя бы одна переменная окружения — функция должна
     вернуть False, иначе — True.
+    Вместо пары PRACTICUM_TOKEN и TELEGRAM_CHAT_ID может быть задан
+    файл подписок TENANTS_FILE.
+    """
+    return all([TELEGRAM_TOKEN and (
+        TENANTS_FILE or (PRACTICUM_TOKEN and TELEGRAM_CHAT_ID))])
+
+
+def make_policy():
+    """Возвращает политику выбора интервала опроса по настройкам."""
+    from scheduling import AdaptivePolicy, FixedPolicy
+
+    if not ADAPTIVE_POLLING:
+        return FixedPolicy(RETRY_TIME)
+    return AdaptivePolicy(
+        floor=POLL_INTERVAL_MIN, ceiling=POLL_INTERVAL_MAX, base=RETRY_TIME)
+
+
+def start_metrics(dispatcher, breaker, port=None):
+    """Подключает счётчики пула HTTP, очереди и предохранителя к метрикам.
+    Если задан port, запускает страницу /metrics на localhost.
+    """
+    from metrics import (CIRCUIT_STATE, HTTP_CONNECTIONS, HTTP_REUSED,
+                         QUEUE_DEPTH, start_http_server)
+    from resilience import CircuitBreaker
+
+    QUEUE_DEPTH.set_function(lambda: len(dispatcher))
+    CIRCUIT_STATE.set_function(
+        lambda: int(breaker.state != CircuitBreaker.CLOSED))
+    client = get_http_client()
+    HTTP_CONNECTIONS.set_function(lambda: client.stats()['connections'])
+    HTTP_REUSED.set_function(lambda: client.stats()['reused'])
+    if port:
+        start_http_server(port)
+        logging.info(f'Метрики доступны на порту {port}')
+
+
+def make_bot():
+    """Создаёт бота Telegram.
+    Пул соединений вмещает все потоки отправки и длинный опрос команд.
+    """
+    import telegram
+    from telegram.utils.request import Request
+
+    return telegram.Bot(
+        token=TELEGRAM_TOKEN,
+        request=Request(con_pool_size=TELEGRAM_WORKERS + 1))
+
+
+def start_commands(bot, tenants, send, engine=None, store=None,
+                   history=None):
+    """Запускает ответы на команды /status и /history, если COMMANDS=1.
+    Возвращает приём команд или None.
+    """
+    if not COMMANDS:
+        return None
+    from commands import CommandHandler, CommandPoller, TenantDirectory
+
+    handler = CommandHandler(
+        TenantDirectory(tenants, engine, store), history, HOMEWORK_STATUSES)
+    poller = CommandPoller(bot, handler, send, timeout=COMMANDS_POLL_TIMEOUT)
+    poller.start()
+    return poller
+
+
+def shards_rate():
+    """Возвращает лимит Telegram на все шарды вместе.
+    Если главный процесс отвечает на команды, его доля COMMANDS_RATE
+    вычитается из TELEGRAM_GLOBAL_RATE.
+    """
+    if not COMMANDS:
+        return TELEGRAM_GLOBAL_RATE
+    return max(TELEGRAM_GLOBAL_RATE - COMMANDS_RATE, 1)
+
 
+def serve_commands(tenants):
+    """Отвечает на команды в главном процессе, пока опрашивают шарды.
+    Состояние подписок читается из хранилища, куда его пишут шарды.
+    Ответы отправляются не чаще COMMANDS_RATE сообщений в секунду: эта
+    доля общего лимита не достаётся шардам.
+    Возвращает функцию, которая останавливает приём команд.
     """
-    return all([TELEGRAM_TOKEN and PRACTICUM_TOKEN and TELEGRAM_CHAT_ID])
+    if not COMMANDS:
+        return lambda: None
+    from checkpoints import BackendCheckpointStore, CheckpointStore
+    from dispatcher import Dispatcher
+    from history import TransitionLog
+    from leases import backend_from_url
 
+    bot = make_bot()
+    if LEASE_BACKEND_URL:
+        store = BackendCheckpointStore(backend_from_url(LEASE_BACKEND_URL))
+    else:
+        store = CheckpointStore(CHECKPOINT_DB)
+    history = TransitionLog(HISTORY_DIR) if HISTORY_DIR else None
+    dispatcher = Dispatcher(
+        lambda chat_id, message: send_message_to(bot, chat_id, message),
+        global_rate=COMMANDS_RATE,
+        chat_rate=TELEGRAM_CHAT_RATE,
+        workers=1,
+    )
+    dispatcher.start()
+    poller = start_commands(bot, tenants, dispatcher.submit, store=store,
+                            history=history)
 
-def main():  # noqa
+    def stop():
+        poller.stop()
+        dispatcher.close()
+        store.close()
+        if history is not None:
+            history.close()
+
+    return stop
+
+
+def start_profiler():
+    """Готовит профилировщик, который включает и выключает SIGUSR2.
+    При PROFILE=1 профилирование включается сразу.
+    """
+    from profiling import Profiler
+
+    profiler = Profiler(PROFILE_DIR, PROFILE_INTERVAL, PROFILE_DUMP_INTERVAL,
+                        memory=PROFILE_MEMORY)
+    try:
+        profiler.install_signal()
+    except ValueError:
+        # Сигналы принимает только главный поток.
+        logging.debug('Профилировщик доступен только через PROFILE=1')
+    if PROFILE:
+        profiler.start()
+    return profiler
+
+
+def is_permanent_error(error):
+    """Проверяет, что сообщение в этот чат не доставить и повтором.
+    Бот заблокирован или удалён из чата, чат удалён или переехал,
+    Telegram отверг само сообщение.
+    """
+    from telegram.error import BadRequest, ChatMigrated, Unauthorized
+
+    while error is not None:
+        if isinstance(error, (BadRequest, ChatMigrated, Unauthorized)):
+            return True
+        error = error.__cause__
+    return False
+
+
+def start_outbox(send):
+    """Запускает надёжную очередь уведомлений перед send.
+    Возвращает None, если OUTBOX_DB пуст.
+    """
+    if not OUTBOX_DB:
+        return None
+    from outbox import Outbox
+
+    outbox = Outbox(OUTBOX_DB, send, retry=OUTBOX_RETRY,
+                    max_retry=OUTBOX_MAX_RETRY,
+                    max_attempts=OUTBOX_MAX_ATTEMPTS,
+                    permanent=is_permanent_error)
+    outbox.start()
+    return outbox
+
+
+def start_logging(filename):
+    """Настраивает логирование в файл filename по переменным окружения."""
+    from log_config import setup_logging
+
+    return setup_logging(
+        filename,
+        level=LOG_LEVEL,
+        max_bytes=LOG_MAX_BYTES,
+        backup_count=LOG_BACKUP_COUNT,
+        rotate_when=LOG_ROTATE_WHEN,
+        sample_interval=LOG_SAMPLE_INTERVAL,
+        sample_burst=LOG_SAMPLE_BURST,
+    )
+
+
+def main():
     """Основная логика работы бота."""
-    current_timestamp = int(time.time())
-    status = ''
-    error_message = ''
+    log_listener = start_logging(LOG_FILE)
+    try:
+        run_bot()
+    finally:
+        log_listener.stop()
+
+
+def run_bot():
+    """Запускает опрос подписок в одном процессе или в нескольких шардах."""
+    from engine import load_tenants
+    from metrics import start_http_server
+    from sharding import Supervisor
+
     if not check_tokens():
         logging.critical('Отсутствуют одна или несколько переменных окружения')
         sys.exit()
-    bot = telegram.Bot(token=TELEGRAM_TOKEN)
-    while True:
-        try:
-            response = get_api_answer(current_timestamp)
-            current_timestamp = response.get('current_date')
-            message = parse_status(check_response(response))
-            if message != status:
-                logging.info(f'Сообщение в чат {TELEGRAM_CHAT_ID}: {message}')
-                send_message(bot, message)
-                status = message
-        except telegram.error.TelegramError as error:
-            logging.error(error)
-        except Exception as error:
-            logging.error(error)
-            message_t = str(error)
-            if message_t != error_message:
-                send_message(bot, message_t)
-                error_message = message_t
-        finally:
-            time.sleep(RETRY_TIME)
+    tenants = load_tenants(TENANTS_FILE, PRACTICUM_TOKEN, TELEGRAM_CHAT_ID)
+    logging.info(f'Загружено подписок: {len(tenants)}')
+    if WORKERS <= 1:
+        serve(tenants, metrics_port=METRICS_PORT)
+        return
+    # С арендой слотов лимит Telegram между узлами делит LeaseManager.
+    supervisor = Supervisor(
+        serve_shard, tenants, workers=WORKERS, init=init_shard,
+        sharded=not LEASE_BACKEND_URL,
+        global_rate=None if LEASE_BACKEND_URL else shards_rate())
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT, registry=supervisor.rollup)
+    stop_commands = serve_commands(tenants)
+    try:
+        supervisor.run()
+    finally:
+        stop_commands()
+
+
+def init_shard(shard):
+    """Готовит процесс-шард: у каждого шарда свой файл лога."""
+    atexit.register(start_logging(f'{LOG_FILE}.{shard}').stop)
+
+
+def serve_shard(tenants, on_start):
+    """Обслуживает подписки шарда, деля между шардами лимит Telegram.
+    Начальная доля рассчитана на WORKERS шардов, а при изменении их числа
+    супервизор присылает новую; с арендой слотов долю задаёт LeaseManager
+    по числу всех живых узлов.
+    """
+    # На команды отвечает главный процесс: getUpdates допускает только
+    # одного получателя.
+    serve(tenants, global_rate=shards_rate() / WORKERS,
+          on_start=on_start, commands=False)
+
+
+def serve(tenants, global_rate=TELEGRAM_GLOBAL_RATE, metrics_port=None,
+          on_start=None, commands=True):
+    """Опрашивает подписки tenants и отправляет уведомления.
+    Если передан on_start, он вызывается с движком опроса и очередью
+    отправки перед запуском.
+    Если задан LEASE_BACKEND_URL, процесс опрашивает только подписки из
+    арендованных им слотов, состояние хранит в общем хранилище, а лимит
+    Telegram делит поровну с другими живыми узлами.
+    С commands процесс ещё и отвечает на команды чатов.
+    """
+    import asyncio
+
+    from checkpoints import BackendCheckpointStore, CheckpointStore
+    from coalescing import CoalescingFetcher
+    from digest import Digest
+    from dispatcher import Dispatcher
+    from engine import PollingEngine
+    from history import TransitionLog
+    from leases import LeaseManager, backend_from_url
+    from resilience import Backoff, CircuitBreaker
+
+    bot = make_bot()
+    directory = tenants
+    leases = None
+    if LEASE_BACKEND_URL:
+        backend = backend_from_url(LEASE_BACKEND_URL)
+        store = BackendCheckpointStore(
+            backend, flush_interval=CHECKPOINT_FLUSH_INTERVAL)
+        # Лимит Telegram делят все узлы всех машин, включая шарды.
+        leases = LeaseManager(
+            backend, tenants, slots=LEASE_SLOTS, ttl=LEASE_TTL, store=store,
+            global_rate=shards_rate())
+        tenants = []
+    else:
+        store = CheckpointStore(CHECKPOINT_DB, CHECKPOINT_FLUSH_INTERVAL)
+    store.start()
+    profiler = start_profiler()
+    history = TransitionLog(HISTORY_DIR) if HISTORY_DIR else None
+    dispatcher = Dispatcher(
+        lambda chat_id, message: send_message_to(bot, chat_id, message),
+        global_rate=global_rate,
+        chat_rate=TELEGRAM_CHAT_RATE,
+        workers=TELEGRAM_WORKERS,
+        max_pending=TELEGRAM_MAX_PENDING,
+    )
+    dispatcher.start()
+    digest = Digest(
+        dispatcher.submit,
+        window=DIGEST_WINDOW,
+        max_messages=DIGEST_MAX_MESSAGES,
+        urgent_delay=DIGEST_URGENT_DELAY,
+        urgent=is_urgent,
+    )
+    digest.start()
+    outbox = start_outbox(digest.submit)
+    breaker = CircuitBreaker(
+        failure_threshold=CIRCUIT_FAILURE_THRESHOLD,
+        reset_timeout=CIRCUIT_RESET_TIMEOUT,
+        probes=CIRCUIT_PROBES,
+    )
+    start_metrics(dispatcher, breaker, metrics_port)
+    engine = PollingEngine(
+        tenants,
+        fetch=CoalescingFetcher(
+            breaker.wrap(get_api_answer_for),
+            ttl=FETCH_CACHE_TTL,
+            max_size=FETCH_CACHE_SIZE,
+        ),
+        check=check_response,
+        parse=parse_status,
+        send=digest.submit,
+        retry_time=RETRY_TIME,
+        concurrency=POLL_CONCURRENCY,
+        store=store,
+        policy=make_policy(),
+        backoff=Backoff(BACKOFF_BASE, BACKOFF_CAP),
+        history=history,
+        outbox=outbox,
+        overlap=WATERMARK_OVERLAP,
+    )
+    if leases is not None:
+        leases.start(engine, dispatcher)
+    if on_start is not None:
+        on_start(engine, dispatcher)
+    poller = None
+    if commands:
+        poller = start_commands(bot, directory, dispatcher.submit, engine,
+                                store, history)
+    try:
+        asyncio.run(engine.run())
+    finally:
+        if poller is not None:
+            poller.stop()
+        if leases is not None:
+            leases.stop()
+        if outbox is not None:
+            outbox.stop()
+        digest.close()
+        dispatcher.close()
+        if outbox is not None:
+            outbox.close()
+        store.close()
+        if history is not None:
+            history.close()
+        profiler.stop(wait=True)
 
 
 if __name__ == '__main__':
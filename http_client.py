@@ -0,0 +1,95 @@
+import functools
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import EmptyPoolError
+
+
+class PoolTimeoutAdapter(HTTPAdapter):
+    """Адаптер, который ждёт свободное соединение пула не дольше pool_timeout.
+
+    requests не передаёт urllib3 время ожидания соединения, и заблокированный
+    пул без него ждёт вечно. Не дождавшийся запрос завершается
+    requests.ConnectionError, как и другие ошибки соединения.
+    """
+
+    def __init__(self, pool_timeout=None, **kwargs):
+        self.pool_timeout = pool_timeout
+        super().__init__(**kwargs)
+
+    def _limit(self, pool):
+        if 'urlopen' not in vars(pool):
+            pool.urlopen = functools.partial(
+                pool.urlopen, pool_timeout=self.pool_timeout)
+        return pool
+
+    def get_connection(self, *args, **kwargs):
+        """Возвращает пул соединений с ограниченным ожиданием."""
+        return self._limit(super().get_connection(*args, **kwargs))
+
+    def get_connection_with_tls_context(self, *args, **kwargs):
+        """Возвращает пул соединений с ограниченным ожиданием."""
+        return self._limit(
+            super().get_connection_with_tls_context(*args, **kwargs))
+
+    def send(self, request, *args, **kwargs):
+        """Отправляет запрос, ожидая соединение не дольше pool_timeout."""
+        try:
+            return super().send(request, *args, **kwargs)
+        except EmptyPoolError as error:
+            raise requests.ConnectionError(error, request=request)
+
+
+class HttpClient:
+    """Общий для всех подписок HTTP-клиент с пулом keep-alive соединений.
+
+    Соединения к API переиспользуются между опросами и подписками, поэтому
+    TCP и TLS рукопожатия происходят только при открытии нового
+    соединения. Все запросы ограничены таймаутами на соединение и чтение,
+    а ожидание свободного соединения пула — pool_timeout, по умолчанию
+    равным таймауту соединения.
+    """
+
+    def __init__(self, pool_size=32, connect_timeout=5, read_timeout=30,
+                 pool_timeout=None):
+        self.timeout = (connect_timeout, read_timeout)
+        self.session = requests.Session()
+        self.session.headers['Accept-Encoding'] = 'gzip, deflate'
+        if pool_timeout is None:
+            pool_timeout = connect_timeout
+        self.adapter = PoolTimeoutAdapter(
+            pool_timeout=pool_timeout, pool_connections=4,
+            pool_maxsize=pool_size, pool_block=True)
+        self.session.mount('https://', self.adapter)
+        self.session.mount('http://', self.adapter)
+        self._lock = threading.Lock()
+        self._requests = 0
+
+    def get(self, url, **kwargs):
+        """Выполняет GET-запрос через пул соединений."""
+        kwargs.setdefault('timeout', self.timeout)
+        with self._lock:
+            self._requests += 1
+        return self.session.get(url, **kwargs)
+
+    def stats(self):
+        """Возвращает счётчики запросов и открытых соединений.
+        Разница между ними — число запросов, обслуженных уже открытым
+        соединением без нового рукопожатия.
+        """
+        connections = 0
+        pools = self.adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        return {
+            'requests': self._requests,
+            'connections': connections,
+            'reused': max(self._requests - connections, 0),
+        }
+
+    def close(self):
+        """Закрывает все соединения пула."""
+        self.session.close()
@@ -0,0 +1,477 @@
+import fnmatch
+import logging
+import math
+import os
+import socket
+import threading
+import time
+import zlib
+from concurrent.futures import TimeoutError as FutureTimeout
+from urllib.parse import urlparse
+
+
+class BackendError(Exception):
+    """Ошибка общего хранилища состояния."""
+
+
+class MemoryBackend:
+    """Хранилище в памяти процесса с тем же интерфейсом, что у Redis.
+    Подходит для одного узла и для тестов.
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._sets = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires is not None and expires <= time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    def _set(self, key, value, ttl):
+        expires = None if ttl is None else time.monotonic() + ttl
+        self._data[key] = (value, expires)
+
+    def get(self, key):
+        """Возвращает значение ключа или None."""
+        with self._lock:
+            return self._get(key)
+
+    def mget(self, keys):
+        """Возвращает значения нескольких ключей."""
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def mset(self, mapping):
+        """Записывает несколько ключей без срока жизни."""
+        with self._lock:
+            for key, value in mapping.items():
+                self._set(key, value, None)
+
+    def set(self, key, value, ttl=None, only_new=False):
+        """Записывает ключ на ttl секунд.
+        С only_new запись происходит, только если ключа ещё нет.
+        Возвращает True, если значение записано.
+        """
+        with self._lock:
+            if only_new and self._get(key) is not None:
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        """Записывает ключ, только если его значение равно expected."""
+        with self._lock:
+            if self._get(key) != expected:
+                return False
+            self._set(key, value, ttl)
+            return True
+
+    def compare_and_delete(self, key, expected):
+        """Удаляет ключ, только если его значение равно expected."""
+        with self._lock:
+            if self._get(key) != expected:
+                return False
+            del self._data[key]
+            return True
+
+    def scan(self, pattern, count=1000):
+        """Перебирает живые ключи, подходящие под glob-шаблон."""
+        with self._lock:
+            keys = [
+                key for key in list(self._data)
+                if fnmatch.fnmatchcase(key, pattern)
+                and self._get(key) is not None
+            ]
+        return iter(keys)
+
+    def zadd(self, key, score, member):
+        """Добавляет member в упорядоченное множество key с весом score."""
+        with self._lock:
+            self._sets.setdefault(key, {})[member] = score
+
+    def zrem(self, key, member):
+        """Удаляет member из упорядоченного множества key."""
+        with self._lock:
+            self._sets.get(key, {}).pop(member, None)
+
+    def zremrangebyscore(self, key, low, high):
+        """Удаляет из множества key элементы с весом от low до high."""
+        with self._lock:
+            members = self._sets.get(key, {})
+            for member, score in list(members.items()):
+                if low <= score <= high:
+                    del members[member]
+
+    def zcard(self, key):
+        """Возвращает число элементов упорядоченного множества key."""
+        with self._lock:
+            return len(self._sets.get(key, {}))
+
+
+class RedisClient:
+    """Минимальный клиент протокола Redis (RESP2) без зависимостей.
+
+    Одно соединение на клиента, команды выполняются под блокировкой.
+    При сетевой ошибке соединение закрывается и открывается заново при
+    следующей команде.
+    """
+
+    def __init__(self, host='127.0.0.1', port=6379, db=0, password=None,
+                 timeout=5):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.lock = threading.RLock()
+        self._socket = None
+        self._file = None
+
+    def _connect(self):
+        self._socket = socket.create_connection(
+            (self.host, self.port), self.timeout)
+        self._socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._file = self._socket.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def close(self):
+        """Закрывает соединение."""
+        if self._socket is not None:
+            self._file.close()
+            self._socket.close()
+        self._socket = None
+        self._file = None
+
+    @staticmethod
+    def _encode(args):
+        parts = [f'*{len(args)}\r\n'.encode()]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode('utf-8')
+            parts.append(f'${len(arg)}\r\n'.encode() + arg + b'\r\n')
+        return b''.join(parts)
+
+    def _read(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError('Redis закрыл соединение')
+        kind, rest = line[:1], line[1:-2]
+        if kind == b'+':
+            return rest.decode('utf-8')
+        if kind == b'-':
+            raise BackendError(rest.decode('utf-8'))
+        if kind == b':':
+            return int(rest)
+        if kind == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)[:-2]
+            return data.decode('utf-8')
+        if kind == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise BackendError(f'Неизвестный ответ Redis: {line!r}')
+
+    def _call(self, *args):
+        self._socket.sendall(self._encode(args))
+        return self._read()
+
+    def execute(self, *args):
+        """Выполняет команду и возвращает разобранный ответ."""
+        with self.lock:
+            try:
+                if self._socket is None:
+                    self._connect()
+                return self._call(*args)
+            except (OSError, ConnectionError) as error:
+                self.close()
+                raise BackendError(f'Redis недоступен: {error}') from error
+
+
+class RedisBackend:
+    """Хранилище в Redis или совместимом с ним сервере.
+    Сравнение с записью выполняется транзакцией WATCH/MULTI/EXEC, поэтому
+    сервер не обязан поддерживать Lua.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def get(self, key):
+        """Возвращает значение ключа или None."""
+        return self.client.execute('GET', key)
+
+    def mget(self, keys):
+        """Возвращает значения нескольких ключей."""
+        if not keys:
+            return []
+        return self.client.execute('MGET', *keys)
+
+    def mset(self, mapping):
+        """Записывает несколько ключей без срока жизни."""
+        if mapping:
+            args = [item for pair in mapping.items() for item in pair]
+            self.client.execute('MSET', *args)
+
+    def set(self, key, value, ttl=None, only_new=False):
+        """Записывает ключ на ttl секунд.
+        С only_new запись происходит, только если ключа ещё нет.
+        Возвращает True, если значение записано.
+        """
+        args = ['SET', key, value]
+        if ttl is not None:
+            args += ['PX', int(ttl * 1000)]
+        if only_new:
+            args.append('NX')
+        return self.client.execute(*args) == 'OK'
+
+    def _transaction(self, key, expected, *command):
+        with self.client.lock:
+            self.client.execute('WATCH', key)
+            if self.client.execute('GET', key) != expected:
+                self.client.execute('UNWATCH')
+                return False
+            self.client.execute('MULTI')
+            self.client.execute(*command)
+            return self.client.execute('EXEC') is not None
+
+    def compare_and_set(self, key, expected, value, ttl=None):
+        """Записывает ключ, только если его значение равно expected."""
+        command = ['SET', key, value]
+        if ttl is not None:
+            command += ['PX', int(ttl * 1000)]
+        return self._transaction(key, expected, *command)
+
+    def compare_and_delete(self, key, expected):
+        """Удаляет ключ, только если его значение равно expected."""
+        return self._transaction(key, expected, 'DEL', key)
+
+    def scan(self, pattern, count=1000):
+        """Перебирает ключи, подходящие под glob-шаблон.
+        Ключи читаются курсором SCAN по count за раз, поэтому сервер не
+        блокируется на время обхода всех ключей, как при KEYS.
+        """
+        cursor = '0'
+        while True:
+            cursor, keys = self.client.execute(
+                'SCAN', cursor, 'MATCH', pattern, 'COUNT', count)
+            yield from keys
+            if cursor == '0':
+                return
+
+    def zadd(self, key, score, member):
+        """Добавляет member в упорядоченное множество key с весом score."""
+        self.client.execute('ZADD', key, score, member)
+
+    def zrem(self, key, member):
+        """Удаляет member из упорядоченного множества key."""
+        self.client.execute('ZREM', key, member)
+
+    def zremrangebyscore(self, key, low, high):
+        """Удаляет из множества key элементы с весом от low до high."""
+        self.client.execute('ZREMRANGEBYSCORE', key, low, high)
+
+    def zcard(self, key):
+        """Возвращает число элементов упорядоченного множества key."""
+        return self.client.execute('ZCARD', key)
+
+
+def backend_from_url(url):
+    """Создаёт хранилище по адресу вида redis://:пароль@хост:порт/база.
+    Адрес memory:// даёт хранилище в памяти процесса.
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == 'memory':
+        return MemoryBackend()
+    if parsed.scheme != 'redis':
+        raise ValueError(f'Неизвестное хранилище: {url}')
+    return RedisBackend(RedisClient(
+        host=parsed.hostname or '127.0.0.1',
+        port=parsed.port or 6379,
+        db=int(parsed.path.lstrip('/') or 0),
+        password=parsed.password,
+    ))
+
+
+class LeaseManager:
+    """Делит подписки между узлами с помощью аренды слотов.
+
+    Подписки разложены по slots слотам по хешу токена. Узел держит
+    аренду слота в общем хранилище ttl секунд и продлевает её каждые
+    ttl / 3 секунд. Живые узлы отмечаются в упорядоченном множестве со
+    сроком отметки в весе. Каждый узел стремится держать поровну слотов,
+    судя по числу живых узлов, лишние отпускает, свободные забирает. Если узел
+    не смог продлить аренду, он прекращает опрос слота до истечения её
+    срока, поэтому два узла не опрашивают одну подписку. Слоты упавшего
+    узла освобождаются через ttl секунд и сразу разбираются остальными.
+    Перед тем как отпустить слоты, узел сбрасывает store, чтобы новый
+    владелец продолжил с последнего сохранённого состояния. Если задан
+    global_rate, общий лимит Telegram делится поровну между живыми узлами:
+    при каждом изменении их числа очередь отправки узла получает свою долю.
+    """
+
+    def __init__(self, backend, tenants, node_id=None, slots=256, ttl=30,
+                 prefix='homework_bot', store=None, global_rate=None):
+        self.backend = backend
+        self.store = store
+        self.global_rate = global_rate
+        self.tenants = list(tenants)
+        self.node_id = node_id or f'{socket.gethostname()}:{os.getpid()}'
+        self.slots = slots
+        self.ttl = ttl
+        self.prefix = prefix
+        self.owned = {}
+        self._engine = None
+        self._dispatcher = None
+        self._nodes = None
+        self._applied = None
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def slot_of(self, tenant):
+        """Возвращает слот подписки."""
+        return zlib.crc32(str(tenant.token).encode('utf-8')) % self.slots
+
+    def _slot_key(self, slot):
+        return f'{self.prefix}:lease:{slot}'
+
+    def _nodes_key(self):
+        return f'{self.prefix}:nodes'
+
+    def owned_tenants(self):
+        """Возвращает подписки из арендованных узлом слотов."""
+        return [t for t in self.tenants if self.slot_of(t) in self.owned]
+
+    def _expire(self, now):
+        for slot, expires in list(self.owned.items()):
+            if expires <= now:
+                del self.owned[slot]
+
+    def cycle(self):
+        """Выполняет один раунд продления и перераспределения аренды."""
+        # Запас на расхождение часов и задержку до следующего раунда.
+        margin = self.ttl / 3
+        started = time.monotonic()
+        # Веса — сроки отметок по часам узлов, поэтому сравнимы между ними.
+        now = time.time()
+        self.backend.zadd(self._nodes_key(), now + self.ttl, self.node_id)
+        self.backend.zremrangebyscore(self._nodes_key(), float('-inf'), now)
+        nodes = max(self.backend.zcard(self._nodes_key()), 1)
+        self._share_rate(nodes)
+        target = math.ceil(self.slots / nodes)
+        for slot in sorted(self.owned):
+            if self.backend.compare_and_set(self._slot_key(slot),
+                                            self.node_id, self.node_id,
+                                            self.ttl):
+                self.owned[slot] = started + self.ttl - margin
+            else:
+                del self.owned[slot]
+        excess = sorted(self.owned)[target:]
+        if excess:
+            for slot in excess:
+                del self.owned[slot]
+            # Сначала прекращаем опрос и дожидаемся начатых опросов и их
+            # состояния, потом отдаём слоты другим.
+            applied = self._apply()
+            try:
+                if applied is not None:
+                    applied.result(margin)
+            except FutureTimeout:
+                logging.warning('Опросы отпускаемых слотов не завершились, '
+                                'аренда истечёт сама')
+            else:
+                self._release(excess)
+        if len(self.owned) < target:
+            self._acquire(target, started + self.ttl - margin)
+
+    def _share_rate(self, nodes):
+        if (self._dispatcher is None or self.global_rate is None
+                or nodes == self._nodes):
+            return
+        self._nodes = nodes
+        rate = self.global_rate / nodes
+        logging.info(f'Узлов: {nodes}, лимит Telegram узла {self.node_id}: '
+                     f'{rate:g} сообщений в секунду')
+        self._dispatcher.set_global_rate(rate)
+
+    def _release(self, slots):
+        if self.store is not None:
+            self.store.flush()
+        for slot in slots:
+            self.backend.compare_and_delete(self._slot_key(slot),
+                                            self.node_id)
+
+    def _acquire(self, target, expires):
+        keys = [self._slot_key(slot) for slot in range(self.slots)]
+        free = [
+            slot for slot, owner in enumerate(self.backend.mget(keys))
+            if owner is None
+        ]
+        for slot in free:
+            if len(self.owned) >= target:
+                return
+            if self.backend.set(self._slot_key(slot), self.node_id,
+                                self.ttl, only_new=True):
+                self.owned[slot] = expires
+
+    def _apply(self):
+        """Передаёт движку подписки, если набор слотов изменился.
+        Возвращает Future из engine.update_tenants или None, если
+        передавать нечего.
+        """
+        slots = frozenset(self.owned)
+        if self._engine is None or slots == self._applied:
+            return None
+        logging.info(f'Узел {self.node_id} держит слотов: '
+                     f'{len(slots)} из {self.slots}')
+        applied = self._engine.update_tenants(self.owned_tenants())
+        self._applied = slots
+        return applied
+
+    def _run(self):
+        self._engine.started.wait()
+        while not self._stopped.is_set():
+            try:
+                self.cycle()
+            except BackendError as error:
+                logging.error(f'Не удалось продлить аренду: {error}')
+            self._expire(time.monotonic())
+            self._apply()
+            self._stopped.wait(self.ttl / 3)
+
+    def start(self, engine, dispatcher=None):
+        """Запускает продление аренды и передачу подписок в engine.
+        Если передана очередь отправки dispatcher, ей назначается доля
+        global_rate узла.
+        """
+        self._engine = engine
+        self._dispatcher = dispatcher
+        self._thread = threading.Thread(
+            target=self._run, name='leases', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Отпускает все слоты, чтобы их сразу забрали другие узлы."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        slots = list(self.owned)
+        self.owned.clear()
+        try:
+            self._release(slots)
+            self.backend.zrem(self._nodes_key(), self.node_id)
+        except BackendError as error:
+            logging.warning(f'Аренда не отпущена, истечёт сама: {error}')
@@ -0,0 +1,129 @@
+import json
+import logging
+import queue
+import threading
+import time
+from collections import OrderedDict
+from logging.handlers import (QueueHandler, QueueListener,
+                              RotatingFileHandler, TimedRotatingFileHandler)
+
+
+class JsonFormatter(logging.Formatter):
+    """Форматирует запись лога в одну строку JSON."""
+
+    def format(self, record):
+        """Возвращает запись в виде строки JSON."""
+        data = {
+            'time': self.formatTime(record),
+            'level': record.levelname,
+            'func': record.funcName,
+            'line': record.lineno,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        suppressed = getattr(record, 'suppressed', 0)
+        if suppressed:
+            data['suppressed'] = suppressed
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, ensure_ascii=False)
+
+
+class RepeatFilter(logging.Filter):
+    """Ограничивает число одинаковых записей из одного места кода.
+
+    За каждые interval секунд из одной строки кода с одним и тем же
+    текстом пропускается не больше burst записей уровней levels, поэтому
+    ошибки разных подписок не вытесняют друг друга. INFO по умолчанию не
+    ограничивается: это журнал отправленных сообщений. Число отброшенных
+    записей сообщается в поле suppressed первой записи следующего окна.
+    Окна упорядочены по началу: истёкшие забываются с начала очереди, а
+    если и живых окон больше max_windows, забываются самые старые из них.
+    """
+
+    def __init__(self, interval=60, burst=20,
+                 levels=(logging.DEBUG, logging.WARNING, logging.ERROR),
+                 max_windows=10000):
+        super().__init__()
+        self.interval = interval
+        self.burst = burst
+        self.levels = frozenset(levels)
+        self.max_windows = max_windows
+        self._windows = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _forget(self, now):
+        windows = self._windows
+        while windows:
+            window = next(iter(windows.values()))
+            if (now - window[0] < self.interval
+                    and len(windows) <= self.max_windows):
+                return
+            windows.popitem(last=False)
+
+    def filter(self, record):
+        """Решает, пропустить ли запись в лог."""
+        if record.levelno not in self.levels:
+            return True
+        key = (record.pathname, record.lineno, record.getMessage())
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                self._windows[key] = [now, 1, 0]
+                self._windows.move_to_end(key)
+                self._forget(now)
+                if suppressed:
+                    record.suppressed = suppressed
+                return True
+            if window[1] < self.burst:
+                window[1] += 1
+                return True
+            window[2] += 1
+            return False
+
+
+class _QueueHandler(QueueHandler):
+    """Не блокирует вызывающий поток, если очередь переполнена."""
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+
+def setup_logging(filename='main.log', level=logging.DEBUG,
+                  max_bytes=10 * 1024 * 1024, backup_count=5,
+                  rotate_when=None, sample_interval=60, sample_burst=20,
+                  sample_levels=(logging.DEBUG, logging.WARNING,
+                                 logging.ERROR),
+                  queue_size=10000):
+    """Настраивает неблокирующее логирование в файл с ротацией.
+    Записи из любого потока только кладутся в очередь, а в файл их пишет
+    фоновый поток QueueListener. Если задан rotate_when (например,
+    'midnight'), файл ротируется по времени, иначе — по размеру.
+    Повторы записей уровней sample_levels ограничивает RepeatFilter.
+    Возвращает запущенный QueueListener, который нужно остановить при
+    завершении работы.
+    """
+    if rotate_when:
+        handler = TimedRotatingFileHandler(
+            filename, when=rotate_when, backupCount=backup_count,
+            encoding='utf-8')
+    else:
+        handler = RotatingFileHandler(
+            filename, maxBytes=max_bytes, backupCount=backup_count,
+            encoding='utf-8')
+    handler.setFormatter(JsonFormatter())
+    records = queue.Queue(queue_size)
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(
+        RepeatFilter(sample_interval, sample_burst, sample_levels))
+    root = logging.getLogger()
+    root.setLevel(level)
+    root.addHandler(queue_handler)
+    listener = QueueListener(records, handler, respect_handler_level=True)
+    listener.start()
+    return listener
@@ -0,0 +1,310 @@
+import bisect
+import threading
+
+DEFAULT_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1, 2.5, 5, 10, 30,
+)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{value}"' for name, value in zip(names, values))
+    return '{' + pairs + '}'
+
+
+class Counter:
+    """Монотонно растущий счётчик с необязательными метками."""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        """Увеличивает счётчик для набора значений меток."""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        """Возвращает текущее значение счётчика."""
+        return self._values.get(labels, 0)
+
+    def export(self):
+        """Возвращает значения счётчика для передачи в другой процесс."""
+        with self._lock:
+            return dict(self._values)
+
+    @staticmethod
+    def merge(exports):
+        """Складывает значения, полученные из export() разных процессов."""
+        merged = {}
+        for values in exports:
+            for labels, value in values.items():
+                merged[labels] = merged.get(labels, 0) + value
+        return merged
+
+    def samples(self, data=None):
+        """Возвращает строки в текстовом формате Prometheus."""
+        if data is None:
+            data = self.export()
+        return [
+            f'{self.name}{_format_labels(self.labelnames, labels)} {value}'
+            for labels, value in data.items()
+        ]
+
+
+class Gauge:
+    """Текущее значение величины.
+    Значение задаётся через set() или вычисляется функцией при каждом
+    чтении, если она передана в set_function().
+    """
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._value = 0
+        self._function = None
+
+    def set(self, value):
+        """Задаёт значение."""
+        self._value = value
+
+    def set_function(self, function):
+        """Задаёт функцию, которая вычисляет значение при чтении."""
+        self._function = function
+
+    def value(self):
+        """Возвращает текущее значение."""
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+    def export(self):
+        """Возвращает значение для передачи в другой процесс."""
+        return self.value()
+
+    @staticmethod
+    def merge(exports):
+        """Складывает значения, полученные из export() разных процессов."""
+        return sum(exports)
+
+    def samples(self, data=None):
+        """Возвращает строки в текстовом формате Prometheus."""
+        if data is None:
+            data = self.export()
+        return [f'{self.name} {data}']
+
+
+class Histogram:
+    """Гистограмма с фиксированными границами корзин.
+    Запись — поиск корзины делением пополам и два сложения под
+    блокировкой, поэтому её можно не отключать в бою.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        """Добавляет наблюдение."""
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+
+    @property
+    def count(self):
+        """Возвращает число наблюдений."""
+        return sum(self._counts)
+
+    def snapshot(self):
+        """Возвращает копию счётчиков корзин."""
+        with self._lock:
+            return list(self._counts)
+
+    def quantile(self, q, since=None):
+        """Оценивает квантиль q по верхним границам корзин.
+        Если передан since — результат snapshot(), учитываются только
+        наблюдения, сделанные после него.
+        """
+        counts = self.snapshot()
+        if since is not None:
+            counts = [now - before for now, before in zip(counts, since)]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def export(self):
+        """Возвращает корзины и сумму для передачи в другой процесс."""
+        with self._lock:
+            return list(self._counts), self._sum
+
+    @staticmethod
+    def merge(exports):
+        """Складывает гистограммы, полученные из export() разных процессов."""
+        exports = list(exports)
+        if not exports:
+            return None
+        counts = [sum(column) for column in zip(*(e[0] for e in exports))]
+        return counts, sum(e[1] for e in exports)
+
+    def samples(self, data=None):
+        """Возвращает строки в текстовом формате Prometheus."""
+        if data is None:
+            data = self.export()
+        counts, total_sum = data
+        lines = []
+        seen = 0
+        for bound, count in zip(self.buckets, counts):
+            seen += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {seen}')
+        seen += counts[-1]
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {seen}')
+        lines.append(f'{self.name}_sum {total_sum}')
+        lines.append(f'{self.name}_count {seen}')
+        return lines
+
+
+class Registry:
+    """Набор метрик, который отдаётся одной страницей."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        """Добавляет метрику и возвращает её."""
+        self._metrics.append(metric)
+        return metric
+
+    def snapshot(self):
+        """Возвращает значения всех метрик для передачи в другой процесс."""
+        return {metric.name: metric.export() for metric in self._metrics}
+
+    def render(self, snapshot=None):
+        """Возвращает все метрики в текстовом формате Prometheus."""
+        lines = []
+        for metric in self._metrics:
+            data = None if snapshot is None else snapshot.get(metric.name)
+            if snapshot is not None and data is None:
+                continue
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples(data))
+        return '\n'.join(lines) + '\n'
+
+
+class Rollup:
+    """Сводит метрики нескольких процессов в одну страницу.
+    Каждый процесс присылает registry.snapshot(), страница показывает
+    сумму последних снимков всех процессов.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def update(self, source, snapshot):
+        """Запоминает последний снимок метрик процесса source."""
+        with self._lock:
+            self._snapshots[source] = snapshot
+
+    def merged(self):
+        """Возвращает сумму последних снимков всех процессов."""
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        merged = {}
+        for metric in self.registry._metrics:
+            exports = [s[metric.name] for s in snapshots if metric.name in s]
+            if exports:
+                merged[metric.name] = metric.merge(exports)
+        return merged
+
+    def render(self):
+        """Возвращает сумму снимков в текстовом формате Prometheus."""
+        return self.registry.render(self.merged())
+
+
+REGISTRY = Registry()
+FETCH_SECONDS = REGISTRY.register(Histogram(
+    'bot_fetch_seconds', 'Длительность запроса к API Практикума.'))
+PARSE_SECONDS = REGISTRY.register(Histogram(
+    'bot_parse_seconds', 'Длительность проверки и разбора ответа API.'))
+SEND_SECONDS = REGISTRY.register(Histogram(
+    'bot_send_seconds', 'Длительность отправки сообщения в Telegram.'))
+LOOP_LAG_SECONDS = REGISTRY.register(Histogram(
+    'bot_loop_lag_seconds', 'Опоздание опроса относительно его срока.'))
+POLLS = REGISTRY.register(Counter(
+    'bot_polls_total', 'Число выполненных опросов.'))
+NOTIFICATIONS = REGISTRY.register(Counter(
+    'bot_notifications_total', 'Число отправленных уведомлений.'))
+DIGESTED = REGISTRY.register(Counter(
+    'bot_digested_total', 'Число уведомлений, объединённых в сводки.'))
+OUTBOX_DUPLICATES = REGISTRY.register(Counter(
+    'bot_outbox_duplicates_total',
+    'Число уведомлений, пропущенных по ключу идемпотентности.'))
+FETCH_SHARED = REGISTRY.register(Counter(
+    'bot_fetch_shared_total', 'Число запросов, обслуженных чужим ответом.',
+    ('source',)))
+ERRORS = REGISTRY.register(Counter(
+    'bot_errors_total', 'Число ошибок по стадиям.', ('stage',)))
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    'bot_send_queue_depth', 'Число сообщений в очереди на отправку.'))
+TENANTS = REGISTRY.register(Gauge(
+    'bot_tenants', 'Число обслуживаемых подписок.'))
+CIRCUIT_STATE = REGISTRY.register(Gauge(
+    'bot_circuit_open', 'Разомкнут ли предохранитель запросов к API.'))
+HTTP_CONNECTIONS = REGISTRY.register(Gauge(
+    'bot_http_connections', 'Число открытых соединений к API.'))
+HTTP_REUSED = REGISTRY.register(Gauge(
+    'bot_http_reused_requests', 'Число запросов по уже открытому соединению.'))
+
+
+def start_http_server(port, host='127.0.0.1', registry=REGISTRY):
+    """Запускает в фоновом потоке HTTP-сервер со страницей /metrics."""
+    # http.server тянет за собой email и html, импортируем по требованию.
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path not in ('/', '/metrics'):
+                self.send_error(404)
+                return
+            body = self.server.registry.render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), MetricsHandler)
+    server.registry = registry
+    thread = threading.Thread(
+        target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,246 @@
+import logging
+import os
+import threading
+import time
+import uuid
+
+from metrics import OUTBOX_DUPLICATES
+
+
+class Outbox:
+    """Надёжная очередь уведомлений в SQLite с доставкой хотя бы один раз.
+
+    put() сначала сохраняет уведомление под ключом идемпотентности, а уже
+    потом отдаёт его в send (Digest.submit или Dispatcher.submit) вместе с
+    обратным вызовом. Уведомление с уже сохранённым ключом пропускается,
+    поэтому повторный опрос после перезапуска не шлёт его второй раз.
+
+    Раз в interval секунд фоновый поток одной транзакцией отмечает
+    отправленные уведомления и забирает на повтор те, что не отправлены:
+    после ошибки — через retry, 2 * retry, … до max_retry секунд, а
+    оставшиеся от упавшего процесса — через retry секунд. Как только
+    Telegram снова принимает сообщения, все ждущие повтора уведомления
+    ставятся в очередь сразу, и её разбирает Dispatcher на пределе
+    частоты. В очереди send одновременно не больше batch уведомлений.
+
+    Уведомление, которое не отправилось max_attempts раз или на которое
+    Telegram ответил ошибкой, признанной permanent(error) окончательной
+    (бот заблокирован, чат удалён), больше не повторяется: оно
+    закрывается с текстом ошибки в столбце error.
+
+    Файл могут делить процессы-шарды: уведомление забирает один процесс и
+    продлевает его, пока оно у него в очереди. Закрытые уведомления
+    хранятся retention секунд, чтобы ключи защищали от повторов.
+    """
+
+    def __init__(self, path, send, interval=1.0, batch=500, retry=30,
+                 max_retry=600, retention=7 * 24 * 3600, max_attempts=100,
+                 permanent=None):
+        import sqlite3
+
+        self.path = path
+        self.send = send
+        self.interval = interval
+        self.batch = batch
+        self.retry = retry
+        self.max_retry = max_retry
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self.permanent = permanent
+        self.owner = f'{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self._connection = sqlite3.connect(
+            path, timeout=30, check_same_thread=False,
+            isolation_level=None)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        # У chat_id нет типа столбца: номер чата и @имя канала читаются
+        # обратно такими же, какими были записаны. sent_at — момент, когда
+        # уведомление закрыто: отправлено или, если задан error, брошено.
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS outbox ('
+            'key TEXT PRIMARY KEY, chat_id NOT NULL, '
+            'message TEXT NOT NULL, created_at REAL NOT NULL, '
+            'next_at REAL NOT NULL, attempts INTEGER NOT NULL, '
+            'owner TEXT, sent_at REAL, error TEXT)'
+        )
+        columns = {row[1] for row in self._connection.execute(
+            'PRAGMA table_info(outbox)')}
+        if 'error' not in columns:
+            # Файл очереди из версии без столбца error.
+            self._connection.execute(
+                'ALTER TABLE outbox ADD COLUMN error TEXT')
+        self._connection.execute(
+            'CREATE INDEX IF NOT EXISTS outbox_due ON outbox (next_at) '
+            'WHERE sent_at IS NULL')
+        self._db_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._done = []
+        self._in_flight = 0
+        self._failed = False
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def __len__(self):
+        with self._db_lock:
+            (count,) = self._connection.execute(
+                'SELECT COUNT(*) FROM outbox WHERE sent_at IS NULL'
+            ).fetchone()
+        return count
+
+    def put(self, chat_id, message, key):
+        """Сохраняет уведомление и отдаёт его на отправку.
+        Возвращает False, если уведомление с ключом key уже было.
+        """
+        now = time.time()
+        with self._db_lock:
+            cursor = self._connection.execute(
+                'INSERT OR IGNORE INTO outbox (key, chat_id, message, '
+                'created_at, next_at, attempts, owner) '
+                'VALUES (?, ?, ?, ?, ?, 1, ?)',
+                (key, chat_id, message, now, now + self.retry,
+                 self.owner),
+            )
+        if not cursor.rowcount:
+            OUTBOX_DUPLICATES.inc()
+            logging.debug(f'Уведомление {key} уже было, пропущено')
+            return False
+        self._submit(key, chat_id, message)
+        return True
+
+    def _submit(self, key, chat_id, message):
+        with self._lock:
+            self._in_flight += 1
+        self.send(chat_id, message,
+                  lambda error: self._on_done(key, error))
+
+    def _on_done(self, key, error):
+        with self._lock:
+            self._in_flight -= 1
+            self._done.append((key, error))
+
+    def _is_permanent(self, error):
+        if self.permanent is None:
+            return False
+        try:
+            return bool(self.permanent(error))
+        except Exception:
+            return False
+
+    def drain(self):
+        """Записывает итоги отправки и забирает уведомления на повтор.
+        Возвращает число уведомлений, снова отданных на отправку.
+        """
+        now = time.time()
+        with self._lock:
+            done, self._done = self._done, []
+            room = max(self.batch - self._in_flight, 0)
+        sent = [(now, key) for key, error in done if error is None]
+        failed = []
+        dead = []
+        for key, error in done:
+            if error is None:
+                continue
+            if self._is_permanent(error):
+                logging.error(f'Уведомление {key} не будет доставлено: '
+                              f'{error}')
+                dead.append((now, str(error), key))
+            else:
+                failed.append((now, str(error), key))
+        # Первая удача после сбоев значит, что Telegram снова доступен.
+        recovered = self._failed and bool(sent)
+        self._failed = (self._failed or bool(failed)) and not sent
+        with self._db_lock:
+            rows = self._claim(now, sent, failed, dead, recovered, room)
+        for key, chat_id, message in rows:
+            self._submit(key, chat_id, message)
+        return len(rows)
+
+    def _claim(self, now, sent, failed, dead, recovered, room):
+        connection = self._connection
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'UPDATE outbox SET sent_at = ?, owner = NULL WHERE key = ?',
+                sent)
+            connection.executemany(
+                'UPDATE outbox SET sent_at = ?, owner = NULL, error = ? '
+                'WHERE key = ?', dead)
+            exhausted = connection.executemany(
+                'UPDATE outbox SET sent_at = ?, owner = NULL, error = ? '
+                'WHERE key = ? AND attempts >= ?',
+                [(moment, error, key, self.max_attempts)
+                 for moment, error, key in failed]).rowcount
+            if exhausted > 0:
+                logging.error(f'Уведомлений брошено после '
+                              f'{self.max_attempts} попыток: {exhausted}')
+            connection.executemany(
+                'UPDATE outbox SET owner = NULL, next_at = ? + MIN(?, ? * '
+                '(1 << MIN(attempts - 1, 20))) '
+                'WHERE key = ? AND sent_at IS NULL',
+                [(moment, self.max_retry, self.retry, key)
+                 for moment, _, key in failed])
+            if recovered:
+                connection.execute(
+                    'UPDATE outbox SET next_at = ? '
+                    'WHERE sent_at IS NULL AND owner IS NULL', (now,))
+            # Свои уведомления в очереди продлеваются, чтобы их не забрал
+            # другой процесс.
+            connection.execute(
+                'UPDATE outbox SET next_at = ? '
+                'WHERE owner = ? AND sent_at IS NULL',
+                (now + self.retry, self.owner))
+            rows = connection.execute(
+                'SELECT key, chat_id, message FROM outbox '
+                'WHERE sent_at IS NULL AND next_at <= ? '
+                'ORDER BY next_at LIMIT ?', (now, room)).fetchall()
+            connection.executemany(
+                'UPDATE outbox SET owner = ?, next_at = ?, '
+                'attempts = attempts + 1 WHERE key = ?',
+                [(self.owner, now + self.retry, key) for key, _, _ in rows])
+            connection.execute(
+                'DELETE FROM outbox WHERE sent_at < ?',
+                (now - self.retention,))
+            connection.execute('COMMIT')
+        except Exception:
+            connection.execute('ROLLBACK')
+            raise
+        return rows
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.drain()
+            except Exception as error:
+                logging.error(f'Ошибка очереди уведомлений: {error}')
+
+    def start(self):
+        """Запускает фоновый поток повторов.
+        Оставшееся с прошлого запуска отправляется сразу.
+        """
+        self.drain()
+        self._thread = threading.Thread(
+            target=self._run, name='outbox', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Останавливает повторы; итоги отправки ещё принимаются."""
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def close(self):
+        """Записывает итоги отправки и закрывает базу.
+        Неотправленные уведомления уйдут после следующего запуска.
+        """
+        self.stop()
+        with self._lock:
+            done, self._done = self._done, []
+        now = time.time()
+        with self._db_lock:
+            self._connection.executemany(
+                'UPDATE outbox SET sent_at = ?, owner = NULL WHERE key = ?',
+                [(now, key) for key, error in done if error is None])
+            self._connection.execute(
+                'UPDATE outbox SET owner = NULL, next_at = ? '
+                'WHERE owner = ? AND sent_at IS NULL', (now, self.owner))
+            self._connection.close()
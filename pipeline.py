@@ -0,0 +1,160 @@
+import logging
+import queue
+import threading
+import time
+
+_END = object()
+
+
+class Stage:
+    """Шаг конвейера: функция, число её потоков и ёмкость входной очереди.
+
+    function получает элемент и возвращает элемент для следующего шага
+    или None, если дальше он не идёт. Ошибка function пишется в лог, а
+    элемент отбрасывается. Счётчики шага показывают, сколько элементов он
+    обработал, сколько секунд работал и сколько ждал места в очереди
+    следующего шага, то есть сдерживался им.
+    """
+
+    __slots__ = ('name', 'function', 'workers', 'capacity', 'processed',
+                 'dropped', 'errors', 'busy', 'blocked', '_lock')
+
+    def __init__(self, name, function, workers=1, capacity=64):
+        self.name = name
+        self.function = function
+        self.workers = workers
+        self.capacity = capacity
+        self.processed = 0
+        self.dropped = 0
+        self.errors = 0
+        self.busy = 0.0
+        self.blocked = 0.0
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'Stage({self.name!r}, workers={self.workers})'
+
+    def _count(self, result, busy, blocked, failed=False):
+        with self._lock:
+            self.processed += 1
+            self.dropped += result is None
+            self.errors += failed
+            self.busy += busy
+            self.blocked += blocked
+
+    def stats(self):
+        """Возвращает счётчики шага."""
+        return {
+            'processed': self.processed,
+            'dropped': self.dropped,
+            'errors': self.errors,
+            'busy_seconds': self.busy,
+            'blocked_seconds': self.blocked,
+        }
+
+
+class Pipeline:
+    """Конвейер шагов stages с ограниченными очередями между ними.
+
+    У каждого шага свои потоки, поэтому разные элементы одновременно
+    проходят разные шаги. Очередь перед шагом вмещает capacity элементов,
+    и шаг, которому некуда положить результат, ждёт: медленный последний
+    шаг останавливает все предыдущие и чтение источника, и в конвейере
+    никогда не больше суммы ёмкостей очередей и числа потоков элементов.
+    Порядок элементов сохраняется, только если у всех шагов по потоку.
+    """
+
+    def __init__(self, stages, poll_interval=0.1):
+        self.stages = list(stages)
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self, items):
+        """Прогоняет элементы items через шаги.
+        Отдаёт результаты последнего шага по мере готовности. Если их
+        перестали забирать, конвейер останавливается.
+        """
+        self._stopped.clear()
+        queues = [queue.Queue(stage.capacity) for stage in self.stages]
+        queues.append(queue.Queue(self.stages[-1].capacity))
+        threads = [threading.Thread(
+            target=self._feed, args=(items, queues[0]), name='pipeline-feed',
+            daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for number in range(stage.workers):
+                threads.append(threading.Thread(
+                    target=self._work,
+                    args=(stage, queues[index], queues[index + 1], remaining),
+                    name=f'pipeline-{stage.name}-{number}', daemon=True))
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                item = self._get(queues[-1])
+                if item is _END:
+                    return
+                yield item
+        finally:
+            self._stopped.set()
+            for thread in threads:
+                thread.join()
+
+    def stats(self):
+        """Возвращает счётчики всех шагов по их именам."""
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def _put(self, target, item):
+        """Кладёт item в очередь, ожидая места; False, если конвейер стоп."""
+        while not self._stopped.is_set():
+            try:
+                target.put(item, timeout=self.poll_interval)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, source):
+        while not self._stopped.is_set():
+            try:
+                return source.get(timeout=self.poll_interval)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _feed(self, items, target):
+        try:
+            for item in items:
+                if not self._put(target, item):
+                    return
+        except Exception as error:
+            logging.error(f'Ошибка источника конвейера: {error}')
+        self._put(target, _END)
+
+    def _work(self, stage, source, target, remaining):
+        while True:
+            item = self._get(source)
+            if item is _END:
+                break
+            started = time.perf_counter()
+            failed = False
+            try:
+                result = stage.function(item)
+            except Exception as error:
+                logging.error(f'Ошибка шага {stage.name}: {error}')
+                failed = True
+                result = None
+            finished = time.perf_counter()
+            if result is not None and not self._put(target, result):
+                return
+            stage._count(result, finished - started,
+                         time.perf_counter() - finished, failed)
+        # Конец потока видят все потоки шага, а дальше его передаёт
+        # последний из них.
+        self._put(source, _END)
+        with self._lock:
+            remaining[0] -= 1
+            last = remaining[0] == 0
+        if last:
+            self._put(target, _END)
@@ -0,0 +1,187 @@
+import logging
+import os
+import queue
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+
+
+class Profiler:
+    """Профилировщик работающего процесса, включаемый по требованию.
+
+    Пока он выключен, в процессе нет ни его потока, ни трассировки
+    памяти. Включённый, он раз в interval секунд снимает стеки всех
+    потоков (цикл опроса, пул запросов, отправка) и считает, сколько раз
+    встретился каждый стек; при 100 снимках в секунду опрос, занятый
+    только процессором, замедляется примерно на десятую часть. С memory
+    ещё и tracemalloc запоминает frames кадров каждого выделения памяти,
+    что замедляет опрос в разы, поэтому трассировка памяти включается
+    отдельно. Раз в dump_interval секунд и при выключении накопленное пишется в
+    directory: стеки — в формате collapsed stacks (строка «поток;функция;…
+    число»), который читают flamegraph.pl и speedscope, память — снимком
+    tracemalloc, который загружает tracemalloc.Snapshot.load(). Самые
+    выросшие с прошлого снимка места выделения пишутся в лог.
+    """
+
+    def __init__(self, directory, interval=0.01, dump_interval=60,
+                 memory=False, frames=1):
+        self.directory = directory
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.memory = memory
+        self.frames = frames
+        self.samples = Counter()
+        self._labels = {}
+        self._snapshot = None
+        self._tracing = False
+        self._dumps = 0
+        self._thread = None
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._requests = None
+
+    @property
+    def running(self):
+        """Проверяет, идёт ли профилирование."""
+        thread = self._thread
+        return thread is not None and not self._stopped.is_set()
+
+    def start(self):
+        """Начинает снимать стеки и трассировать память."""
+        with self._lock:
+            if self.running:
+                return
+            if self._thread is not None:
+                self._thread.join()
+            if self.memory:
+                import tracemalloc
+
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start(self.frames)
+                    self._tracing = True
+            self._stopped.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='profiler', daemon=True)
+            self._thread.start()
+        logging.warning(f'Профилирование включено, отчёты в {self.directory}')
+
+    def stop(self, wait=False):
+        """Выключает профилирование; последний отчёт пишет поток профиля.
+        Без wait не ждёт его, поэтому безопасен в обработчике сигнала.
+        """
+        self._stopped.set()
+        thread = self._thread
+        if wait and thread is not None:
+            thread.join()
+
+    def toggle(self):
+        """Включает профилирование, если оно выключено, и наоборот."""
+        if self.running:
+            self.stop()
+        else:
+            self.start()
+
+    def install_signal(self, signum=None):
+        """Включает и выключает профилирование по сигналу signum.
+        По умолчанию это SIGUSR2. Вызывать можно только из главного потока.
+        Обработчик только кладёт запрос в очередь, а переключает поток
+        profiler-signal: start() берёт блокировку и ждёт прежний поток
+        профиля, что в обработчике сигнала могло бы зависнуть.
+        """
+        signum = signum or getattr(signal, 'SIGUSR2', None)
+        if signum is None:
+            return
+        if self._requests is None:
+            self._requests = queue.SimpleQueue()
+            threading.Thread(target=self._serve_requests,
+                             name='profiler-signal', daemon=True).start()
+        requests = self._requests
+        signal.signal(signum, lambda number, frame: requests.put(None))
+
+    def _serve_requests(self):
+        while True:
+            self._requests.get()
+            try:
+                self.toggle()
+            except Exception as error:
+                logging.error(f'Не удалось переключить профилирование: '
+                              f'{error}')
+
+    def _label(self, code):
+        label = self._labels.get(code)
+        if label is None:
+            label = (f'{code.co_name} ({os.path.basename(code.co_filename)}'
+                     f':{code.co_firstlineno})')
+            self._labels[code] = label
+        return label
+
+    def sample(self):
+        """Снимает стеки всех потоков, кроме потока профиля."""
+        names = {thread.ident: thread.name
+                 for thread in threading.enumerate()}
+        own = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            stack.reverse()
+            self.samples[';'.join(stack)] += 1
+
+    def dump(self):
+        """Пишет накопленные стеки и снимок памяти и начинает копить заново.
+        Возвращает список записанных файлов.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        self._dumps += 1
+        stamp = (f'{os.getpid()}-{time.strftime("%Y%m%d-%H%M%S")}'
+                 f'-{self._dumps:04d}')
+        paths = []
+        samples, self.samples = self.samples, Counter()
+        if samples:
+            path = os.path.join(self.directory, f'cpu-{stamp}.collapsed')
+            with open(path, 'w', encoding='utf-8') as file:
+                for stack, count in samples.most_common():
+                    file.write(f'{stack} {count}\n')
+            paths.append(path)
+        if self._tracing:
+            paths.append(self._dump_memory(stamp))
+        return paths
+
+    def _dump_memory(self, stamp):
+        import tracemalloc
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, tracemalloc.__file__)])
+        path = os.path.join(self.directory, f'memory-{stamp}.tracemalloc')
+        snapshot.dump(path)
+        if self._snapshot is not None:
+            for stat in snapshot.compare_to(self._snapshot, 'lineno')[:5]:
+                logging.info(f'Память: {stat}')
+        self._snapshot = snapshot
+        return path
+
+    def _run(self):
+        next_dump = time.monotonic() + self.dump_interval
+        try:
+            while not self._stopped.wait(self.interval):
+                self.sample()
+                if time.monotonic() >= next_dump:
+                    self.dump()
+                    next_dump = time.monotonic() + self.dump_interval
+            self.dump()
+        except OSError as error:
+            logging.error(f'Не удалось записать профиль: {error}')
+        finally:
+            if self._tracing:
+                import tracemalloc
+
+                tracemalloc.stop()
+                self._tracing = False
+            self._snapshot = None
+        logging.warning('Профилирование выключено')
@@ -0,0 +1,304 @@
+import base64
+import enum
+import hashlib
+import sys
+import threading
+from array import array
+from bisect import bisect_left
+from datetime import datetime
+
+
+class Status(str, enum.Enum):
+    """Статус проверки работы.
+    Члены равны своим строкам из API, поэтому их можно сравнивать со
+    строками и использовать как ключи вместо них.
+    """
+
+    REVIEWING = 'reviewing'
+    APPROVED = 'approved'
+    REJECTED = 'rejected'
+
+    def __str__(self):
+        return self.value
+
+
+class InternTable:
+    """Таблица, которая выдаёт одинаковым значениям один и тот же код.
+    Значение хранится в таблице один раз, а записи хранят только код.
+    """
+
+    def __init__(self, values=()):
+        self._codes = {}
+        self._values = []
+        self._lock = threading.Lock()
+        for value in values:
+            self.code(value)
+
+    def __len__(self):
+        return len(self._values)
+
+    def code(self, value):
+        """Возвращает код значения, при первой встрече добавляя его."""
+        code = self._codes.get(value)
+        if code is not None:
+            return code
+        with self._lock:
+            code = self._codes.get(value)
+            if code is None:
+                if type(value) is str:
+                    value = sys.intern(value)
+                code = len(self._values)
+                self._values.append(value)
+                self._codes[value] = code
+        return code
+
+    def value(self, code):
+        """Возвращает значение по коду."""
+        return self._values[code]
+
+
+# Таблицы общие для всех подписок процесса: у студентов одного курса одни и
+# те же названия работ, и каждое хранится в памяти один раз.
+NAMES = InternTable([''])
+STATUSES = InternTable(Status)
+
+
+def parse_timestamp(value):
+    """Переводит дату из API вида 2022-01-01T00:00:00Z в секунды Unix.
+    Возвращает None, если даты нет или её не удалось разобрать.
+    """
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def _to_bytes(values):
+    """Возвращает байты массива values от младшего к старшему."""
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def _from_bytes(typecode, data, offset, count):
+    """Читает из data массив count чисел, записанный _to_bytes().
+    Возвращает массив и смещение сразу после него.
+    """
+    values = array(typecode)
+    end = offset + count * values.itemsize
+    values.frombytes(data[offset:end])
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return values, end
+
+
+def _localize(codes, table, typecode):
+    """Заменяет коды общей таблицы table номерами в таблице одной записи.
+    Возвращает значения этой таблицы и массив номеров.
+    """
+    local = {}
+    numbers = array(typecode, [
+        local.setdefault(code, len(local)) for code in codes])
+    return [table.value(code) for code in local], numbers
+
+
+# Таблицы названий и статусов из контрольных точек с их кодами: у подписок
+# одного курса таблицы совпадают и разбираются один раз.
+_TABLES = {}
+_TABLES_LIMIT = 4096
+
+
+def _table_codes(table, names, statuses):
+    """Возвращает коды общих таблиц для таблицы из записи HomeworkIndex."""
+    lengths, offset = _from_bytes('i', table, 0, names + statuses)
+    values = []
+    for length in lengths:
+        if length < 0:
+            values.append(None)
+        else:
+            values.append(str(table[offset:offset + length], 'utf-8'))
+            offset += length
+    codes = ([NAMES.code(name) for name in values[:names]],
+             [STATUSES.code(status) for status in values[names:]])
+    if len(_TABLES) >= _TABLES_LIMIT:
+        _TABLES.clear()
+    _TABLES[names, table] = codes
+    return codes
+
+
+def _name_key(name):
+    """Возвращает ключ работы без id: отрицательный 63-битный хеш."""
+    digest = hashlib.blake2b(name.encode('utf-8'), digest_size=8).digest()
+    return -1 - (int.from_bytes(digest, 'little') >> 1)
+
+
+class Homework:
+    """Работа из ответа API: только поля, которыми пользуется бот.
+
+    key — идентификатор работы, а если API его не прислал, отрицательное
+    число из хеша названия: оно сохраняется в контрольных точках и потому
+    не зависит от кодов таблицы NAMES, которые у каждого процесса свои.
+    Название берётся из общей таблицы NAMES, статус — член
+    Status или, для неизвестного статуса, строка из общей таблицы.
+    """
+
+    __slots__ = ('key', 'name', 'status')
+
+    def __init__(self, key, name, status):
+        self.key = key
+        self.name = name
+        self.status = status
+
+    def __repr__(self):
+        return f'Homework({self.key!r}, {self.name!r}, {self.status!r})'
+
+    def __eq__(self, other):
+        if not isinstance(other, Homework):
+            return NotImplemented
+        return (self.key, self.name, self.status) == (
+            other.key, other.name, other.status)
+
+    @classmethod
+    def from_api(cls, data):
+        """Создаёт запись из словаря работы в ответе API."""
+        name = NAMES.value(NAMES.code(data.get('homework_name') or ''))
+        status = data.get('status')
+        if status is not None:
+            status = STATUSES.value(STATUSES.code(status))
+        try:
+            key = int(data.get('id'))
+        except (TypeError, ValueError):
+            key = _name_key(name)
+        return cls(key, name, status)
+
+
+class HomeworkIndex:
+    """Последние известные статусы работ одной подписки.
+
+    Вместо словаря с ключами-строками три плотных массива, упорядоченных
+    по ключу работы: ключи по 8 байт, коды названий по 4 байта и коды
+    статусов по 2 байта. Поиск — делением пополам, на десятки работ
+    подписки это не медленнее словаря, а памяти уходит в разы меньше.
+    """
+
+    __slots__ = ('_keys', '_names', '_statuses')
+
+    def __init__(self, records=()):
+        self._keys = array('q')
+        self._names = array('i')
+        self._statuses = array('H')
+        for record in records:
+            self.set(record)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __iter__(self):
+        for key, name, status in zip(self._keys, self._names,
+                                     self._statuses):
+            yield Homework(key, NAMES.value(name), STATUSES.value(status))
+
+    def _find(self, key):
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index, True
+        return index, False
+
+    def status_of(self, key):
+        """Возвращает запомненный статус работы или None."""
+        index, found = self._find(key)
+        if not found:
+            return None
+        return STATUSES.value(self._statuses[index])
+
+    def set(self, record):
+        """Запоминает название и статус работы."""
+        name = NAMES.code(record.name)
+        status = STATUSES.code(record.status)
+        index, found = self._find(record.key)
+        if found:
+            self._names[index] = name
+            self._statuses[index] = status
+        else:
+            self._keys.insert(index, record.key)
+            self._names.insert(index, name)
+            self._statuses.insert(index, status)
+
+    def has_status(self, statuses):
+        """Проверяет, есть ли работа с одним из статусов statuses."""
+        codes = {STATUSES.code(status) for status in statuses}
+        return any(code in codes for code in self._statuses)
+
+    def statuses(self):
+        """Возвращает словарь статусов по строковым ключам работ."""
+        return {
+            str(key) if key >= 0 else NAMES.value(name):
+                STATUSES.value(status)
+            for key, name, status in zip(self._keys, self._names,
+                                         self._statuses)
+        }
+
+    def dump(self):
+        """Возвращает содержимое строкой base64 для сохранения в JSON.
+        В строке байты массивов: число работ, названий и статусов, ключи,
+        номера названий и статусов и таблица самих названий и статусов в
+        UTF-8. Коды общих таблиц действуют только в одном процессе,
+        поэтому вместо них пишутся номера в таблице этой записи.
+        """
+        names, name_numbers = _localize(self._names, NAMES, 'i')
+        statuses, status_numbers = _localize(self._statuses, STATUSES, 'H')
+        strings = [
+            None if value is None else str(value).encode('utf-8')
+            for value in names + statuses
+        ]
+        lengths = array('i', [
+            -1 if value is None else len(value) for value in strings])
+        counts = array('i', [len(self._keys), len(names), len(statuses)])
+        data = b''.join(
+            [_to_bytes(part) for part in (counts, self._keys, name_numbers,
+                                          status_numbers, lengths)]
+            + [value for value in strings if value is not None])
+        return base64.b64encode(data).decode('ascii')
+
+    @classmethod
+    def load(cls, data):
+        """Восстанавливает индекс из результата dump().
+        Массивы собираются прямо из байтов, без записи Homework на каждую
+        работу. Список строк [ключ, название, статус] — прежний формат.
+        """
+        if not isinstance(data, str):
+            return cls(Homework(key, name, status)
+                       for key, name, status in data)
+        data = memoryview(base64.b64decode(data))
+        counts, offset = _from_bytes('i', data, 0, 3)
+        rows, names, statuses = counts
+        keys, offset = _from_bytes('q', data, offset, rows)
+        name_numbers, offset = _from_bytes('i', data, offset, rows)
+        status_numbers, offset = _from_bytes('H', data, offset, rows)
+        table = bytes(data[offset:])
+        codes = _TABLES.get((names, table))
+        if codes is None:
+            codes = _table_codes(table, names, statuses)
+        name_codes, status_codes = codes
+        index = cls()
+        index._keys = keys
+        index._names = array('i', [name_codes[n] for n in name_numbers])
+        index._statuses = array('H', [
+            status_codes[n] for n in status_numbers])
+        return index
+
+    @classmethod
+    def from_statuses(cls, statuses):
+        """Строит индекс из словаря статусов по строковым ключам работ."""
+        index = cls()
+        for key, status in statuses.items():
+            if key.lstrip('-').isdigit():
+                record = Homework.from_api({'id': key, 'status': status})
+            else:
+                record = Homework.from_api(
+                    {'homework_name': key, 'status': status})
+            index.set(record)
+        return index
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from bisect import bisect_right
+
+from clock import SYSTEM_CLOCK, VirtualClock
+from engine import PollingEngine, Tenant
+
+
+def token_key(token):
+    """Возвращает обезличенный ключ токена для записи в файл."""
+    return hashlib.blake2b(
+        str(token).encode('utf-8'), digest_size=8).hexdigest()
+
+
+def _header_token(headers):
+    authorization = (headers or {}).get('Authorization', '')
+    return authorization.split(' ', 1)[-1]
+
+
+class Recorder:
+    """HTTP-клиент, который записывает ответы API в файл.
+
+    Оборачивает клиент client и пишет каждый ответ строкой JSON в path:
+    момент ответа по часам clock, ключ токена вместо самого токена,
+    from_date, код ответа, Retry-After и тело. Сетевые ошибки тоже
+    записываются. Строка пишется одним вызовом write в файл, открытый на
+    дозапись, поэтому в один файл могут писать процессы-шарды.
+    """
+
+    def __init__(self, client, path, clock=None):
+        self.client = client
+        self.path = path
+        self.clock = clock or SYSTEM_CLOCK
+        self._fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                           0o600)
+
+    def _write(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + '\n'
+        os.write(self._fd, line.encode('utf-8'))
+
+    def get(self, url, **kwargs):
+        """Выполняет запрос через обёрнутый клиент и записывает ответ."""
+        entry = {
+            'token': token_key(_header_token(kwargs.get('headers'))),
+            'from_date': (kwargs.get('params') or {}).get('from_date'),
+        }
+        try:
+            response = self.client.get(url, **kwargs)
+        except Exception as error:
+            entry.update(at=self.clock.time(), error=str(error))
+            self._write(entry)
+            raise
+        entry.update(
+            at=self.clock.time(),
+            status=response.status_code,
+            retry_after=response.headers.get('Retry-After'),
+            body=response.text,
+        )
+        self._write(entry)
+        return response
+
+    def stats(self):
+        """Возвращает счётчики обёрнутого клиента."""
+        return self.client.stats()
+
+    def close(self):
+        """Закрывает файл записи и обёрнутый клиент."""
+        os.close(self._fd)
+        self.client.close()
+
+
+def load_recording(path):
+    """Читает записанные ответы, пропуская оборванную последнюю строку."""
+    entries = []
+    with open(path, encoding='utf-8') as file:
+        for line in file:
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue
+    return entries
+
+
+class ReplayResponse:
+    """Записанный ответ API с интерфейсом ответа requests."""
+
+    __slots__ = ('status_code', 'headers', 'text')
+
+    def __init__(self, status_code, headers, text):
+        self.status_code = status_code
+        self.headers = headers
+        self.text = text
+
+    def json(self):
+        """Разбирает тело ответа как JSON."""
+        return json.loads(self.text)
+
+
+class Player:
+    """HTTP-клиент, который отдаёт записанные ответы по часам clock.
+
+    На запрос с токеном отдаётся последний ответ, записанный для этого
+    токена не позже текущего момента, как если бы API отвечало так же,
+    как при записи. from_date запроса не учитывается. Токенами подписок
+    при воспроизведении служат ключи токенов из записи.
+    """
+
+    def __init__(self, entries, clock=None):
+        entries = sorted(entries, key=lambda entry: entry['at'])
+        self.start = entries[0]['at'] if entries else 0.0
+        self.end = entries[-1]['at'] if entries else 0.0
+        self.clock = clock or VirtualClock(self.start)
+        self._moments = {}
+        self._entries = {}
+        for entry in entries:
+            self._moments.setdefault(entry['token'], []).append(entry['at'])
+            self._entries.setdefault(entry['token'], []).append(entry)
+        self._lock = threading.Lock()
+        self._requests = 0
+
+    def tenants(self):
+        """Возвращает по подписке на каждый токен из записи."""
+        return [
+            Tenant(token, chat_id) for chat_id, token in enumerate(
+                self._entries, start=1)
+        ]
+
+    def first_seen(self):
+        """Возвращает момент первого появления каждого статуса работы.
+        Ключ словаря — пара из идентификатора работы и статуса.
+        """
+        seen = {}
+        for entries in self._entries.values():
+            for entry in entries:
+                try:
+                    homeworks = json.loads(entry['body'])['homeworks']
+                except (KeyError, TypeError, ValueError):
+                    continue
+                for homework in homeworks:
+                    key = (homework.get('id'), homework.get('status'))
+                    seen.setdefault(key, entry['at'])
+        return seen
+
+    def get(self, url, headers=None, params=None, **kwargs):
+        """Возвращает ответ, записанный для токена к текущему моменту."""
+        import requests
+
+        with self._lock:
+            self._requests += 1
+        token = _header_token(headers)
+        moments = self._moments.get(token)
+        if moments is None:
+            return ReplayResponse(401, {}, '{"code": "not_authenticated"}')
+        now = self.clock.time()
+        index = bisect_right(moments, now) - 1
+        if index < 0:
+            return ReplayResponse(
+                200, {}, json.dumps({'homeworks': [], 'current_date': now}))
+        entry = self._entries[token][index]
+        if 'error' in entry:
+            raise requests.ConnectionError(entry['error'])
+        headers = {}
+        if entry.get('retry_after') is not None:
+            headers['Retry-After'] = entry['retry_after']
+        return ReplayResponse(entry['status'], headers, entry['body'])
+
+    def stats(self):
+        """Возвращает счётчики в том же виде, что и HttpClient."""
+        return {'requests': self._requests, 'connections': 0,
+                'reused': self._requests}
+
+    def close(self):
+        """Ничего не делает: соединений нет."""
+
+
+def replay(entries, fetch, check, parse, policy=None, backoff=None,
+           retry_time=600, settle=3600):
+    """Прогоняет запись entries через движок опроса на виртуальных часах.
+
+    fetch, check и parse — функции бота, fetch(token, timestamp, client)
+    получает ответ API через HTTP-клиент client. Вместо настоящего
+    клиента передаётся Player, поэтому записанные ответы проходят ту же
+    обработку, что и живые. Опрос идёт от первого записанного
+    ответа до последнего и ещё settle секунд. Возвращает число опросов и
+    уведомлений, число статусов, которые бот не заметил, задержку
+    уведомления от момента появления статуса в записи и ускорение
+    относительно реального времени.
+    """
+    player = Player(entries)
+    clock = player.clock
+    detected = {}
+    sent = []
+
+    def parse_and_detect(homework):
+        message = parse(homework)
+        detected.setdefault(
+            (homework.get('id'), homework.get('status')), clock.time())
+        return message
+
+    engine = PollingEngine(
+        player.tenants(),
+        fetch=lambda token, timestamp: fetch(token, timestamp, player),
+        check=check,
+        parse=parse_and_detect,
+        send=lambda chat_id, message: sent.append(message),
+        retry_time=retry_time, policy=policy, backoff=backoff, clock=clock,
+    )
+    started = time.perf_counter()
+    polls = engine.simulate(player.end - player.start + settle)
+    wall_seconds = time.perf_counter() - started
+    seen = player.first_seen()
+    latencies = sorted(
+        detected[key] - moment for key, moment in seen.items()
+        if key in detected)
+    simulated = player.end - player.start + settle
+    return {
+        'polls': polls,
+        'notifications': len(sent),
+        'missed_statuses': len(seen) - len(latencies),
+        'latency_mean_s': (
+            sum(latencies) / len(latencies) if latencies else 0.0),
+        'latency_p95_s': (
+            latencies[int(len(latencies) * 0.95)] if latencies else 0.0),
+        'simulated_seconds': simulated,
+        'wall_seconds': wall_seconds,
+        'speedup': simulated / wall_seconds if wall_seconds else 0.0,
+    }
@@ -0,0 +1,149 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from http import HTTPStatus
+
+from exceptions import ApiException, ApiStatusException, CircuitOpenException
+
+
+def parse_retry_after(value):
+    """Переводит заголовок Retry-After в число секунд.
+    Заголовок может содержать число секунд или дату в формате HTTP.
+    """
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return max((moment - datetime.now(timezone.utc)).total_seconds(), 0.0)
+
+
+def is_outage(error):
+    """Проверяет, говорит ли ошибка о недоступности API целиком.
+    Сетевые ошибки, 5xx и 429 — да, остальные 4xx касаются только
+    конкретного токена.
+    """
+    if isinstance(error, ApiStatusException):
+        return (error.status_code == HTTPStatus.TOO_MANY_REQUESTS
+                or (error.status_code or 0) >= 500)
+    return isinstance(error, ApiException)
+
+
+class CircuitBreaker:
+    """Общий для всех подписок предохранитель запросов к API.
+
+    После failure_threshold сбоев подряд цепь размыкается, и в течение
+    reset_timeout секунд (или дольше, если API прислало Retry-After)
+    запросы не выполняются. Затем пропускается не больше probes пробных
+    запросов; если все они успешны, цепь замыкается, если хоть один
+    упал — снова размыкается.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=20, reset_timeout=30, probes=3):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = self.CLOSED
+        self._failures = 0
+        self._successes = 0
+        self._in_flight = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """Возвращает, сколько секунд цепь ещё будет разомкнута."""
+        return max(self._open_until - time.monotonic(), 0.0)
+
+    def allow(self):
+        """Решает, можно ли выполнить запрос к API прямо сейчас."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                if time.monotonic() < self._open_until:
+                    return False
+                self.state = self.HALF_OPEN
+                self._successes = 0
+                self._in_flight = 0
+            if self._in_flight + self._successes >= self.probes:
+                return False
+            self._in_flight += 1
+            return True
+
+    def record_success(self):
+        """Отмечает успешный запрос."""
+        with self._lock:
+            self._failures = 0
+            if self.state == self.HALF_OPEN:
+                self._in_flight = max(self._in_flight - 1, 0)
+                self._successes += 1
+                if self._successes >= self.probes:
+                    self.state = self.CLOSED
+
+    def record_failure(self, retry_after=None):
+        """Отмечает сбой API и при необходимости размыкает цепь."""
+        with self._lock:
+            self._failures += 1
+            if (self.state == self.HALF_OPEN
+                    or self._failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self._open_until = time.monotonic() + max(
+                    self.reset_timeout, retry_after or 0)
+                self._failures = 0
+
+    def wrap(self, fetch):
+        """Возвращает fetch, защищённый предохранителем."""
+        def guarded(token, timestamp):
+            if not self.allow():
+                raise CircuitOpenException(
+                    'API Практикума недоступно, запрос отложен',
+                    retry_after=self.remaining())
+            try:
+                response = fetch(token, timestamp)
+            except Exception as error:
+                if is_outage(error):
+                    self.record_failure(getattr(error, 'retry_after', None))
+                else:
+                    self.record_success()
+                raise
+            self.record_success()
+            return response
+        return guarded
+
+
+class Backoff:
+    """Экспоненциальная задержка со случайным разбросом после сбоев.
+
+    После n сбоев подряд следующий опрос назначается через случайное
+    время от base до min(cap, base * 2 ** n) секунд, но не раньше, чем
+    просит Retry-After.
+    """
+
+    def __init__(self, base=30, cap=3600):
+        self.base = base
+        self.cap = cap
+
+    def next_interval(self, tenant):
+        """Возвращает задержку до повтора или None, если сбоя не было."""
+        if not tenant.failures and tenant.retry_after is None:
+            return None
+        delay = 0.0
+        if tenant.failures:
+            ceiling = min(self.cap, self.base * 2 ** tenant.failures)
+            delay = random.uniform(self.base, max(ceiling, self.base))
+        retry_after = tenant.retry_after or 0
+        # Разброс поверх Retry-After, чтобы после паузы не прийти всем сразу.
+        return max(delay, retry_after + random.uniform(0, self.base))
@@ -0,0 +1,59 @@
+import zlib
+
+
+def token_phase(token):
+    """Возвращает постоянное для токена число из [0, 1).
+    Подписки на один токен получают одинаковую фазу и опрашиваются
+    одновременно, поэтому их запросы объединяются в один.
+    """
+    return zlib.crc32(str(token).encode('utf-8')) / 2 ** 32
+
+
+class FixedPolicy:
+    """Опрашивает каждую подписку с одним и тем же интервалом."""
+
+    def __init__(self, interval=600):
+        self.interval = interval
+
+    def next_interval(self, tenant, changed):
+        """Возвращает интервал до следующего опроса в секундах."""
+        return self.interval
+
+
+class AdaptivePolicy:
+    """Подбирает интервал опроса по состоянию и активности подписки.
+
+    Работа на проверке или только что изменившийся статус — признак того,
+    что скоро придёт вердикт, поэтому такие подписки опрашиваются с
+    минимальным интервалом floor. Пока ничего не меняется, интервал
+    растёт в growth раз за опрос до ceiling. Разброс jitter, постоянный
+    для токена, не даёт подпискам на разные токены опрашиваться синхронно,
+    а подписки на один токен оставляет вместе.
+    """
+
+    active_statuses = frozenset(['reviewing'])
+
+    def __init__(self, floor=60, ceiling=1800, base=600, growth=1.5,
+                 jitter=0.1):
+        self.floor = floor
+        self.ceiling = ceiling
+        self.base = base
+        self.growth = growth
+        self.jitter = jitter
+
+    def next_interval(self, tenant, changed):
+        """Возвращает интервал до следующего опроса и запоминает его."""
+        if changed or self.is_active(tenant):
+            interval = self.floor
+        elif tenant.interval is None:
+            interval = self.base
+        else:
+            interval = tenant.interval * self.growth
+        interval = min(max(interval, self.floor), self.ceiling)
+        tenant.interval = interval
+        phase = 2 * token_phase(tenant.token) - 1
+        return interval * (1 + self.jitter * phase)
+
+    def is_active(self, tenant):
+        """Проверяет, есть ли у подписки работы на проверке."""
+        return tenant.homeworks.has_status(self.active_statuses)
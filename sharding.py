@@ -0,0 +1,282 @@
+import bisect
+import hashlib
+import logging
+import os
+import signal
+import threading
+import time
+
+from metrics import REGISTRY, Rollup
+
+
+def _hash(value):
+    digest = hashlib.md5(str(value).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+class HashRing:
+    """Консистентное хеширование подписок по шардам.
+
+    Каждый шард занимает replicas точек на кольце. При добавлении или
+    удалении шарда переезжают только подписки, попавшие на его точки.
+    """
+
+    def __init__(self, nodes, replicas=64):
+        points = sorted(
+            (_hash(f'{node}:{index}'), node)
+            for node in nodes for index in range(replicas)
+        )
+        self.nodes = sorted(set(nodes))
+        self._hashes = [point for point, _ in points]
+        self._nodes = [node for _, node in points]
+
+    def node_for(self, key):
+        """Возвращает шард, которому принадлежит ключ."""
+        if not self._hashes:
+            return None
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._nodes[index]
+
+
+def shard_tenants(tenants, ring, node):
+    """Отбирает подписки шарда node.
+    Ключ — токен Практикума, чтобы подписки на один токен попадали в один
+    процесс и их запросы объединялись.
+    """
+    return [t for t in tenants if ring.node_for(t.token) == node]
+
+
+def _control_loop(shard, engine, dispatcher, tenants, conn, interval):
+    """Принимает команды супервизора и отправляет ему метрики шарда."""
+    engine.started.wait()
+    while True:
+        command = None
+        if conn.poll(interval):
+            command, payload = conn.recv()
+        if command == 'ring':
+            engine.update_tenants(
+                shard_tenants(tenants, HashRing(payload), shard))
+        elif command == 'rate':
+            if dispatcher is not None:
+                dispatcher.set_global_rate(payload)
+        elif command == 'stop':
+            engine.stop()
+            return
+        conn.send(('metrics', REGISTRY.snapshot()))
+
+
+def _worker_main(shard, nodes, tenants, serve, init, conn, interval):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    if hasattr(signal, 'SIGUSR2'):
+        # До запуска профилировщика шарда сигнал не должен его завершить.
+        signal.signal(signal.SIGUSR2, signal.SIG_IGN)
+    if init is not None:
+        init(shard)
+
+    def on_start(engine, dispatcher=None):
+        threading.Thread(
+            target=_control_loop, name='control', daemon=True,
+            args=(shard, engine, dispatcher, tenants, conn, interval),
+        ).start()
+
+    if nodes is None:
+        serve(tenants, on_start=on_start)
+    else:
+        serve(shard_tenants(tenants, HashRing(nodes), shard),
+              on_start=on_start)
+
+
+class Supervisor:
+    """Запускает процессы-шарды и делит между ними подписки.
+
+    Подписки распределяются консистентным хешированием. Если шард упал,
+    его подписки сразу переходят к остальным, а сам шард перезапускается
+    через restart_delay секунд и забирает их обратно. SIGTTIN добавляет
+    шард, SIGTTOU убирает один. Метрики шардов сводятся в rollup, который
+    можно отдать на странице /metrics.
+
+    С каждым шардом супервизор связан своим каналом Pipe: общая очередь
+    осталась бы заблокированной, если шард убит посреди записи в неё.
+    Шарды запускаются методом spawn: родитель к этому моменту уже держит
+    потоки логирования и метрик, и fork мог бы унаследовать их блокировки.
+
+    С sharded=False каждый шард получает все подписки, а делить их между
+    собой шарды должны сами, например через аренду слотов.
+
+    serve(tenants, on_start) обслуживает подписки шарда и вызывает
+    on_start(engine, dispatcher) с движком опроса и очередью отправки.
+    Если задан global_rate, при каждом изменении числа работающих шардов
+    супервизор делит его между ними поровну и сообщает шардам их долю.
+    """
+
+    def __init__(self, serve, tenants, workers=2, init=None,
+                 metrics_interval=5, restart_delay=5, sharded=True,
+                 global_rate=None):
+        self.serve = serve
+        self.tenants = list(tenants)
+        self.sharded = sharded
+        self.global_rate = global_rate
+        self.workers = workers
+        self.init = init
+        self.metrics_interval = metrics_interval
+        self.restart_delay = restart_delay
+        self.rollup = Rollup(REGISTRY)
+        import multiprocessing
+
+        self._context = multiprocessing.get_context('spawn')
+        self._processes = {}
+        self._conns = {}
+        self._restarts = {}
+        self._resize_to = None
+        self._running = False
+
+    @property
+    def nodes(self):
+        """Возвращает номера работающих шардов."""
+        return sorted(self._processes)
+
+    def _start(self, shard, nodes=None):
+        if not self.sharded:
+            nodes = None
+        elif nodes is None:
+            nodes = self.nodes + [shard]
+        conn, child_conn = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, name=f'shard-{shard}', daemon=True,
+            args=(shard, nodes, self.tenants, self.serve, self.init,
+                  child_conn, self.metrics_interval),
+        )
+        process.start()
+        child_conn.close()
+        self._processes[shard] = process
+        self._conns[shard] = conn
+        logging.info(f'Запущен шард {shard}, pid {process.pid}')
+
+    def _send(self, shard, command, payload=None):
+        try:
+            self._conns[shard].send((command, payload))
+        except OSError as error:
+            logging.warning(f'Шард {shard} не принял команду: {error}')
+
+    def _broadcast(self):
+        nodes = self.nodes
+        for shard in nodes:
+            if self.sharded:
+                self._send(shard, 'ring', nodes)
+            if self.global_rate is not None:
+                self._send(shard, 'rate', self.global_rate / len(nodes))
+
+    def resize(self, workers):
+        """Меняет число шардов и перераспределяет подписки."""
+        workers = max(workers, 1)
+        while len(self._processes) + len(self._restarts) < workers:
+            used = set(self._processes) | set(self._restarts)
+            self._start(min(set(range(workers)) - used))
+            self._broadcast()
+        while len(self._processes) + len(self._restarts) > workers:
+            if self._restarts:
+                self._restarts.pop(max(self._restarts))
+                continue
+            self._stop(max(self._processes))
+            self._broadcast()
+        self.workers = workers
+
+    def _forget(self, shard):
+        process = self._processes.pop(shard)
+        self._conns.pop(shard).close()
+        self.rollup.update(shard, {})
+        return process
+
+    def _stop(self, shard, timeout=30):
+        self._send(shard, 'stop')
+        process = self._forget(shard)
+        process.join(timeout)
+        if process.is_alive():
+            process.terminate()
+            process.join()
+
+    def _reap(self, ready):
+        for shard, process in list(self._processes.items()):
+            if process.sentinel not in ready:
+                continue
+            process.join()
+            logging.error(
+                f'Шард {shard} завершился с кодом {process.exitcode}')
+            self._forget(shard)
+            self._restarts[shard] = time.monotonic() + self.restart_delay
+        self._broadcast()
+
+    def _restart_due(self):
+        now = time.monotonic()
+        for shard, moment in list(self._restarts.items()):
+            if moment <= now:
+                del self._restarts[shard]
+                self._start(shard)
+                self._broadcast()
+
+    def _receive(self, ready):
+        for shard, conn in list(self._conns.items()):
+            if conn not in ready:
+                continue
+            try:
+                while conn.poll():
+                    kind, payload = conn.recv()
+                    if kind == 'metrics':
+                        self.rollup.update(shard, payload)
+            except (EOFError, OSError):
+                # Шард завершается, его обработает _reap по sentinel.
+                pass
+
+    def _install_signals(self):
+        def stop(signum, frame):
+            self._running = False
+
+        def grow(signum, frame):
+            self._resize_to = (self._resize_to or self.workers) + 1
+
+        def shrink(signum, frame):
+            self._resize_to = (self._resize_to or self.workers) - 1
+
+        def forward(signum, frame):
+            for process in list(self._processes.values()):
+                if process.pid is not None:
+                    os.kill(process.pid, signum)
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+        if hasattr(signal, 'SIGTTIN'):
+            signal.signal(signal.SIGTTIN, grow)
+            signal.signal(signal.SIGTTOU, shrink)
+        if hasattr(signal, 'SIGUSR2'):
+            signal.signal(signal.SIGUSR2, forward)
+
+    def run(self):
+        """Запускает шарды и следит за ними до SIGTERM или SIGINT."""
+        from multiprocessing.connection import wait
+
+        self._running = True
+        if threading.current_thread() is threading.main_thread():
+            self._install_signals()
+        nodes = list(range(self.workers))
+        for shard in nodes:
+            self._start(shard, nodes)
+        while self._running:
+            handles = [p.sentinel for p in self._processes.values()]
+            handles.extend(self._conns.values())
+            ready = wait(handles, timeout=1) if handles else []
+            self._receive(ready)
+            if any(p.sentinel in ready for p in self._processes.values()):
+                self._reap(ready)
+            if self._resize_to is not None:
+                workers, self._resize_to = self._resize_to, None
+                self.resize(workers)
+            self._restart_due()
+            if not handles:
+                time.sleep(1)
+        for shard in list(self._processes):
+            self._stop(shard)
+
+    def stop(self):
+        """Просит супервизор остановить шарды и завершиться."""
+        self._running = False
@@ -0,0 +1,179 @@
+import codecs
+import json
+from itertools import chain
+
+CHUNK_SIZE = 64 * 1024
+
+_LOADS = None
+_DECODER = json.JSONDecoder()
+
+
+def loads(data):
+    """Разбирает JSON из строки или байтов.
+    Если установлен orjson, разбирает им: он в разы быстрее json.
+    """
+    global _LOADS
+    if _LOADS is None:
+        try:
+            import orjson
+        except ImportError:
+            _LOADS = json.loads
+        else:
+            _LOADS = orjson.loads
+    return _LOADS(data)
+
+
+class HomeworkStream:
+    """Ответ API, работы из которого разбираются по мере чтения тела.
+
+    Тело читается кусками chunks, и в памяти держится только
+    недочитанный остаток и текущая работа, поэтому пик памяти не зависит
+    от числа работ в ответе. Работы из массива key отдаются итерацией по
+    одной, в порядке ответа; прочитать их можно только один раз, после
+    чего вызывается close. Остальные поля ответа, например current_date,
+    доступны через get(), когда работы прочитаны. Ошибки те же, что у
+    check_response и разбора JSON.
+    """
+
+    def __init__(self, chunks, key='homeworks', close=None):
+        self.key = key
+        self.fields = {}
+        self._chunks = iter(chunks)
+        self._close = close
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buffer = ''
+        self._position = 0
+        self._eof = False
+        self._consumed = False
+
+    def get(self, name, default=None):
+        """Возвращает поле ответа, прочитанное вместе с работами."""
+        return self.fields.get(name, default)
+
+    def __iter__(self):
+        if self._consumed:
+            raise RuntimeError('Ответ API уже прочитан')
+        self._consumed = True
+        try:
+            yield from self._parse()
+        finally:
+            if self._close is not None:
+                self._close()
+
+    def _fill(self, size=1):
+        """Дочитывает тело, пока остаток не вырастет до size символов."""
+        if self._position > CHUNK_SIZE:
+            self._buffer = self._buffer[self._position:]
+            self._position = 0
+        while not self._eof and len(self._buffer) - self._position < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self._eof = True
+                self._buffer += self._text.decode(b'', final=True)
+            else:
+                self._buffer += self._text.decode(chunk)
+
+    def _peek(self):
+        """Пропускает пробелы и возвращает следующий символ или ''."""
+        while True:
+            buffer = self._buffer
+            position = self._position
+            while position < len(buffer) and buffer[position] in ' \t\r\n':
+                position += 1
+            self._position = position
+            if position < len(buffer) or self._eof:
+                return buffer[position:position + 1]
+            self._fill()
+
+    def _expect(self, *characters):
+        character = self._peek()
+        if character not in characters or not character:
+            raise ValueError('Ошибка парсинга ответа из формата json')
+        self._position += 1
+        return character
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self._buffer, self._position)
+            except ValueError:
+                end = None
+            # Значение, упёршееся в конец прочитанного, может быть обрезано:
+            # число 12 могло оказаться началом 1234.
+            if end is not None and (end < len(self._buffer) or self._eof):
+                self._position = end
+                return value
+            if self._eof:
+                raise ValueError('Ошибка парсинга ответа из формата json')
+            # Остаток удваивается, чтобы длинное значение не разбиралось
+            # заново после каждого куска.
+            self._fill(2 * (len(self._buffer) - self._position) + 1)
+
+    def _parse(self):
+        if self._peek() != '{':
+            raise TypeError('Ответ API отличен от словаря')
+        self._position += 1
+        found = False
+        if self._peek() == '}':
+            self._position += 1
+        else:
+            while True:
+                name = self._value()
+                self._expect(':')
+                if name == self.key:
+                    found = True
+                    yield from self._items()
+                else:
+                    self.fields[name] = self._value()
+                if self._expect(',', '}') == '}':
+                    break
+        if not found:
+            raise KeyError(f'Ошибка словаря по ключу {self.key}')
+
+    def _items(self):
+        if self._peek() != '[':
+            self._value()
+            raise TypeError('Домашние работы в ответе API пришли не списком')
+        self._position += 1
+        if self._peek() == ']':
+            self._position += 1
+            return
+        while True:
+            yield self._value()
+            if self._expect(',', ']') == ']':
+                return
+
+
+def decode_response(response, threshold=1 << 20):
+    """Разбирает тело ответа requests, запрошенного с stream=True.
+    Несжатое тело, чей Content-Length не больше threshold байт,
+    разбирается целиком. Остальное читается распакованным, пока не
+    наберётся threshold байт: дочитанное до конца тело тоже разбирается
+    целиком, а более длинное отдаётся как HomeworkStream вместе с уже
+    прочитанным началом. Content-Length сжатого тела ничего не говорит о
+    его размере после распаковки, а короткий ответ словарём можно
+    разделить между подписками и закэшировать. Ответ без iter_content
+    разбирается его методом json().
+    """
+    iter_content = getattr(response, 'iter_content', None)
+    if iter_content is None:
+        return response.json()
+    headers = response.headers
+    length = headers.get('Content-Length')
+    encoding = headers.get('Content-Encoding', 'identity').strip().lower()
+    known = length is not None and length.isdigit()
+    if encoding == 'identity' and known:
+        if int(length) <= threshold:
+            return loads(response.content)
+        return HomeworkStream(iter_content(CHUNK_SIZE), close=response.close)
+    chunks = iter_content(CHUNK_SIZE)
+    head = []
+    size = 0
+    for chunk in chunks:
+        head.append(chunk)
+        size += len(chunk)
+        if size > threshold:
+            return HomeworkStream(chain(head, chunks), close=response.close)
+    response.close()
+    return loads(b''.join(head))
@@ -1,9 +1,24 @@
 import sys
 from os.path import abspath, dirname
 
+import pytest
+import requests
+
 root_dir = dirname(dirname(abspath(__file__)))
 sys.path.append(root_dir)
 
 pytest_plugins = [
     'tests.fixtures.fixture_data'
 ]
+
+
+@pytest.fixture(autouse=True)
+def http_client_via_requests_get(monkeypatch):
+    """Autotests patch requests.get, while the bot talks to the API through
+    the pooled HTTP client. Route the pool through requests.get."""
+    import homework
+
+    monkeypatch.setattr(
+        homework.get_http_client(), 'get',
+        lambda url, **kwargs: requests.get(url, **kwargs)
+    )
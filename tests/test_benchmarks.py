@@ -0,0 +1,25 @@
+import requests
+
+from benchmarks.fake_servers import FakePracticum
+from benchmarks.throughput import run_benchmark
+
+
+def test_fake_practicum_serves_homeworks():
+    practicum = FakePracticum(homeworks=3, change_rate=1.0)
+    practicum.start()
+    try:
+        response = requests.get(
+            practicum.endpoint, headers={'Authorization': 'OAuth token'},
+            params={'from_date': 0})
+    finally:
+        practicum.stop()
+    assert response.status_code == 200
+    assert len(response.json()['homeworks']) == 3
+
+
+def test_benchmark_drives_real_code_paths():
+    result = run_benchmark(tenants=20, duration=1.0, retry_time=0.2,
+                           change_rate=1.0)
+    assert result['polls_per_second'] > 0
+    assert result['notifications_per_second'] > 0
+    assert result['fetch_p99'] >= result['fetch_p50'] > 0
@@ -0,0 +1,42 @@
+import time
+
+from checkpoints import CheckpointStore
+from engine import PollingEngine, Tenant
+from records import Homework, Status
+
+
+def test_state_survives_restart(tmp_path):
+    path = str(tmp_path / 'state.db')
+    tenant = Tenant('token', 1)
+    tenant.timestamp = 1000198000
+    tenant.statuses = {'123': 'reviewing'}
+    store = CheckpointStore(path)
+    store.start()
+    store.save(tenant.tenant_id, tenant.checkpoint())
+    store.close()
+
+    restored = Tenant('token', 1)
+    restored.restore(CheckpointStore(path).load()[restored.tenant_id])
+    assert restored.checkpoint() == tenant.checkpoint()
+
+
+def test_restore_100k_tenants_under_a_second(tmp_path):
+    tenant = Tenant('token', 1)
+    tenant.timestamp = 1000198000
+    for key in range(20):
+        tenant.homeworks.set(Homework(key, f'hw{key}.zip', Status.APPROVED))
+    state = tenant.checkpoint()
+    store = CheckpointStore(str(tmp_path / 'state.db'))
+    for i in range(100000):
+        store.save(str(i), state)
+    store.flush()
+    tenants = [Tenant(f'token{i}', i, str(i)) for i in range(100000)]
+    engine = PollingEngine(tenants, None, None, None, None, store=store)
+    started = time.perf_counter()
+    engine.restore(engine.tenants)
+    elapsed = time.perf_counter() - started
+    store.close()
+    assert elapsed < 1.0
+    assert tenants[-1].checkpoint() == state
+    assert tenants[-1].homeworks.status_of(7) is Status.APPROVED
+    assert list(tenants[-1].homeworks) == list(tenant.homeworks)
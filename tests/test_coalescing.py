@@ -0,0 +1,116 @@
+import threading
+import time
+
+import pytest
+
+from coalescing import CoalescingFetcher
+
+
+class SlowFetch:
+
+    def __init__(self, delay=0.1, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, token, timestamp):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return {'homeworks': [], 'current_date': timestamp}
+
+
+def fetch_concurrently(fetcher, count):
+    results = []
+
+    def worker():
+        try:
+            results.append(fetcher('token', 100))
+        except Exception as error:
+            results.append(error)
+
+    threads = [threading.Thread(target=worker) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_concurrent_identical_fetches_share_one_call():
+    fetch = SlowFetch()
+    results = fetch_concurrently(CoalescingFetcher(fetch), 10)
+    assert fetch.calls == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_errors_are_shared_but_not_cached():
+    fetch = SlowFetch(error=ValueError('boom'))
+    fetcher = CoalescingFetcher(fetch)
+    results = fetch_concurrently(fetcher, 5)
+    assert fetch.calls == 1
+    assert all(isinstance(result, ValueError) for result in results)
+    with pytest.raises(ValueError):
+        fetcher('token', 100)
+    assert fetch.calls == 2
+
+
+def test_cache_ttl_and_lru_eviction():
+    fetch = SlowFetch(delay=0)
+    fetcher = CoalescingFetcher(fetch, ttl=0.05, max_size=2)
+    fetcher('a', 1)
+    fetcher('a', 1)
+    assert fetch.calls == 1
+    fetcher('b', 1)
+    fetcher('c', 1)
+    fetcher('a', 1)
+    assert fetch.calls == 4
+    time.sleep(0.06)
+    fetcher('a', 1)
+    assert fetch.calls == 5
+
+
+def test_compressed_responses_are_shared(monkeypatch):
+    import gzip
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    import homework
+    from http_client import HttpClient
+
+    hits = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            hits.append(self.path)
+            time.sleep(0.2)
+            body = gzip.compress(b'{"homeworks": [], "current_date": 100}')
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(homework, 'ENDPOINT',
+                        f'http://127.0.0.1:{server.server_port}/')
+    client = HttpClient(pool_size=6)
+    try:
+        fetcher = CoalescingFetcher(
+            lambda token, timestamp: homework.get_api_answer_for(
+                token, timestamp, client))
+        results = fetch_concurrently(fetcher, 6)
+        assert fetcher('token', 100) is results[0]
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    assert len(hits) == 1
+    assert all(result == {'homeworks': [], 'current_date': 100}
+               for result in results)
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from checkpoints import CheckpointStore
+from commands import HELP, CommandHandler, CommandPoller, TenantDirectory
+from engine import PollingEngine, Tenant
+from history import TransitionLog
+from homework import HOMEWORK_STATUSES
+from records import Homework
+
+
+def make_engine(tenants):
+    engine = PollingEngine(tenants, None, None, None, None)
+    engine._spread(tenants, 0)
+    return engine
+
+
+def test_status_comes_from_memory_and_store(tmp_path):
+    live = Tenant('token', 1, 'live')
+    live.homeworks.set(Homework.from_api(
+        {'id': 1, 'homework_name': 'a.zip', 'status': 'reviewing'}))
+    stored = Tenant('other', 1, 'stored')
+    stored.homeworks.set(Homework.from_api(
+        {'id': 2, 'homework_name': 'b.zip', 'status': 'approved'}))
+    store = CheckpointStore(str(tmp_path / 'db.sqlite3'))
+    store.save('stored', stored.checkpoint())
+    store.flush()
+    directory = TenantDirectory(
+        [Tenant('token', 1, 'live'), Tenant('other', 1, 'stored')],
+        make_engine([live]), store)
+    handler = CommandHandler(directory, verdicts=HOMEWORK_STATUSES)
+    assert handler.handle(1, '/status@homework_bot').splitlines() == [
+        f'a.zip: {HOMEWORK_STATUSES["reviewing"]}',
+        f'b.zip: {HOMEWORK_STATUSES["approved"]}',
+    ]
+    assert handler.handle(2, '/status') == (
+        'Этот чат не подписан на статусы работ.')
+    assert handler.handle(1, '/start') == HELP
+    assert handler.handle(1, 'привет') is None
+    store.close()
+
+
+def test_history_lists_latest_transitions(tmp_path):
+    log = TransitionLog(str(tmp_path))
+    for moment, (old, new) in enumerate(
+            [(None, 'reviewing'), ('reviewing', 'rejected'),
+             ('rejected', 'approved')]):
+        log.append('5', 1, 'hw.zip', old, new, detected_at=moment * 60)
+    handler = CommandHandler(TenantDirectory([Tenant('token', 5)]), log)
+    assert handler.handle(5, '/history 2').splitlines() == [
+        '1970-01-01 00:01 UTC hw.zip: reviewing → rejected',
+        '1970-01-01 00:02 UTC hw.zip: rejected → approved',
+    ]
+    assert handler.handle(5, '/history').startswith(
+        '1970-01-01 00:00 UTC hw.zip: — → reviewing')
+    log.close()
+
+
+def test_poller_answers_and_advances_offset():
+    offsets = []
+
+    def get_updates(offset, timeout, allowed_updates):
+        offsets.append(offset)
+        return [
+            SimpleNamespace(update_id=10, message=SimpleNamespace(
+                chat_id=1, text='/help')),
+            SimpleNamespace(update_id=11, message=None),
+        ]
+
+    sent = []
+    poller = CommandPoller(
+        SimpleNamespace(get_updates=get_updates),
+        CommandHandler(TenantDirectory([])),
+        lambda chat_id, message: sent.append((chat_id, message)))
+    assert poller.poll_once() == 2
+    poller.poll_once()
+    assert offsets == [None, 12]
+    assert sent == [(1, HELP), (1, HELP)]
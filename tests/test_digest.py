@@ -0,0 +1,52 @@
+import time
+
+from digest import Digest
+from homework import HOMEWORK_STATUSES, is_urgent, parse_status
+
+
+def test_notifications_are_combined_per_chat():
+    sent = []
+    digest = Digest(lambda chat_id, message: sent.append((chat_id, message)),
+                    window=0.1, max_messages=3, max_length=30)
+    digest.start()
+    for message in ('a', 'b', 'c', 'd'):
+        digest.submit(1, message)
+    digest.submit(2, 'x' * 20)
+    digest.submit(2, 'y' * 20)
+    assert sent == [(1, 'a\n\nb\n\nc'), (2, 'x' * 20)]
+    time.sleep(0.3)
+    assert sorted(sent[2:]) == [(1, 'd'), (2, 'y' * 20)]
+    digest.close()
+
+
+def test_urgent_notifications_wait_less():
+    sent = []
+    digest = Digest(lambda chat_id, message: sent.append(
+        (time.monotonic(), message)), window=5, urgent_delay=0.05,
+        urgent=is_urgent)
+    digest.start()
+    started = time.monotonic()
+    reviewing = parse_status({'homework_name': 'a', 'status': 'reviewing'})
+    digest.submit(1, reviewing)
+    time.sleep(0.2)
+    assert sent == []
+    digest.submit(1, parse_status({'homework_name': 'a',
+                                   'status': 'approved'}))
+    time.sleep(0.2)
+    (moment, message), = sent
+    assert moment - started < 1
+    assert message.endswith(HOMEWORK_STATUSES['approved'])
+    digest.close()
+
+
+def test_zero_window_sends_immediately_and_close_flushes():
+    sent = []
+    digest = Digest(lambda chat_id, message: sent.append(message), window=0)
+    digest.start()
+    digest.submit(1, 'a')
+    assert sent == ['a']
+    digest = Digest(lambda chat_id, message: sent.append(message), window=60)
+    digest.start()
+    digest.submit(1, 'b')
+    digest.close()
+    assert sent == ['a', 'b']
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from dispatcher import Dispatcher, TokenBucket
+
+
+class RetryAfter(Exception):
+
+    def __init__(self, retry_after):
+        super().__init__('Flood control exceeded')
+        self.retry_after = retry_after
+
+
+def test_token_bucket():
+    bucket = TokenBucket(rate=2, capacity=2, now=0)
+    bucket.consume(0)
+    bucket.consume(0)
+    assert bucket.wait_time(0) == 0.5
+    assert bucket.wait_time(0.5) == 0
+    assert not bucket.is_full(0.5)
+    assert bucket.is_full(10)
+
+
+def test_per_chat_and_global_limits():
+    sent = []
+    lock = threading.Lock()
+
+    def send(chat_id, message):
+        with lock:
+            sent.append((time.monotonic(), chat_id, message))
+
+    dispatcher = Dispatcher(send, global_rate=40, chat_rate=20)
+    dispatcher.start()
+    for i in range(10):
+        dispatcher.submit('a', i)
+        dispatcher.submit('b', i)
+    dispatcher.close()
+    for chat_id in 'ab':
+        times = [t for t, chat, _ in sent if chat == chat_id]
+        assert [m for _, chat, m in sent if chat == chat_id] == list(range(10))
+        assert times[-1] - times[0] >= 9 / 20 * 0.9
+    assert len(sent) == 20
+
+
+def test_retry_after_is_honored():
+    attempts = []
+
+    def send(chat_id, message):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RuntimeError('send failed') from RetryAfter(0.2)
+
+    dispatcher = Dispatcher(send)
+    dispatcher.start()
+    dispatcher.submit(1, 'hello')
+    dispatcher.close()
+    assert len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.2
+
+
+def test_submit_waits_when_queue_is_full():
+    release = threading.Event()
+    dispatcher = Dispatcher(lambda chat_id, message: release.wait(),
+                            global_rate=1000, chat_rate=1000, workers=1,
+                            max_pending=2)
+    dispatcher.start()
+    submitted = []
+
+    def produce():
+        for number in range(5):
+            dispatcher.submit(1, str(number))
+            submitted.append(number)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    time.sleep(0.2)
+    assert len(submitted) == 2
+    release.set()
+    producer.join(timeout=2)
+    assert submitted == list(range(5))
+    dispatcher.close()
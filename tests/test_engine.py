@@ -0,0 +1,156 @@
+import asyncio
+import json
+
+import pytest
+
+from engine import PollingEngine, Tenant, load_tenants
+
+
+def run_engine(engine, seconds):
+    async def runner():
+        loop = asyncio.get_running_loop()
+        loop.call_later(seconds, engine.stop)
+        await engine.run()
+
+    asyncio.run(runner())
+
+
+class TestPollingEngine:
+
+    def test_load_tenants_from_file(self, tmp_path):
+        path = tmp_path / 'tenants.json'
+        path.write_text(json.dumps([
+            {'token': 'a', 'chat_id': 1},
+            {'token': 'b', 'chat_id': 2, 'id': 'mentor'},
+        ]))
+        tenants = load_tenants(str(path))
+        assert [t.tenant_id for t in tenants] == ['1', 'mentor']
+        assert load_tenants(None, 'token', 3)[0].chat_id == 3
+        assert load_tenants(None, None, None) == []
+        # Второй токен того же чата без своего id вытеснил бы первый.
+        path.write_text(json.dumps([
+            {'token': 'a', 'chat_id': 1},
+            {'token': 'b', 'chat_id': 1},
+        ]))
+        with pytest.raises(ValueError):
+            load_tenants(str(path))
+
+    def test_polls_every_tenant_and_sends_once(self):
+        sent = []
+        homework = {'homework_name': 'hw', 'status': 'approved'}
+        engine = PollingEngine(
+            [Tenant(f'token{i}', i) for i in range(50)],
+            fetch=lambda token, ts: {'homeworks': [homework],
+                                     'current_date': 1},
+            check=lambda response: response['homeworks'],
+            parse=lambda hw: hw['status'],
+            send=lambda chat_id, message: sent.append((chat_id, message)),
+            retry_time=0.05,
+            concurrency=4,
+        )
+        run_engine(engine, 0.3)
+        assert sorted(sent) == [(i, 'approved') for i in range(50)]
+
+    def test_error_is_reported_once(self):
+        sent = []
+
+        def fetch(token, ts):
+            raise ValueError('boom')
+
+        engine = PollingEngine(
+            [Tenant('token', 1)], fetch, None, None,
+            send=lambda chat_id, message: sent.append(message),
+            retry_time=0.02,
+        )
+        run_engine(engine, 0.2)
+        assert sent == ['boom']
+
+    def test_every_changed_homework_is_notified(self):
+        sent = []
+        responses = iter([
+            [{'id': 1, 'homework_name': 'a', 'status': 'reviewing'},
+             {'id': 2, 'homework_name': 'b', 'status': 'reviewing'}],
+            [{'id': 2, 'homework_name': 'b', 'status': 'approved'},
+             {'id': 1, 'homework_name': 'a', 'status': 'reviewing'}],
+        ])
+        engine = PollingEngine(
+            [], fetch=lambda token, ts: {'homeworks': next(responses)},
+            check=lambda response: response['homeworks'],
+            parse=lambda hw: f"{hw['homework_name']}: {hw['status']}",
+            send=lambda chat_id, message: sent.append(message),
+        )
+        tenant = Tenant('token', 1)
+        engine.poll_once(tenant)
+        engine.poll_once(tenant)
+        assert sent == ['b: reviewing', 'a: reviewing', 'b: approved']
+        assert tenant.statuses == {'1': 'reviewing', '2': 'approved'}
+
+    def test_homework_without_status_is_reported(self):
+        from homework import parse_status
+
+        sent = []
+        engine = PollingEngine(
+            [], fetch=lambda token, ts: {'homeworks': [
+                {'id': 1, 'homework_name': 'a'}]},
+            check=lambda response: response['homeworks'],
+            parse=parse_status,
+            send=lambda chat_id, message: sent.append(message),
+        )
+        tenant = Tenant('token', 1)
+        assert engine.poll_once(tenant) == 0
+        assert sent == ['\'Отсутсвует ключ "status" в ответе API\'']
+        with pytest.raises(KeyError):
+            engine.notify(tenant, {'id': 2, 'homework_name': 'b'})
+
+    def test_from_date_follows_watermark_with_overlap(self):
+        requested = []
+        responses = iter([
+            {'homeworks': [{'id': 1, 'homework_name': 'a',
+                            'status': 'reviewing',
+                            'date_updated': '2022-01-01T00:10:00Z'}],
+             'current_date': 1640996000},
+            # Без current_date отметка не сбрасывается на часы процесса.
+            {'homeworks': []},
+            {'homeworks': [{'id': 1, 'homework_name': 'a',
+                            'status': 'reviewing',
+                            'date_updated': '2022-01-01T00:10:00Z'}]},
+        ])
+
+        def fetch(token, ts):
+            requested.append(ts)
+            return next(responses)
+
+        sent = []
+        engine = PollingEngine(
+            [], fetch=fetch, check=lambda response: response['homeworks'],
+            parse=lambda hw: hw['status'],
+            send=lambda chat_id, message: sent.append(message), overlap=30,
+        )
+        tenant = Tenant('token', 1, timestamp=1640995000)
+        for _ in range(3):
+            engine.poll_once(tenant)
+        assert requested == [1640995000, 1640995970, 1640995970]
+        assert tenant.watermark == 1640996000
+        # Повтор работы из окна перекрытия не шлёт уведомление снова.
+        assert sent == ['reviewing']
+
+    def test_failed_homework_holds_watermark(self):
+        homeworks = [
+            {'id': 2, 'homework_name': 'b', 'status': 'approved',
+             'date_updated': '2022-01-01T01:00:00Z'},
+            {'id': 1, 'homework_name': 'a', 'status': 'unknown',
+             'date_updated': '2022-01-01T00:00:00Z'},
+        ]
+        engine = PollingEngine(
+            [], fetch=lambda token, ts: {'homeworks': homeworks,
+                                         'current_date': 1641000000},
+            check=lambda response: response['homeworks'],
+            parse=lambda hw: {'approved': 'ok'}[hw['status']],
+            send=lambda chat_id, message: None, overlap=0,
+        )
+        tenant = Tenant('token', 1)
+        engine.poll_once(tenant)
+        assert tenant.timestamp == 1640995200
+        restored = Tenant('token', 1)
+        restored.restore(tenant.checkpoint())
+        assert restored.watermark == 1640995200
@@ -0,0 +1,57 @@
+from engine import PollingEngine, Tenant
+from history import TransitionLog
+
+
+def test_history_returns_tenant_transitions_in_range(tmp_path):
+    log = TransitionLog(str(tmp_path))
+    for moment in range(10):
+        log.append('a', moment, 'hw.zip', 'reviewing', 'approved',
+                   detected_at=moment)
+        log.append('b', moment, 'other.zip', None, 'reviewing',
+                   detected_at=moment)
+    found = log.history('a', since=3, until=7)
+    assert [item.key for item in found] == [3, 4, 5, 6]
+    assert {item.tenant_id for item in found} == {'a'}
+    assert [item.key for item in log.history('b', limit=2)] == [8, 9]
+    assert log.history('b')[0].old is None
+    assert log.history('missing') == []
+    log.close()
+
+
+def test_index_grows_and_survives_reopening(tmp_path):
+    log = TransitionLog(str(tmp_path), capacity=4)
+    for tenant in range(100):
+        log.append(tenant, tenant, 'hw.zip', None, 'reviewing',
+                   updated_at=1.5)
+    log.close()
+    reopened = TransitionLog(str(tmp_path))
+    for tenant in (0, 57, 99):
+        (item,) = reopened.history(tenant)
+        assert (item.key, item.updated_at) == (tenant, 1.5)
+    reopened.close()
+
+
+def test_engine_records_status_changes(tmp_path):
+    log = TransitionLog(str(tmp_path))
+    responses = iter([
+        [{'id': 1, 'homework_name': 'a', 'status': 'reviewing',
+          'date_updated': '2022-01-01T00:00:00Z'}],
+        [{'id': 1, 'homework_name': 'a', 'status': 'reviewing'}],
+        [{'id': 1, 'homework_name': 'a', 'status': 'approved'}],
+    ])
+    engine = PollingEngine(
+        [], fetch=lambda token, ts: {'homeworks': next(responses)},
+        check=lambda response: response['homeworks'],
+        parse=lambda hw: hw['status'],
+        send=lambda chat_id, message: None,
+        history=log,
+    )
+    tenant = Tenant('token', 1)
+    for _ in range(3):
+        engine.poll_once(tenant)
+    first, second = log.history(tenant.tenant_id)
+    assert (first.old, first.new, first.updated_at) == (
+        None, 'reviewing', 1640995200.0)
+    assert (second.old, second.new, second.name) == (
+        'reviewing', 'approved', 'a')
+    log.close()
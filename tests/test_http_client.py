@@ -0,0 +1,75 @@
+import gzip
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+import homework
+from exceptions import ApiStatusException
+from http_client import HttpClient
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        if self.path.startswith('/slow'):
+            time.sleep(0.5)
+        body = b'{"homeworks": []}'
+        headers = {'Content-Type': 'application/json'}
+        status = 200
+        if self.path.startswith('/unavailable'):
+            body = b'{"error": "unavailable"}'
+            status = 503
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            headers['Content-Encoding'] = 'gzip'
+        try:
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def test_connections_are_reused_and_gzip_decoded(server_url):
+    client = HttpClient(pool_size=2)
+    for _ in range(5):
+        assert client.get(server_url + '/').json() == {'homeworks': []}
+    assert client.stats() == {'requests': 5, 'connections': 1, 'reused': 4}
+    client.close()
+
+
+def test_read_timeout(server_url):
+    client = HttpClient(read_timeout=0.1)
+    with pytest.raises(requests.Timeout):
+        client.get(server_url + '/slow')
+    client.close()
+
+
+def test_error_responses_return_connections_to_pool(server_url, monkeypatch):
+    monkeypatch.setattr(homework, 'ENDPOINT', server_url + '/unavailable')
+    client = HttpClient(pool_size=2, pool_timeout=1)
+    for _ in range(5):
+        with pytest.raises(ApiStatusException):
+            homework.get_api_answer_for('token', 0, client)
+    assert client.stats()['connections'] == 1
+    client.close()
@@ -0,0 +1,154 @@
+import asyncio
+import threading
+import time
+
+from benchmarks.fake_servers import FakeRedis
+from checkpoints import BackendCheckpointStore
+from engine import PollingEngine, Tenant
+from leases import LeaseManager, MemoryBackend, backend_from_url
+
+
+def owners(managers, tenants):
+    result = {}
+    for manager in managers:
+        for tenant in manager.owned_tenants():
+            assert tenant.tenant_id not in result
+            result[tenant.tenant_id] = manager.node_id
+    return result
+
+
+def test_redis_backend_compare_and_set():
+    redis = FakeRedis()
+    backend = backend_from_url(redis.start())
+    try:
+        assert backend.set('lease', 'a', ttl=5, only_new=True)
+        assert not backend.set('lease', 'b', ttl=5, only_new=True)
+        assert not backend.compare_and_set('lease', 'b', 'b', ttl=5)
+        assert backend.compare_and_set('lease', 'a', 'a', ttl=5)
+        assert backend.compare_and_delete('lease', 'a')
+        assert backend.get('lease') is None
+        backend.mset({'x:1': '{"a": 1}', 'x:2': '-1'})
+        backend.mset({f'y:{i}': str(i) for i in range(25)})
+        assert sorted(backend.scan('x:*', 4)) == ['x:1', 'x:2']
+        backend.zadd('nodes', 10, 'a')
+        backend.zadd('nodes', 20, 'b')
+        backend.zremrangebyscore('nodes', float('-inf'), 15)
+        assert backend.zcard('nodes') == 1
+        backend.zrem('nodes', 'b')
+        assert backend.zcard('nodes') == 0
+        assert backend.mget(['x:1', 'x:2', 'x:3']) == ['{"a": 1}', '-1', None]
+    finally:
+        redis.stop()
+
+
+class Rates:
+
+    def __init__(self):
+        self.rates = []
+
+    def set_global_rate(self, rate):
+        self.rates.append(rate)
+
+
+def test_nodes_split_slots_and_take_over_after_ttl():
+    backend = MemoryBackend()
+    tenants = [Tenant(f'token{i}', i) for i in range(200)]
+    first = LeaseManager(backend, tenants, 'first', slots=32, ttl=0.3,
+                         global_rate=30)
+    second = LeaseManager(backend, tenants, 'second', slots=32, ttl=0.3,
+                          global_rate=30)
+    first._dispatcher = Rates()
+    second._dispatcher = Rates()
+    first.cycle()
+    assert len(first.owned) == 32
+    second.cycle()
+    first.cycle()
+    second.cycle()
+    assert len(first.owned) == len(second.owned) == 16
+    assert len(owners([first, second], tenants)) == len(tenants)
+    assert first._dispatcher.rates == [30, 15]
+    assert second._dispatcher.rates == [15]
+
+    # Первый узел завис и не продлевает аренду.
+    time.sleep(0.35)
+    first._expire(time.monotonic())
+    assert not first.owned
+    second.cycle()
+    assert len(second.owned) == 32
+    assert second._dispatcher.rates == [15, 30]
+
+
+def test_stop_releases_slots_and_flushes_state():
+    redis = FakeRedis()
+    backend = backend_from_url(redis.start())
+    try:
+        tenants = [Tenant(f'token{i}', i) for i in range(50)]
+        store = BackendCheckpointStore(backend)
+        first = LeaseManager(backend, tenants, 'first', slots=8, ttl=30,
+                             store=store)
+        first.cycle()
+        store.save(tenants[0].tenant_id, {'timestamp': 42})
+        first.stop()
+
+        second = LeaseManager(backend, tenants, 'second', slots=8, ttl=30)
+        second.cycle()
+        assert len(second.owned) == 8
+        state = BackendCheckpointStore(backend).load([tenants[0].tenant_id])
+        assert state == {tenants[0].tenant_id: {'timestamp': 42}}
+    finally:
+        redis.stop()
+
+
+def test_handover_waits_for_running_poll_and_its_state():
+    backend = MemoryBackend()
+    store = BackendCheckpointStore(backend)
+    first = LeaseManager(backend, [], 'first', slots=2, ttl=30, store=store)
+    tenant = next(t for t in (Tenant(f'token{i}', i) for i in range(10))
+                  if first.slot_of(t) == 1)
+    first.tenants = [tenant]
+    fetching = threading.Event()
+    answer = threading.Event()
+    sent = []
+
+    def fetch(token, timestamp):
+        fetching.set()
+        answer.wait(5)
+        return {'homeworks': [{'id': 7, 'homework_name': 'hw',
+                               'status': 'approved'}],
+                'current_date': 1641000000}
+
+    engine = PollingEngine(
+        [tenant], fetch=fetch, check=lambda response: response['homeworks'],
+        parse=lambda hw: hw['status'],
+        send=lambda chat_id, message: sent.append(message),
+        retry_time=0, store=store, overlap=0,
+    )
+    runner = threading.Thread(target=asyncio.run, args=(engine.run(),))
+    runner.start()
+    try:
+        assert fetching.wait(5)
+        first.cycle()
+        first._engine = engine
+        first._applied = frozenset(first.owned)
+        second = LeaseManager(backend, [tenant], 'second', slots=2, ttl=30)
+        second.cycle()
+
+        # Слот отдаётся только после того, как идущий опрос отправил
+        # уведомление и его состояние записано.
+        handover = threading.Thread(target=first.cycle)
+        handover.start()
+        time.sleep(0.1)
+        assert backend.get(first._slot_key(1)) == 'first'
+        answer.set()
+        handover.join(5)
+        assert backend.get(first._slot_key(1)) is None
+        assert sent == ['approved']
+        restored = Tenant(tenant.token, tenant.chat_id)
+        restored.restore(BackendCheckpointStore(backend).load(
+            [tenant.tenant_id])[tenant.tenant_id])
+        assert restored.timestamp == 1641000000
+        assert restored.homeworks.status_of(7) == 'approved'
+    finally:
+        answer.set()
+        engine.stop()
+        runner.join(5)
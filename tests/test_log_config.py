@@ -0,0 +1,56 @@
+import json
+import logging
+
+from log_config import JsonFormatter, RepeatFilter, setup_logging
+
+
+def make_record(lineno=10, level=logging.ERROR, msg='boom'):
+    return logging.LogRecord('bot', level, 'homework.py', lineno, msg,
+                             None, None, func='main')
+
+
+def test_repeat_filter_samples_one_call_site():
+    log_filter = RepeatFilter(interval=60, burst=3)
+    passed = [log_filter.filter(make_record()) for _ in range(10)]
+    assert passed.count(True) == 3
+    assert log_filter.filter(make_record(lineno=11))
+    assert log_filter.filter(make_record(msg='другая подписка'))
+    assert log_filter.filter(make_record(level=logging.CRITICAL))
+    assert all(log_filter.filter(make_record(level=logging.INFO))
+               for _ in range(10))
+
+
+def test_oldest_live_windows_are_forgotten_over_the_cap():
+    log_filter = RepeatFilter(interval=60, burst=1, max_windows=100)
+    for number in range(1000):
+        assert log_filter.filter(make_record(msg=f'{number}: boom'))
+    assert len(log_filter._windows) == 100
+    assert not log_filter.filter(make_record(msg='999: boom'))
+    assert log_filter.filter(make_record(msg='0: boom'))
+
+
+def test_suppressed_count_reported_in_next_window():
+    log_filter = RepeatFilter(interval=0, burst=1)
+    log_filter._windows[('homework.py', 10, 'boom')] = [0, 1, 7]
+    record = make_record()
+    assert log_filter.filter(record)
+    data = json.loads(JsonFormatter().format(record))
+    assert data['suppressed'] == 7
+    assert data['message'] == 'boom'
+
+
+def test_records_are_written_by_background_listener(tmp_path):
+    path = tmp_path / 'bot.log'
+    root = logging.getLogger()
+    handlers = list(root.handlers)
+    level = root.level
+    listener = setup_logging(str(path), max_bytes=1024)
+    try:
+        logging.getLogger('bot').error('Сообщение %s', 1)
+    finally:
+        listener.stop()
+        root.handlers = handlers
+        root.setLevel(level)
+    line = json.loads(path.read_text(encoding='utf-8').splitlines()[-1])
+    assert line['message'] == 'Сообщение 1'
+    assert line['level'] == 'ERROR'
@@ -0,0 +1,39 @@
+import urllib.request
+
+from metrics import Counter, Gauge, Histogram, Registry, start_http_server
+
+
+def test_histogram_buckets_and_quantiles():
+    histogram = Histogram('latency', 'Latency.', buckets=(0.1, 1))
+    for value in (0.05, 0.05, 0.5, 5):
+        histogram.observe(value)
+    assert histogram.count == 4
+    assert histogram.quantile(0.5) == 0.1
+    assert histogram.quantile(0.99) == float('inf')
+    assert histogram.samples() == [
+        'latency_bucket{le="0.1"} 2',
+        'latency_bucket{le="1"} 3',
+        'latency_bucket{le="+Inf"} 4',
+        'latency_sum 5.6',
+        'latency_count 4',
+    ]
+
+
+def test_metrics_page():
+    registry = Registry()
+    errors = registry.register(Counter('errors_total', 'Errors.', ('stage',)))
+    depth = registry.register(Gauge('depth', 'Depth.'))
+    errors.inc('fetch')
+    errors.inc('fetch')
+    depth.set_function(lambda: 3)
+    server = start_http_server(0, registry=registry)
+    try:
+        url = f'http://127.0.0.1:{server.server_port}/metrics'
+        with urllib.request.urlopen(url) as response:
+            body = response.read().decode('utf-8')
+    finally:
+        server.shutdown()
+        server.server_close()
+    assert '# TYPE errors_total counter' in body
+    assert 'errors_total{stage="fetch"} 2' in body
+    assert 'depth 3' in body
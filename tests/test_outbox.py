@@ -0,0 +1,91 @@
+from engine import PollingEngine, Tenant
+from outbox import Outbox
+
+
+class FlakySend:
+
+    def __init__(self):
+        self.sent = []
+        self.down = False
+
+    def __call__(self, chat_id, message, on_done):
+        if self.down:
+            on_done(ConnectionError('Telegram недоступен'))
+        else:
+            self.sent.append((chat_id, message))
+            on_done(None)
+
+
+def test_duplicate_keys_are_skipped_after_restart(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    send = FlakySend()
+    outbox = Outbox(path, send)
+    assert outbox.put(1, 'approved', 'a:1:approved:')
+    assert not outbox.put(1, 'approved', 'a:1:approved:')
+    outbox.drain()
+    outbox.close()
+    outbox = Outbox(path, send)
+    assert not outbox.put(1, 'approved', 'a:1:approved:')
+    assert outbox.drain() == 0
+    assert len(outbox) == 0
+    outbox.close()
+    assert send.sent == [(1, 'approved')]
+
+
+def test_failed_notifications_are_sent_after_recovery(tmp_path):
+    send = FlakySend()
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), send, retry=0.01,
+                    max_retry=3600)
+    send.down = True
+    for number in range(3):
+        outbox.put(1, f'm{number}', str(number))
+    assert outbox.drain() == 0
+    assert len(outbox) == 3
+    send.down = False
+    outbox.put(1, 'm3', '3')
+    # Первая удача снимает паузу со всех ждущих уведомлений.
+    assert outbox.drain() == 3
+    outbox.drain()
+    assert len(outbox) == 0
+    assert sorted(send.sent) == [(1, f'm{number}') for number in range(4)]
+    outbox.close()
+
+
+def test_engine_puts_notifications_into_outbox(tmp_path):
+    send = FlakySend()
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), send)
+    homework = {'id': 7, 'homework_name': 'hw', 'status': 'approved',
+                'date_updated': '2022-01-01T00:00:00Z'}
+    for _ in range(2):
+        # Подписка без контрольной точки, как после падения процесса.
+        engine = PollingEngine(
+            [], fetch=None, check=None, parse=lambda hw: hw['status'],
+            send=None, outbox=outbox)
+        assert engine.notify(Tenant('token', 1), homework)
+    outbox.close()
+    assert send.sent == [(1, 'approved')]
+
+
+def test_undeliverable_notifications_are_dropped(tmp_path):
+    class Blocked(Exception):
+        pass
+
+    def send(chat_id, message, on_done):
+        on_done(Blocked('bot was blocked') if chat_id == 1
+                else ConnectionError('Telegram недоступен'))
+
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), send, retry=0,
+                    max_retry=0, max_attempts=3,
+                    permanent=lambda error: isinstance(error, Blocked))
+    outbox.put(1, 'blocked', 'a')
+    outbox.put(2, 'flaky', 'b')
+    # Заблокированный чат закрывается сразу, остальное — после 3 попыток.
+    assert outbox.drain() == 1
+    assert outbox.drain() == 1
+    assert outbox.drain() == 0
+    assert len(outbox) == 0
+    assert not outbox.put(1, 'blocked', 'a')
+    errors = dict(outbox._connection.execute(
+        'SELECT key, error FROM outbox').fetchall())
+    assert errors == {'a': 'bot was blocked', 'b': 'Telegram недоступен'}
+    outbox.close()
@@ -0,0 +1,127 @@
+import base64
+import gzip
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import homework
+from engine import PollingEngine, Tenant
+from http_client import HttpClient
+from pipeline import Pipeline, Stage
+
+
+def test_stages_transform_filter_and_count_errors():
+    def check(number):
+        if number == 3:
+            raise ValueError('boom')
+        return number
+
+    pipeline = Pipeline([
+        Stage('square', lambda number: number * number, workers=3),
+        Stage('odd', lambda number: number if number % 2 else None),
+        Stage('check', check, workers=2, capacity=1),
+    ])
+    assert sorted(pipeline.run(range(6))) == [1, 9, 25]
+    stats = pipeline.stats()
+    assert stats['square']['processed'] == 6
+    assert stats['odd']['dropped'] == 3
+    failing = Pipeline([Stage('check', check)])
+    assert sorted(failing.run(range(5))) == [0, 1, 2, 4]
+    assert failing.stats()['check']['errors'] == 1
+
+
+def test_slow_last_stage_holds_back_the_source():
+    pulled = []
+    lock = threading.Lock()
+
+    def source():
+        for number in range(1000):
+            with lock:
+                pulled.append(number)
+            yield number
+
+    pipeline = Pipeline([
+        Stage('fetch', lambda number: number, workers=4, capacity=2),
+        Stage('send', lambda number: time.sleep(0.01) or number,
+              capacity=2),
+    ], poll_interval=0.01)
+    done = 0
+    for _ in pipeline.run(source()):
+        done += 1
+        if done == 20:
+            break
+    # Очереди по 2, плюс элементы в руках потоков и источника.
+    assert len(pulled) <= done + 2 + 2 + 2 + 4 + 1 + 1
+    assert pipeline.stats()['fetch']['blocked_seconds'] > 0
+
+
+def test_engine_sweep_matches_poll_once():
+    homeworks = [{'id': 1, 'homework_name': 'a', 'status': 'approved',
+                  'date_updated': '2022-01-01T00:00:00Z'}]
+    sent = []
+    engine = PollingEngine(
+        [Tenant(f'token{number}', number) for number in range(30)],
+        fetch=lambda token, ts: {'homeworks': homeworks,
+                                 'current_date': 1641000000},
+        check=lambda response: response['homeworks'],
+        parse=lambda hw: hw['status'],
+        send=lambda chat_id, message: sent.append(chat_id), overlap=0,
+    )
+    assert engine.sweep(fetch_workers=4, send_workers=2) == 30
+    assert engine.sweep() == 0
+    assert sorted(sent) == list(range(30))
+    assert {tenant.timestamp for tenant in engine.tenants} == {1641000000}
+
+
+# Сжатое тело длиннее куска, который читается при разборе первым.
+GZIP_BODY = gzip.compress(json.dumps({
+    'homeworks': [{'id': 1, 'homework_name': 'a', 'status': 'approved',
+                   'date_updated': '2022-01-01T00:00:00Z'}],
+    'current_date': 1641000000,
+    'padding': base64.b64encode(os.urandom(200000)).decode('ascii'),
+}).encode('utf-8'))
+
+
+class GzipHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        try:
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(GZIP_BODY)))
+            self.end_headers()
+            self.wfile.write(GZIP_BODY)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+def test_slow_send_does_not_exhaust_connection_pool(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GzipHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(homework, 'ENDPOINT',
+                        f'http://127.0.0.1:{server.server_port}/')
+    # Каждый ответ читается потоком и держит соединение, пока не дочитан.
+    monkeypatch.setattr(homework, 'STREAM_THRESHOLD', 1024)
+    client = HttpClient(pool_size=2, pool_timeout=0.02)
+    sent = []
+    engine = PollingEngine(
+        [Tenant(f'token{number}', number) for number in range(12)],
+        fetch=lambda token, ts: homework.get_api_answer_for(
+            token, ts, client),
+        check=homework.check_response, parse=lambda hw: hw['status'],
+        send=lambda chat_id, message: time.sleep(0.1) or sent.append(
+            message), overlap=0,
+    )
+    try:
+        assert engine.sweep(fetch_workers=2, capacity=2) == 12
+    finally:
+        client.close()
+        server.shutdown()
+        server.server_close()
+    assert sent == ['approved'] * 12
@@ -0,0 +1,66 @@
+import os
+import signal
+import threading
+import time
+
+import pytest
+
+from profiling import Profiler
+
+
+def busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_collapsed_stacks_and_memory_snapshot(tmp_path):
+    import tracemalloc
+
+    stop = threading.Event()
+    worker = threading.Thread(target=busy, args=(stop,), name='worker')
+    worker.start()
+    profiler = Profiler(str(tmp_path), interval=0.001, memory=True)
+    profiler.start()
+    time.sleep(0.2)
+    profiler.stop(wait=True)
+    stop.set()
+    worker.join()
+    assert not tracemalloc.is_tracing()
+    names = sorted(os.listdir(tmp_path))
+    assert [name.split('-')[0] for name in names] == ['cpu', 'memory']
+    lines = (tmp_path / names[0]).read_text().splitlines()
+    stack, count = lines[0].rsplit(' ', 1)
+    assert int(count) > 0
+    assert any(line.startswith('worker;') and 'busy (test_profiling.py'
+               in line for line in lines)
+    tracemalloc.Snapshot.load(str(tmp_path / names[1]))
+
+
+def wait_until(condition, timeout=2):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return condition()
+
+
+@pytest.mark.skipif(not hasattr(signal, 'SIGUSR2'), reason='нет SIGUSR2')
+def test_signal_toggles_profiling(tmp_path):
+    profiler = Profiler(str(tmp_path), interval=0.001)
+    previous = signal.getsignal(signal.SIGUSR2)
+    profiler.install_signal()
+    try:
+        assert not profiler.running
+        # Сигнал, пришедший под блокировкой профиля, не ждёт её в
+        # обработчике: профиль включится, когда блокировку отпустят.
+        with profiler._lock:
+            os.kill(os.getpid(), signal.SIGUSR2)
+            time.sleep(0.05)
+            assert not profiler.running
+        assert wait_until(lambda: profiler.running)
+        time.sleep(0.05)
+        os.kill(os.getpid(), signal.SIGUSR2)
+        assert wait_until(lambda: not profiler.running)
+        profiler.stop(wait=True)
+        assert os.listdir(tmp_path)
+    finally:
+        signal.signal(signal.SIGUSR2, previous)
@@ -0,0 +1,58 @@
+import subprocess
+import sys
+
+from benchmarks.memory import run_benchmark
+from engine import Tenant
+from records import Homework, HomeworkIndex, Status
+
+
+def test_index_keeps_latest_status_and_round_trips():
+    index = HomeworkIndex()
+    index.set(Homework.from_api(
+        {'id': 7, 'homework_name': 'hw.zip', 'status': 'reviewing'}))
+    index.set(Homework.from_api(
+        {'id': 3, 'homework_name': 'hw.zip', 'status': 'rejected'}))
+    index.set(Homework.from_api(
+        {'id': 7, 'homework_name': 'hw.zip', 'status': 'approved'}))
+    assert index.status_of(7) is Status.APPROVED
+    assert index.status_of(5) is None
+    assert index.statuses() == {'3': 'rejected', '7': 'approved'}
+    assert list(HomeworkIndex.load(index.dump())) == list(index)
+    legacy = [[3, 'hw.zip', 'rejected'], [7, 'hw.zip', 'approved']]
+    assert list(HomeworkIndex.load(legacy)) == list(index)
+
+
+def test_names_and_statuses_are_shared_between_tenants():
+    first = Homework.from_api(
+        {'id': 1, 'homework_name': ''.join(['final', '.zip']),
+         'status': ''.join(['appr', 'oved'])})
+    second = Homework.from_api(
+        {'id': 2, 'homework_name': ''.join(['fin', 'al.zip']),
+         'status': 'approved'})
+    assert first.name is second.name
+    assert first.status is second.status is Status.APPROVED
+
+
+def test_old_checkpoints_restore():
+    tenant = Tenant('token', 1)
+    tenant.restore({'statuses': {'1': 'reviewing', 'hw.zip': 'approved'}})
+    assert tenant.statuses == {'1': 'reviewing', 'hw.zip': 'approved'}
+    assert tenant.homeworks.status_of(
+        Homework.from_api({'homework_name': 'hw.zip'}).key) == 'approved'
+
+
+def test_keys_without_id_survive_a_restart():
+    # В другом процессе таблица NAMES заполняется в другом порядке.
+    code = ('from records import Homework, NAMES; NAMES.code("zzz"); '
+            'print(Homework.from_api({"homework_name": "b"}).key)')
+    other = subprocess.run([sys.executable, '-c', code], check=True,
+                           capture_output=True, text=True).stdout
+    key = Homework.from_api({'homework_name': 'b'}).key
+    assert key < 0
+    assert int(other) == key
+    assert key != Homework.from_api({'homework_name': 'zzz'}).key
+
+
+def test_index_uses_a_fraction_of_dict_memory():
+    result = run_benchmark(tenants=200, homeworks=30)
+    assert result['index_vs_status_dict'] < 0.5
@@ -0,0 +1,86 @@
+import pytest
+import requests
+
+import homework
+from benchmarks.replay import synthesize
+from clock import VirtualClock
+from engine import PollingEngine, Tenant
+from replay import Player, Recorder, load_recording, replay, token_key
+from scheduling import FixedPolicy
+
+
+class FakeResponse:
+    def __init__(self, status_code, text, headers=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers or {}
+
+
+class FakeClient:
+    def __init__(self, responses):
+        self.responses = iter(responses)
+
+    def get(self, url, **kwargs):
+        response = next(self.responses)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+def test_recorded_responses_replay_by_clock(tmp_path):
+    path = str(tmp_path / 'api.jsonl')
+    clock = VirtualClock(100)
+    recorder = Recorder(FakeClient([
+        FakeResponse(200, '{"homeworks": [], "current_date": 1}'),
+        requests.ConnectionError('нет сети'),
+        FakeResponse(429, '{}', {'Retry-After': '30'}),
+    ]), path, clock)
+    headers = {'Authorization': 'OAuth secret'}
+    for _ in range(3):
+        try:
+            recorder.get('url', headers=headers, params={'from_date': 0})
+        except requests.ConnectionError:
+            pass
+        clock.advance(10)
+    with open(path, 'a') as file:
+        file.write('{"oborvano')
+    entries = load_recording(path)
+    assert 'secret' not in (tmp_path / 'api.jsonl').read_text()
+    player = Player(entries)
+    token = token_key('secret')
+    assert [tenant.token for tenant in player.tenants()] == [token]
+    replay_headers = {'Authorization': f'OAuth {token}'}
+    assert player.get('url', headers=replay_headers).json()['homeworks'] == []
+    player.clock.advance(10)
+    with pytest.raises(requests.ConnectionError):
+        player.get('url', headers=replay_headers)
+    player.clock.advance(10)
+    response = player.get('url', headers=replay_headers)
+    assert (response.status_code, response.headers) == (
+        429, {'Retry-After': '30'})
+    assert player.get('url', headers={}).status_code == 401
+
+
+def test_simulation_runs_a_day_without_waiting():
+    clock = VirtualClock(0)
+    polls = []
+    engine = PollingEngine(
+        [Tenant(f'token{i}', i) for i in range(10)],
+        fetch=lambda token, ts: polls.append(clock.time()) or {
+            'homeworks': []},
+        check=lambda response: response['homeworks'],
+        parse=None, send=None, policy=FixedPolicy(600), clock=clock,
+    )
+    assert engine.simulate(24 * 3600) == len(polls)
+    assert 10 * 143 <= len(polls) <= 10 * 144
+    assert clock.time() == 24 * 3600
+
+
+def test_replay_detects_statuses_within_poll_interval():
+    result = replay(synthesize(tenants=20, days=0.5),
+                    homework.get_api_answer_for, homework.check_response,
+                    homework.parse_status, policy=FixedPolicy(60),
+                    retry_time=60)
+    assert result['notifications'] > 0
+    assert result['latency_p95_s'] <= 60.1
+    assert result['speedup'] > 100
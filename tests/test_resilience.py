@@ -0,0 +1,67 @@
+import time
+
+import pytest
+
+from engine import PollingEngine, Tenant
+from exceptions import ApiStatusException, CircuitOpenException
+from resilience import Backoff, CircuitBreaker, parse_retry_after
+
+
+def failing_fetch(status_code, retry_after=None):
+    def fetch(token, timestamp):
+        raise ApiStatusException(f'Ошибка {status_code}', status_code,
+                                 retry_after)
+    return fetch
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT') == 0
+    assert parse_retry_after('garbage') is None
+    assert parse_retry_after(None) is None
+
+
+def test_breaker_opens_and_recovers_through_probes():
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05,
+                             probes=2)
+    fetch = breaker.wrap(failing_fetch(500))
+    for _ in range(3):
+        with pytest.raises(ApiStatusException):
+            fetch('token', 0)
+    assert breaker.state == CircuitBreaker.OPEN
+    with pytest.raises(CircuitOpenException):
+        fetch('token', 0)
+
+    time.sleep(0.06)
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    breaker.record_success()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_client_errors_do_not_trip_breaker():
+    breaker = CircuitBreaker(failure_threshold=1)
+    with pytest.raises(ApiStatusException):
+        breaker.wrap(failing_fetch(401))('token', 0)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_backoff_grows_and_honours_retry_after():
+    backoff = Backoff(base=10, cap=100)
+    tenant = Tenant('token', 1)
+    assert backoff.next_interval(tenant) is None
+    tenant.failures = 5
+    assert 10 <= backoff.next_interval(tenant) <= 100
+    tenant.failures, tenant.retry_after = 1, 300
+    assert 300 <= backoff.next_interval(tenant) <= 310
+
+
+def test_engine_counts_fetch_failures():
+    engine = PollingEngine([], failing_fetch(503, 60), None, None,
+                           send=lambda chat_id, message: None)
+    tenant = Tenant('token', 1)
+    engine.poll_once(tenant)
+    engine.poll_once(tenant)
+    assert tenant.failures == 2
+    assert tenant.retry_after == 60
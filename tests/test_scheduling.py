@@ -0,0 +1,25 @@
+from engine import Tenant
+from scheduling import AdaptivePolicy, FixedPolicy
+
+
+def test_fixed_policy():
+    assert FixedPolicy(600).next_interval(Tenant('token', 1), True) == 600
+
+
+def test_adaptive_policy_backs_off_while_quiet():
+    policy = AdaptivePolicy(floor=60, ceiling=1800, base=600, growth=2,
+                            jitter=0)
+    tenant = Tenant('token', 1)
+    intervals = [policy.next_interval(tenant, 0) for _ in range(4)]
+    assert intervals == [600, 1200, 1800, 1800]
+
+
+def test_adaptive_policy_polls_fast_while_reviewing():
+    policy = AdaptivePolicy(floor=60, ceiling=1800, jitter=0)
+    tenant = Tenant('token', 1)
+    tenant.interval = 1800
+    assert policy.next_interval(tenant, 1) == 60
+    tenant.statuses = {'1': 'reviewing'}
+    assert policy.next_interval(tenant, 0) == 60
+    tenant.statuses = {'1': 'approved'}
+    assert policy.next_interval(tenant, 0) == 90
@@ -0,0 +1,89 @@
+import threading
+import time
+
+from dispatcher import Dispatcher
+from engine import PollingEngine, Tenant
+from sharding import HashRing, Supervisor, shard_tenants
+
+
+def fake_serve(tenants, on_start):
+    engine = PollingEngine(
+        tenants,
+        fetch=lambda token, timestamp: {'homeworks': []},
+        check=lambda response: response['homeworks'],
+        parse=None,
+        send=None,
+        retry_time=0.1,
+    )
+    on_start(engine)
+    import asyncio
+    asyncio.run(engine.run())
+
+
+def wait_for(condition, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_hash_ring_moves_only_removed_node_keys():
+    keys = [f'token{i}' for i in range(3000)]
+    ring = HashRing([0, 1, 2])
+    before = {key: ring.node_for(key) for key in keys}
+    counts = [list(before.values()).count(node) for node in (0, 1, 2)]
+    assert min(counts) > 600
+    after = HashRing([0, 2])
+    for key in keys:
+        if before[key] != 1:
+            assert after.node_for(key) == before[key]
+
+
+def test_supervisor_rebalances_when_a_shard_dies():
+    tenants = [Tenant(f'token{i}', i) for i in range(30)]
+    ring = HashRing([0, 1])
+    assert len(shard_tenants(tenants, ring, 0)) < 30
+    supervisor = Supervisor(fake_serve, tenants, workers=2,
+                            metrics_interval=0.1, restart_delay=1)
+    thread = threading.Thread(target=supervisor.run)
+    thread.start()
+    try:
+        def shard_count():
+            return len([s for s in supervisor.rollup._snapshots.values()
+                        if s])
+
+        def tenants_total():
+            return supervisor.rollup.merged().get('bot_tenants')
+
+        assert wait_for(lambda: shard_count() == 2 and tenants_total() == 30)
+        supervisor._processes[1].terminate()
+        assert wait_for(lambda: shard_count() == 1 and tenants_total() == 30)
+        assert wait_for(lambda: shard_count() == 2 and tenants_total() == 30)
+        assert supervisor.rollup.merged()['bot_polls_total'][()] > 0
+    finally:
+        supervisor.stop()
+        thread.join()
+
+
+def test_telegram_rate_is_split_between_running_shards():
+    class Conn:
+        def __init__(self):
+            self.sent = []
+
+        def send(self, message):
+            self.sent.append(message)
+
+    supervisor = Supervisor(fake_serve, [], sharded=False, global_rate=30)
+    for workers in (2, 3):
+        supervisor._processes = {shard: None for shard in range(workers)}
+        supervisor._conns = {shard: Conn() for shard in range(workers)}
+        supervisor._broadcast()
+        for conn in supervisor._conns.values():
+            assert conn.sent == [('rate', 30 / workers)]
+
+    dispatcher = Dispatcher(lambda chat_id, message: None, global_rate=30)
+    dispatcher.set_global_rate(10)
+    assert dispatcher._global.rate == dispatcher._global.capacity == 10
+    assert dispatcher._global.tokens <= 10
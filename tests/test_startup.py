@@ -0,0 +1,14 @@
+from benchmarks.startup import (BUDGET_MS, MAX_MODULES, profile_import,
+                                run_benchmark)
+
+
+def test_import_defers_heavy_dependencies():
+    profile = profile_import('homework')
+    assert profile['loaded_deferred'] == []
+    assert profile['modules'] <= MAX_MODULES
+
+
+def test_import_fits_budget():
+    # Медиана нескольких запусков и бюджет втрое выше обычного времени,
+    # чтобы тест не зависел от случайной нагрузки машины.
+    assert run_benchmark(runs=5)['median_ms'] <= BUDGET_MS
@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from engine import PollingEngine, Tenant
+from homework import check_response
+from streaming import HomeworkStream, decode_response
+
+BODY = json.dumps({
+    'homeworks': [
+        {'id': 2, 'homework_name': 'вторая', 'status': 'approved',
+         'date_updated': '2022-01-01T01:00:00Z'},
+        {'id': 1, 'homework_name': 'первая', 'status': 'reviewing',
+         'date_updated': '2022-01-01T00:00:00Z'},
+    ],
+    'current_date': 1641000000,
+}, ensure_ascii=False).encode('utf-8')
+
+
+def chunked(body, size):
+    return [body[start:start + size] for start in range(0, len(body), size)]
+
+
+class StreamedResponse:
+
+    def __init__(self, body, length=None, encoding=None):
+        self.body = body
+        self.headers = {} if length is None else {'Content-Length': length}
+        if encoding is not None:
+            self.headers['Content-Encoding'] = encoding
+        self.content = body
+        self.closed = False
+
+    def iter_content(self, size):
+        return iter(chunked(self.body, 3))
+
+    def close(self):
+        self.closed = True
+
+
+def test_stream_yields_homeworks_from_any_chunks():
+    expected = json.loads(BODY)
+    for size in (1, 2, 7, len(BODY)):
+        closed = []
+        stream = HomeworkStream(chunked(BODY, size),
+                                close=lambda: closed.append(True))
+        assert list(stream) == expected['homeworks']
+        assert stream.get('current_date') == 1641000000
+        assert closed == [True]
+    with pytest.raises(RuntimeError):
+        list(stream)
+
+
+def test_stream_reports_errors_like_check_response():
+    cases = [
+        (b'[]', TypeError),
+        (b'{"current_date": 1}', KeyError),
+        (b'{"homeworks": {"id": 1}}', TypeError),
+        (b'{"homeworks": [{"id": 1}', ValueError),
+        (b'{"homeworks": [1 2]}', ValueError),
+    ]
+    for body, error in cases:
+        with pytest.raises(error):
+            list(HomeworkStream(chunked(body, 4)))
+
+
+def test_engine_reads_long_responses_as_stream():
+    small = decode_response(StreamedResponse(BODY, str(len(BODY))))
+    assert small == json.loads(BODY)
+    # Длина сжатого тела не говорит, сколько займёт распакованное:
+    # короткое распакованное тело разбирается целиком, длинное — потоком.
+    response = StreamedResponse(BODY, '10', 'gzip')
+    assert decode_response(response) == json.loads(BODY)
+    assert response.closed
+    compressed = decode_response(StreamedResponse(BODY, '10', 'gzip'),
+                                 threshold=len(BODY) - 1)
+    assert isinstance(compressed, HomeworkStream)
+    assert list(compressed) == json.loads(BODY)['homeworks']
+    response = StreamedResponse(BODY)
+    sent = []
+    engine = PollingEngine(
+        [], fetch=lambda token, ts: decode_response(response, threshold=0),
+        check=check_response, parse=lambda hw: hw['homework_name'],
+        send=lambda chat_id, message: sent.append(message), overlap=0,
+    )
+    tenant = Tenant('token', 1)
+    assert engine.poll_once(tenant) == 2
+    assert sent == ['первая', 'вторая']
+    assert response.closed
+    assert tenant.timestamp == 1641000000
@@ -0,0 +1,48 @@
+import random
+
+from benchmarks.timers import run_benchmark
+from timers import TimingWheel
+
+
+def test_timers_fire_in_time_across_levels():
+    rng = random.Random(1)
+    wheel = TimingWheel(tick=0.1, slots=8, levels=3, now=0.0)
+    deadlines = {key: rng.uniform(0, 100) for key in range(2000)}
+    for key, deadline in deadlines.items():
+        wheel.schedule(key, deadline, key)
+    fired = {}
+    for step in range(1, 1100):
+        now = step * 0.1
+        for deadline, key in wheel.advance(now):
+            fired[key] = now
+    assert len(wheel) == 0
+    assert fired.keys() == deadlines.keys()
+    for key, moment in fired.items():
+        assert deadlines[key] <= moment < deadlines[key] + 0.1 + 1e-9
+
+
+def test_reschedule_and_cancel_replace_the_timer():
+    wheel = TimingWheel(tick=1, now=0.0)
+    wheel.schedule('a', 5, 'first')
+    wheel.schedule('a', 3, 'second')
+    wheel.schedule('b', 4, 'b')
+    assert wheel.cancel('b')
+    assert not wheel.cancel('b')
+    assert wheel.next_deadline() == 3
+    assert wheel.advance(2) == []
+    assert wheel.advance(10) == [(3, 'second')]
+    assert wheel.next_deadline() is None
+
+
+def test_far_deadline_waits_beyond_the_horizon():
+    wheel = TimingWheel(tick=1, slots=4, levels=2, now=0.0)
+    wheel.schedule('far', 100, 'far')
+    assert wheel.advance(99) == []
+    assert wheel.advance(100) == [(100, 'far')]
+
+
+def test_benchmark_spreads_polls_evenly():
+    result = run_benchmark(timers=20000, interval=60, tick=0.05, rounds=2)
+    assert result['fired'] == 40000
+    assert result['max_late_seconds'] <= 0.05 + 1e-9
+    assert result['per_second_max'] < 1.5 * result['per_second_mean']
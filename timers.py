@@ -0,0 +1,118 @@
+import math
+import time
+
+_EPSILON = 1e-9
+
+
+class TimingWheel:
+    """Иерархическое колесо таймеров.
+
+    Время делится на тики по tick секунд. Нижний уровень — slots ячеек по
+    одному тику, каждый следующий уровень в slots раз грубее. Таймер
+    кладётся в ячейку того уровня, в диапазон которого попадает его срок,
+    поэтому постановка и отмена стоят O(1) независимо от числа таймеров.
+    Когда нижний уровень делает полный оборот, ячейка верхнего уровня
+    раскладывается по нижним. Таймер срабатывает не раньше своего срока
+    и не позже чем через тик после него.
+
+    У каждого таймера есть ключ, повторная постановка по тому же ключу
+    заменяет прежний срок.
+    """
+
+    def __init__(self, tick=0.05, slots=256, levels=4, now=None):
+        self.tick = tick
+        self.slots = slots
+        self.levels = levels
+        self.origin = time.monotonic() if now is None else now
+        self._spans = [slots ** level for level in range(levels + 1)]
+        self._wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self._where = {}
+        self._tick = 0
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, key):
+        return key in self._where
+
+    def _ticks(self, moment):
+        # Погрешность деления не должна сдвигать момент на соседний тик.
+        return math.floor((moment - self.origin) / self.tick + _EPSILON)
+
+    def _place(self, key, deadline, item):
+        expiry = max(
+            math.ceil((deadline - self.origin) / self.tick - _EPSILON),
+            self._tick)
+        delta = expiry - self._tick
+        spans = self._spans
+        level = 0
+        while delta >= spans[level + 1] and level < self.levels - 1:
+            level += 1
+        if delta >= spans[level + 1]:
+            # Дальше горизонта колеса: ждём в самой дальней ячейке.
+            expiry = self._tick + spans[level + 1] - 1
+        slot = self._wheels[level][(expiry // spans[level]) % self.slots]
+        slot[key] = (deadline, item)
+        self._where[key] = slot
+
+    def schedule(self, key, deadline, item):
+        """Ставит таймер key на момент deadline по time.monotonic()."""
+        self.cancel(key)
+        self._place(key, deadline, item)
+
+    def cancel(self, key):
+        """Снимает таймер key, если он стоит. Возвращает True, если снят."""
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del slot[key]
+        return True
+
+    def _cascade(self, level):
+        """Раскладывает текущую ячейку уровня level по нижним уровням."""
+        index = (self._tick // self._spans[level]) % self.slots
+        slot = self._wheels[level][index]
+        entries = list(slot.items())
+        slot.clear()
+        for key, (deadline, item) in entries:
+            self._place(key, deadline, item)
+        return index
+
+    def advance(self, now):
+        """Возвращает список (срок, объект) таймеров, сработавших к now."""
+        target = self._ticks(now)
+        fired = []
+        if not self._where:
+            self._tick = max(self._tick, target + 1)
+            return fired
+        while self._tick <= target:
+            if self._tick % self.slots == 0:
+                level = 1
+                while level < self.levels and self._cascade(level) == 0:
+                    level += 1
+            slot = self._wheels[0][self._tick % self.slots]
+            if slot:
+                for key, entry in slot.items():
+                    del self._where[key]
+                    fired.append(entry)
+                slot.clear()
+            self._tick += 1
+        return fired
+
+    def next_deadline(self):
+        """Возвращает момент, к которому стоит вызвать advance().
+        Это ближайший непустой тик нижнего уровня или, если он пуст до
+        конца оборота, момент раскладки верхнего уровня. Если таймеров
+        нет, возвращает None.
+        """
+        if not self._where:
+            return None
+        wheel = self._wheels[0]
+        tick = self._tick
+        while True:
+            if wheel[tick % self.slots]:
+                break
+            tick += 1
+            if tick % self.slots == 0:
+                break
+        return self.origin + tick * self.tick